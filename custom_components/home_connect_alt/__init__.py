@@ -3,26 +3,51 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import voluptuous as vol
 from home_connect_async import Appliance, HomeConnect, HomeConnectError, Events
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_CLIENT_ID, CONF_CLIENT_SECRET, Platform
-from homeassistant.core import Event, HomeAssistant, HomeAssistantError
+from homeassistant.const import CONF_CLIENT_ID, CONF_CLIENT_SECRET, CONF_HOST, Platform
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, HomeAssistantError, SupportsResponse, callback
 from homeassistant.helpers import aiohttp_client, config_entry_oauth2_flow
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers import storage
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.reload import async_integration_yaml_config
 from homeassistant.helpers.typing import ConfigType
 
 from . import api, config_flow
+from .common import get_service_device_info, register_callback
 from .const import *
+from .filters import EntityFilter
+from .loader import DataLoader
+from .perf import SlowCallbackDetector
+from .runtime import EntryRuntime, claim_runtime, discard_runtime, park_runtime
 from .services import Services
+from .usage import ProgramUsage
+from .websocket import async_register_websocket_commands
 
 _LOGGER = logging.getLogger(__name__)
 
+FILTER_RULE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_FILTER_PLATFORM): vol.In(["sensor", "binary_sensor", "select", "number", "button", "switch"]),
+        vol.Optional(CONF_FILTER_APPLIANCE_TYPE): cv.string,
+        vol.Optional(CONF_FILTER_HAID): cv.string,
+        vol.Optional(CONF_FILTER_KEY): cv.string
+    }
+)
+
+FILTERS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_FILTER_INCLUDE, default=[]): vol.All(cv.ensure_list, [FILTER_RULE_SCHEMA]),
+        vol.Optional(CONF_FILTER_EXCLUDE, default=[]): vol.All(cv.ensure_list, [FILTER_RULE_SCHEMA])
+    }
+)
+
 CONFIG_SCHEMA = vol.Schema(
     {
         DOMAIN: vol.Schema(
@@ -30,8 +55,14 @@ CONFIG_SCHEMA = vol.Schema(
                 vol.Required(CONF_CLIENT_ID): cv.string,
                 vol.Required(CONF_CLIENT_SECRET): cv.string,
                 vol.Optional(CONF_SIMULATE, default=False): cv.boolean,
+                vol.Optional(CONF_HOST): cv.url,
                 vol.Optional(CONF_CACHE, default=True): cv.boolean,
-                vol.Optional(CONF_LANG, default=None): vol.Any(str, None)
+                vol.Optional(CONF_LANG, default=None): vol.Any(str, None),
+                vol.Optional(CONF_MAX_CONCURRENCY, default=DEFAULT_MAX_CONCURRENCY): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Optional(CONF_SLOW_CALLBACK_THRESHOLD): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Optional(CONF_LAZY_OPTIONS, default=False): cv.boolean,
+                vol.Optional(CONF_ENTITY_FILTERS, default={}): FILTERS_SCHEMA,
+                vol.Optional(CONF_COMPACT, default=False): cv.boolean
             }
         )
     },
@@ -50,8 +81,12 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         return True
 
     conf = config[DOMAIN]
+    # Shared by all the config entries
+    conf[ENTRIES] = {}
+    conf['request_semaphore'] = asyncio.Semaphore(conf[CONF_MAX_CONCURRENCY])
+    async_register_websocket_commands(hass)
 
-    simulate = conf[CONF_SIMULATE]
+    host = get_host(conf)
 
     config_flow.OAuth2FlowHandler.async_register_implementation(
         hass,
@@ -60,8 +95,8 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
             DOMAIN,
             config[DOMAIN][CONF_CLIENT_ID],
             config[DOMAIN][CONF_CLIENT_SECRET],
-            f'{SIM_HOST if simulate else API_HOST}{ENDPOINT_AUTHORIZE}',
-            f'{SIM_HOST if simulate else API_HOST}{ENDPOINT_TOKEN}',
+            f'{host}{ENDPOINT_AUTHORIZE}',
+            f'{host}{ENDPOINT_TOKEN}',
         )
     )
 
@@ -80,19 +115,30 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     session = config_entry_oauth2_flow.OAuth2Session(hass, entry, implementation)
 
     conf = hass.data[DOMAIN]
-    simulate = conf[CONF_SIMULATE]
     lang = conf[CONF_LANG] # if conf[CONF_LANG] != "" else None
-    host = SIM_HOST if simulate else API_HOST
+    host = get_host(conf)
     use_cache = conf[CONF_CACHE]
-
-    # If using an aiohttp-based API lib
-    auth = api.AsyncConfigEntryAuth(
-        aiohttp_client.async_get_clientsession(hass), session, host
-    )
+    max_concurrency = conf[CONF_MAX_CONCURRENCY]
+
+    # Reuse the data model and the event stream that were kept when the entry was unloaded for a reload,
+    # unless a setting that requires loading the data again was changed
+    settings = { CONF_HOST: host, CONF_LANG: lang }
+    runtime = claim_runtime(hass, entry.entry_id, settings)
+    if runtime:
+        _LOGGER.debug("Reusing the Home Connect data model and event stream of the previous setup")
+        runtime.auth.update(session)
+        runtime.loader.set_max_concurrency(max_concurrency)
+    else:
+        # All the entries share the connection pool of the client session and the request semaphore
+        auth = api.AsyncConfigEntryAuth(
+            aiohttp_client.async_get_clientsession(hass), session, host, conf['request_semaphore']
+        )
+        homeconnect = await HomeConnect.async_create(auth, delayed_load=True, lang=lang)
+        runtime = EntryRuntime(entry.entry_id, auth, homeconnect, DataLoader(homeconnect, max_concurrency), settings)
 
     # homeconnect:HomeConnect = None
     # if use_cache:
-    #     homeconnect = await async_load_from_cache(hass, auth, lang)
+    #     homeconnect = await async_load_from_cache(hass, auth, lang, entry.entry_id)
     # if not homeconnect:
     #     # Create normally if failed to create from cache
     #     try:
@@ -101,40 +147,72 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     #     except HomeConnectError as ex:
     #         _LOGGER.warning("Failed to create the HomeConnect object", exc_info=ex)
     #         return False
-    homeconnect = await HomeConnect.async_create(auth, delayed_load=True, lang=lang)
-
-    conf[entry.entry_id] = auth
-    conf['homeconnect'] = homeconnect
-    conf['services'] = register_services(hass, homeconnect)
+    homeconnect = runtime.homeconnect
+    loader = runtime.loader
+
+    conf[ENTRIES][entry.entry_id] = runtime
+    runtime.slow_callbacks = None
+    if conf.get(CONF_SLOW_CALLBACK_THRESHOLD) is not None:
+        runtime.slow_callbacks = SlowCallbackDetector(conf[CONF_SLOW_CALLBACK_THRESHOLD])
+        entry.async_on_unload(runtime.perf.add_call_wrapper(runtime.slow_callbacks.async_call))
+
+    if conf[CONF_LAZY_OPTIONS]:
+        # The history is kept with the runtime so a reload doesn't read it from the storage again
+        if not runtime.program_usage:
+            runtime.program_usage = ProgramUsage(hass, entry.entry_id)
+            await runtime.program_usage.async_load()
+        entry.async_on_unload(register_callback(homeconnect, runtime.program_usage.record, [Events.PAIRED, Events.PROGRAM_SELECTED, Events.PROGRAM_STARTED]))
+    else:
+        runtime.program_usage = None
+    runtime.catalog.program_usage = runtime.program_usage
+
+    if hass.is_running:
+        # The entry is reloaded, or added, after Home Assistant started so the filters may have been changed since
+        # the configuration was read. They are applied by the platforms when they scan the appliances, which doesn't
+        # require loading the data again.
+        config = await async_integration_yaml_config(hass, DOMAIN)
+        if config and DOMAIN in config:
+            conf[CONF_ENTITY_FILTERS] = config[DOMAIN][CONF_ENTITY_FILTERS]
+            conf[CONF_COMPACT] = config[DOMAIN][CONF_COMPACT]
+    runtime.entity_filter = EntityFilter.from_config(conf[CONF_ENTITY_FILTERS], conf[CONF_COMPACT])
+
+    await async_migrate_service_device(hass, entry)
+
+    # The services are shared by all the entries and route the calls to the appliances of every entry
+    if 'services' not in conf:
+        conf['services'] = register_services(hass)
+    entry.async_on_unload(conf['services'].add_entry(runtime))
 
     #region internal event hadlers
     # async def async_delayed_update_cache(delay:float = 0):
     #     asyncio.sleep(delay)
-    #     await async_save_to_cache(hass, homeconnect)
+    #     await async_save_to_cache(hass, homeconnect, entry.entry_id)
 
     async def on_data_loaded(homeconnect:HomeConnect):
         # Save the state of the HomeConnect object to cache
         # if use_cache:
-        #     await async_save_to_cache(hass, homeconnect)
+        #     await async_save_to_cache(hass, homeconnect, entry.entry_id)
         # else:
         #     _LOGGER.debug("Not saving to cache, it is disabled")
-        homeconnect.register_callback(on_device_removed, Events.DEPAIRED)
+        entry.async_on_unload(register_callback(homeconnect, on_device_removed, Events.DEPAIRED))
         #homeconnect.register_callback(on_device_added, [Events.PAIRED, Events.DATA_CHANGED] )
-        homeconnect.subscribe_for_updates()
 
     async def on_data_load_error(homeconnect:HomeConnect, ex:Exception):
         _LOGGER.error("Failed to load data for the HomeConnect object", exc_info=ex)
 
     # async def on_device_added(appliance:Appliance, event:str):
     #     if use_cache:
-    #         await async_save_to_cache(hass, homeconnect)
+    #         await async_save_to_cache(hass, homeconnect, entry.entry_id)
     #     else:
     #         _LOGGER.debug("Not saving to cache, it is disabled")
 
     async def on_device_removed(appliance:Appliance):
+        loader.cancel_appliance_tasks(appliance)
+        # Removing the device also removes its entities, which release their callbacks
         devreg = dr.async_get(hass)
         device = devreg.async_get_device({(DOMAIN, appliance.haId.lower().replace('-','_'))})
-        devreg.async_remove_device(device.id)
+        if device:
+            devreg.async_remove_device(device.id)
 
         # We need to wait for the appliance to be removed from the HomeConnect data
         # this is not 100% fail-safe but good enough for a cache
@@ -144,11 +222,23 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 
     # Setup all the callback listeners before starting to load the data
-    hass.config_entries.async_setup_platforms(entry, PLATFORMS)
-    register_events_publisher(hass, homeconnect)
-
-    # Continue loading the HomeConnect data model and set the callback to be notified when done
-    homeconnect.start_load_data_task(on_complete=on_data_loaded, on_error= on_data_load_error)
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    entry.async_on_unload(register_events_publisher(hass, homeconnect))
+    entry.async_on_unload(async_track_time_interval(hass, runtime.perf.update, timedelta(seconds=PERF_UPDATE_INTERVAL)))
+
+    if loader.loading:
+        # The data model that was kept from before the reload is still loading, get notified when it's done
+        loader.set_callbacks(on_complete=on_data_loaded, on_error=on_data_load_error)
+    elif (homeconnect.status & HomeConnect.HomeConnectStatus.LOADED) == HomeConnect.HomeConnectStatus.LOADED:
+        # The data model was kept from before the reload and is kept up to date by the open event stream
+        await on_data_loaded(homeconnect)
+    else:
+        # Open the event stream before loading so no updates are missed, events received while
+        # an appliance is loading are buffered and replayed after its data was loaded
+        loader.subscribe_for_updates()
+
+        # Continue loading the HomeConnect data model and set the callback to be notified when done
+        loader.start_load_data_task(on_complete=on_data_loaded, on_error= on_data_load_error)
 
     return True
 
@@ -156,20 +246,56 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     conf = hass.data[DOMAIN]
-    homeconnect:HomeConnect = conf['homeconnect']
-    homeconnect.close()
 
-    # await async_save_to_cache(hass, None)
+    # await async_save_to_cache(hass, None, entry.entry_id)
 
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        # The callbacks registered with entry.async_on_unload() are released by Home Assistant after this returns
+        runtime:EntryRuntime = conf[ENTRIES].pop(entry.entry_id)
+        runtime.unloaded()
+        if not conf[ENTRIES]:
+            unregister_services(hass, conf.pop('services'))
+        # Keep the data model and the event stream for a while in case the entry is being reloaded
+        park_runtime(hass, entry.entry_id, runtime)
 
     return unload_ok
 
-async def async_load_from_cache(hass:HomeAssistant, auth:api.AsyncConfigEntryAuth, lang:str|None) -> HomeConnect | None:
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Close the data model that was kept after the entry was unloaded and remove the stored program usage."""
+    discard_runtime(hass, entry.entry_id)
+    await ProgramUsage(hass, entry.entry_id).async_remove()
+
+def get_host(conf:ConfigType) -> str:
+    """ Get the Home Connect service host, an explicitly configured host overrides the simulate option """
+    if conf.get(CONF_HOST):
+        return conf[CONF_HOST].rstrip('/')
+    return SIM_HOST if conf[CONF_SIMULATE] else API_HOST
+
+async def async_migrate_service_device(hass:HomeAssistant, entry:ConfigEntry) -> None:
+    """ Move the Home Connect service device and its entities, which were shared before, to this entry """
+    device_reg = dr.async_get(hass)
+    device = device_reg.async_get_device({(DOMAIN, "homeconnect")})
+    if device and entry.entry_id in device.config_entries:
+        device_reg.async_update_device(device.id, new_identifiers=get_service_device_info(entry.entry_id)["identifiers"])
+
+    @callback
+    def migrate_unique_id(entity_entry:er.RegistryEntry) -> dict|None:
+        if entity_entry.unique_id.startswith("homeconnect_"):
+            return { "new_unique_id": f"{entry.entry_id}_{entity_entry.unique_id}" }
+        return None
+    await er.async_migrate_entries(hass, entry.entry_id, migrate_unique_id)
+
+
+def cache_store(hass:HomeAssistant, entry_id:str) -> storage.Store:
+    """ The storage of the cached Home Connect data of a config entry """
+    return storage.Store(hass, version=1, key=f"{DOMAIN}_cache_{entry_id}", private=True)
+
+
+async def async_load_from_cache(hass:HomeAssistant, auth:api.AsyncConfigEntryAuth, lang:str|None, entry_id:str) -> HomeConnect | None:
     """ Helper function to load cached Home Connect data for storage """
-    cache = storage.Store(hass, version=1, key=f"{DOMAIN}_cache", private=True)
+    cache = cache_store(hass, entry_id)
     try:
         refresh = HomeConnect.RefreshMode.ALL
         json_data = None
@@ -194,11 +320,11 @@ async def async_load_from_cache(hass:HomeAssistant, auth:api.AsyncConfigEntryAut
         _LOGGER.debug("Exception while loading HomeConnect from cache, clearing cache and contiuing", exc_info=ex)
         return None
 
-async def async_save_to_cache(hass:HomeAssistant, homeconnect:HomeConnect, cache:storage.Store=None) -> None:
+async def async_save_to_cache(hass:HomeAssistant, homeconnect:HomeConnect, entry_id:str, cache:storage.Store=None) -> None:
     """ Helper function to save the Home Connect data to Home Assistant storage """
     try:
         if not cache:
-            cache = storage.Store(hass, version=1, key=f"{DOMAIN}_cache", private=True)
+            cache = cache_store(hass, entry_id)
         if homeconnect:
             cached_data = {
                 'last_update': datetime.now().isoformat(),
@@ -214,9 +340,9 @@ async def async_save_to_cache(hass:HomeAssistant, homeconnect:HomeConnect, cache
         _LOGGER.debug("Exception when saving HomeConnect to cache", exc_info=ex)
 
 
-def register_services(hass:HomeAssistant, homeconnect:HomeConnect) -> Services:
+def register_services(hass:HomeAssistant) -> Services:
     """ Register the services offered by this integration """
-    services = Services(hass, homeconnect)
+    services = Services(hass)
 
     select_program_scema = vol.Schema(
         {
@@ -232,7 +358,7 @@ def register_services(hass:HomeAssistant, homeconnect:HomeConnect) -> Services:
             )
         }
     )
-    hass.services.async_register(DOMAIN, "select_program", services.async_select_program, schema=select_program_scema)
+    hass.services.async_register(DOMAIN, "select_program", services.profiled(services.async_select_program), schema=select_program_scema)
 
     start_program_scema = vol.Schema(
         {
@@ -248,26 +374,134 @@ def register_services(hass:HomeAssistant, homeconnect:HomeConnect) -> Services:
             )
         }
     )
-    hass.services.async_register(DOMAIN, "start_program", services.async_start_program, schema=start_program_scema)
+    hass.services.async_register(DOMAIN, "start_program", services.profiled(services.async_start_program), schema=start_program_scema)
 
     stop_program_schema = vol.Schema(
         {
             vol.Required('device_id'): cv.string
         }
     )
-    hass.services.async_register(DOMAIN, "stop_program", services.async_stop_program, schema=stop_program_schema)
+    hass.services.async_register(DOMAIN, "stop_program", services.profiled(services.async_stop_program), schema=stop_program_schema)
+
+    bulk_targets = {
+        vol.Optional('device_id'): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional('entity_id'): cv.entity_ids,
+        vol.Optional('area_id'): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional('label_id'): vol.All(cv.ensure_list, [cv.string])
+    }
+    bulk_options = vol.Schema(
+        [
+            {
+                vol.Required('key'): cv.string,
+                vol.Required('value'): vol.Any(str, int, float, bool)
+            }
+        ]
+    )
+    has_bulk_target = cv.has_at_least_one_key('device_id', 'entity_id', 'area_id', 'label_id')
+
+    bulk_select_program_schema = vol.All(
+        vol.Schema(
+            {
+                **bulk_targets,
+                vol.Required('program_key'): cv.string,
+                vol.Optional('options'): bulk_options
+            }
+        ),
+        has_bulk_target
+    )
+    hass.services.async_register(
+        DOMAIN, "bulk_select_program", services.profiled(services.async_bulk_select_program),
+        schema=bulk_select_program_schema, supports_response=SupportsResponse.OPTIONAL
+    )
+
+    bulk_start_program_schema = vol.All(
+        vol.Schema(
+            {
+                **bulk_targets,
+                vol.Optional('program_key'): cv.string,
+                vol.Optional('options'): bulk_options
+            }
+        ),
+        has_bulk_target
+    )
+    hass.services.async_register(
+        DOMAIN, "bulk_start_program", services.profiled(services.async_bulk_start_program),
+        schema=bulk_start_program_schema, supports_response=SupportsResponse.OPTIONAL
+    )
+
+    bulk_stop_program_schema = vol.All(vol.Schema(bulk_targets), has_bulk_target)
+    hass.services.async_register(
+        DOMAIN, "bulk_stop_program", services.profiled(services.async_bulk_stop_program),
+        schema=bulk_stop_program_schema, supports_response=SupportsResponse.OPTIONAL
+    )
+
+    get_catalog_schema = vol.Schema(
+        {
+            vol.Required('device_id'): cv.string,
+            vol.Optional('program'): cv.string,
+            vol.Optional('key'): cv.string
+        }
+    )
+    hass.services.async_register(
+        DOMAIN, "get_catalog", services.profiled(services.async_get_catalog),
+        schema=get_catalog_schema, supports_response=SupportsResponse.ONLY
+    )
+
+    refresh_schema = vol.Schema(
+        {
+            vol.Required('device_id'): cv.string,
+            vol.Optional('section'): vol.In(REFRESH_SECTIONS)
+        }
+    )
+    hass.services.async_register(DOMAIN, "refresh", services.profiled(services.async_refresh), schema=refresh_schema)
+
+    record_events_schema = vol.Schema(
+        {
+            vol.Optional('duration', default=300): vol.All(vol.Coerce(int), vol.Range(min=1, max=86400)),
+            vol.Optional('max_events', default=100000): vol.All(vol.Coerce(int), vol.Range(min=1))
+        }
+    )
+    hass.services.async_register(DOMAIN, "record_events", services.profiled(services.async_record_events), schema=record_events_schema)
+
+    profile_schema = vol.Schema(
+        {
+            vol.Optional('duration', default=60): vol.All(vol.Coerce(int), vol.Range(min=1, max=3600)),
+            vol.Optional('max_calls', default=100000): vol.All(vol.Coerce(int), vol.Range(min=1)),
+            vol.Optional('top', default=20): vol.All(vol.Coerce(int), vol.Range(min=1, max=200))
+        }
+    )
+    hass.services.async_register(
+        DOMAIN, "profile", services.async_profile, schema=profile_schema, supports_response=SupportsResponse.OPTIONAL
+    )
 
     return services
 
 
-def register_events_publisher(hass:HomeAssistant, homeconnect:HomeConnect):
-    """ Register for publishing events that are offered by this integration """
+def unregister_services(hass:HomeAssistant, services:Services) -> None:
+    """ Remove the services offered by this integration """
+    services.close()
+    for service in list(hass.services.async_services().get(DOMAIN, {})):
+        hass.services.async_remove(DOMAIN, service)
+
+
+def register_events_publisher(hass:HomeAssistant, homeconnect:HomeConnect) -> CALLBACK_TYPE:
+    """ Register for publishing events that are offered by this integration
+
+    Returns a handle that stops publishing the events and releases all the callbacks
+    """
     device_reg = dr.async_get(hass)
+    appliance_handles:dict[str, list[CALLBACK_TYPE]] = {}
+    device_ids:dict[str, str] = {}      # The device_id of every appliance, resolved on its first event
 
     async def async_handle_event(appliance:Appliance, key:str, value:str):
-        device = device_reg.async_get_device({(DOMAIN, appliance.haId.lower().replace('-','_'))})
+        device_id = device_ids.get(appliance.haId)
+        if device_id is None:
+            device = device_reg.async_get_device({(DOMAIN, appliance.haId.lower().replace('-','_'))})
+            if not device:
+                return
+            device_id = device_ids[appliance.haId] = device.id
         event_data = {
-            "device_id": device.id,
+            "device_id": device_id,
             "key": key,
             "value": value
         }
@@ -276,14 +510,29 @@ def register_events_publisher(hass:HomeAssistant, homeconnect:HomeConnect):
 
 
     def register_appliance(appliance:Appliance):
-        for event in PUBLISHED_EVENTS:
-            appliance.register_callback(async_handle_event, event)
-
-
-    homeconnect.register_callback(register_appliance, [Events.PAIRED, Events.CONNECTED])
+        if appliance.haId not in appliance_handles:
+            appliance_handles[appliance.haId] = [ register_callback(appliance, async_handle_event, event) for event in PUBLISHED_EVENTS ]
+
+    def deregister_appliance(appliance:Appliance):
+        device_ids.pop(appliance.haId, None)
+        for release in appliance_handles.pop(appliance.haId, []):
+            release()
+
+    handles = [
+        register_callback(homeconnect, register_appliance, [Events.PAIRED, Events.CONNECTED]),
+        register_callback(homeconnect, deregister_appliance, Events.DEPAIRED)
+    ]
     for appliance in homeconnect.appliances.values():
         register_appliance(appliance)
 
+    def release() -> None:
+        for handle in handles:
+            handle()
+        for haid in list(appliance_handles.keys()):
+            for handle in appliance_handles.pop(haid):
+                handle()
+    return release
+
 
 
 class HomeConnectOauth2Impl(config_entry_oauth2_flow.LocalOAuth2Implementation):
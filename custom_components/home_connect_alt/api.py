@@ -1,8 +1,16 @@
 """API for Home Connect New bound to Home Assistant OAuth."""
+from __future__ import annotations
+import asyncio
+import functools
+
 import home_connect_async
-from aiohttp import ClientSession
+from aiohttp import ClientResponse, ClientSession
 from homeassistant.helpers import config_entry_oauth2_flow
 
+from .interning import intern_loads
+from .perf import PerfCounters
+from .tracing import CURRENT_TRACE
+
 # TODO the following two API examples are based on our suggested best practices
 # for libraries using OAuth2 with requests or aiohttp. Delete the one you won't use.
 # For more info see the docs at https://developers.home-assistant.io/docs/api_lib_auth/#oauth2.
@@ -16,11 +24,48 @@ class AsyncConfigEntryAuth(home_connect_async.AbstractAuth):
         self,
         websession: ClientSession,
         oauth_session: config_entry_oauth2_flow.OAuth2Session,
-        host: str
+        host: str,
+        semaphore: asyncio.Semaphore
     ) -> None:
-        """Initialize Home Connect New auth."""
+        """Initialize Home Connect New auth.
+
+        The semaphore is shared by all the config entries so it limits the total number of concurrent requests.
+        """
         super().__init__(websession, host)
         self._oauth_session = oauth_session
+        self._semaphore = semaphore
+        self.perf:PerfCounters|None = None
+
+    def update(self, oauth_session: config_entry_oauth2_flow.OAuth2Session) -> None:
+        """Use a new OAuth session when the auth object is reused after a reload."""
+        self._oauth_session = oauth_session
+
+    async def request(self, method, endpoint:str, lang:str=None, **kwargs) -> ClientResponse:
+        """Make a request while limiting the number of concurrent requests to the service."""
+        async with self._semaphore:
+            if self.perf:
+                self.perf.api_call()
+            trace = CURRENT_TRACE.get()
+            if trace is None:
+                return self._interned(await super().request(method, endpoint, lang, **kwargs))
+            trace.api_request_started()
+            try:
+                return self._interned(await super().request(method, endpoint, lang, **kwargs))
+            finally:
+                trace.api_request_finished()
+
+    @staticmethod
+    def _interned(response:ClientResponse) -> ClientResponse:
+        """Decode the JSON body of the response with interned keys, units and types."""
+        # The SDK decodes the body with response.json() and there is no other hook for the decoding
+        response.json = functools.partial(response.json, loads=intern_loads)
+        return response
+
+    async def stream(self, endpoint:str, lang:str=None, **kwargs):
+        """Open the event stream and count the connection attempts."""
+        if self.perf:
+            self.perf.stream_connects += 1
+        return await super().stream(endpoint, lang, **kwargs)
 
     async def async_get_access_token(self) -> str:
         """Return a valid access token."""
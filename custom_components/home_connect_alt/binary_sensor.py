@@ -6,8 +6,9 @@ from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType
 
-from .common import EntityBase, EntityManager
+from .common import EntityBase, EntityManager, register_callback
 from .const import DOMAIN, SPECIAL_ENTITIES
+from .runtime import get_entry_runtime
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,8 +16,9 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_add_entities:AddEntitiesCallback) -> None:
     """Add sensors for passed config_entry in HA."""
     #auth = hass.data[DOMAIN][config_entry.entry_id]
-    homeconnect:HomeConnect = hass.data[DOMAIN]['homeconnect']
-    entity_manager = EntityManager(async_add_entities)
+    runtime = get_entry_runtime(hass, config_entry.entry_id)
+    homeconnect:HomeConnect = runtime.homeconnect
+    entity_manager = EntityManager(async_add_entities, runtime.entity_filter, "binary_sensor")
 
     def add_appliance(appliance:Appliance) -> None:
         for (key, status) in appliance.status.items():
@@ -55,13 +57,15 @@ async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_
     def remove_appliance(appliance:Appliance) -> None:
         entity_manager.remove_appliance(appliance)
 
-    homeconnect.register_callback(add_appliance, [Events.PAIRED, Events.PROGRAM_STARTED] )
-    homeconnect.register_callback(remove_appliance, Events.DEPAIRED)
+    config_entry.async_on_unload(register_callback(homeconnect, add_appliance, [Events.PAIRED, Events.PROGRAM_STARTED]))
+    config_entry.async_on_unload(register_callback(homeconnect, remove_appliance, Events.DEPAIRED))
     for appliance in homeconnect.appliances.values():
         add_appliance(appliance)
 
 class ProgramOptionBinarySensor(EntityBase, BinarySensorEntity):
     """ Program option binary sensor """
+    dormant_when_unavailable = True
+
     @property
     def device_class(self) -> str:
         return f"{DOMAIN}__options"
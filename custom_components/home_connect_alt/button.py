@@ -6,31 +6,37 @@ from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType
 
-from .common import EntityBase, EntityManager
-from .const import DOMAIN, HOME_CONNECT_DEVICE
+from .common import EntityBase, EntityManager, get_service_device_info, register_callback
+from .const import DOMAIN
+from .diagnostics import get_callback_counts
+from .perf import get_perf_counters
+from .refresh import async_refresh_appliance
+from .runtime import get_entry_runtime
 
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_add_entities:AddEntitiesCallback) -> None:
     """ Add buttons for passed config_entry in HA """
-    homeconnect:HomeConnect = hass.data[DOMAIN]['homeconnect']
-    entity_manager = EntityManager(async_add_entities)
+    runtime = get_entry_runtime(hass, config_entry.entry_id)
+    homeconnect:HomeConnect = runtime.homeconnect
+    entity_manager = EntityManager(async_add_entities, runtime.entity_filter, "button")
 
     def add_appliance(appliance:Appliance) -> None:
         if appliance.available_programs:
             entity_manager.add(StartButton(appliance))
             entity_manager.add(StopButton(appliance))
+        entity_manager.add(RefreshButton(appliance))
         entity_manager.register()
 
     def remove_appliance(appliance:Appliance) -> None:
         entity_manager.remove_appliance(appliance)
 
     # First add the integration button
-    async_add_entities([HomeConnectRefreshButton(homeconnect), HomeConnecDebugButton(homeconnect)])
+    async_add_entities([HomeConnectRefreshButton(config_entry.entry_id, homeconnect), HomeConnecDebugButton(config_entry.entry_id, homeconnect)])
 
     # Subscribe for events and register existing appliances
-    homeconnect.register_callback(add_appliance, Events.PAIRED)
-    homeconnect.register_callback(remove_appliance, Events.DEPAIRED)
+    config_entry.async_on_unload(register_callback(homeconnect, add_appliance, Events.PAIRED))
+    config_entry.async_on_unload(register_callback(homeconnect, remove_appliance, Events.DEPAIRED))
     for appliance in homeconnect.appliances.values():
         add_appliance(appliance)
 
@@ -93,32 +99,31 @@ class StartButton(EntityBase, ButtonEntity):
         try:
             op_state = self._appliance.status.get("BSH.Common.Status.OperationState")
             if op_state and op_state.value == "BSH.Common.EnumType.OperationState.Ready":
-                await self._appliance.async_start_program()
+                async with self.trace_command("start_program", "BSH.Common.Status.OperationState", "BSH.Common.EnumType.OperationState.Run"):
+                    await self._appliance.async_start_program()
             elif op_state and op_state.value == "BSH.Common.EnumType.OperationState.Run":
-                await self._appliance.async_pause_active_program()
+                async with self.trace_command("pause_program", "BSH.Common.Status.OperationState", "BSH.Common.EnumType.OperationState.Pause"):
+                    await self._appliance.async_pause_active_program()
             elif op_state and op_state.value == "BSH.Common.EnumType.OperationState.Pause":
-                await self._appliance.async_resume_paused_program()
+                async with self.trace_command("resume_program", "BSH.Common.Status.OperationState", "BSH.Common.EnumType.OperationState.Run"):
+                    await self._appliance.async_resume_paused_program()
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to start the selected program: {ex.error_description} ({ex.code})")
             else:
                 raise HomeAssistantError(f"Failed to start the selected program ({ex.code})")
 
-    async def async_added_to_hass(self):
-        """Run when this Entity has been added to HA."""
-        events = [Events.CONNECTION_CHANGED, Events.DATA_CHANGED, "BSH.Common.Status.RemoteControlStartAllowed"]
-        self._appliance.register_callback(self.async_on_update, events)
-
-    async def async_will_remove_from_hass(self):
-        """Entity being removed from hass."""
-        events = [Events.CONNECTION_CHANGED, Events.DATA_CHANGED, "BSH.Common.Status.RemoteControlStartAllowed"]
-        self._appliance.deregister_callback(self.async_on_update, events)
+    @property
+    def update_events(self) -> list[str]:
+        return [Events.CONNECTION_CHANGED, Events.DATA_CHANGED, "BSH.Common.Status.RemoteControlStartAllowed"]
 
     async def async_on_update(self, appliance:Appliance, key:str, value) -> None:
         self.async_write_ha_state()
 
 class StopButton(EntityBase, ButtonEntity):
     """ Class for buttons that start the selected program """
+    dormant_when_unavailable = True
+
     @property
     def unique_id(self) -> str:
         return f'{self.haId}_stop'
@@ -144,22 +149,45 @@ class StopButton(EntityBase, ButtonEntity):
     async def async_press(self) -> None:
         """ Handle button press """
         try:
-            await self._appliance.async_stop_active_program()
+            async with self.trace_command("stop_program", "BSH.Common.Status.OperationState"):
+                await self._appliance.async_stop_active_program()
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to stop the selected program: {ex.error_description} ({ex.code})")
             else:
                 raise HomeAssistantError(f"Failed to stop the selected program ({ex.code})")
 
-    async def async_added_to_hass(self):
-        """Run when this Entity has been added to HA."""
-        events = [Events.CONNECTION_CHANGED, Events.DATA_CHANGED, "BSH.Common.Status.*"]
-        self._appliance.register_callback(self.async_on_update, events)
+    @property
+    def update_events(self) -> list[str]:
+        return [Events.CONNECTION_CHANGED, Events.DATA_CHANGED, "BSH.Common.Status.*"]
+
+    async def async_on_update(self, appliance:Appliance, key:str, value) -> None:
+        self.async_write_ha_state()
+
+
+class RefreshButton(EntityBase, ButtonEntity):
+    """ Class for buttons that refresh the data of a single appliance """
+    @property
+    def unique_id(self) -> str:
+        return f'{self.haId}_refresh'
+
+    @property
+    def name_ext(self) -> str:
+        return "Refresh"
+
+    @property
+    def icon(self) -> str:
+        return "mdi:refresh"
 
-    async def async_will_remove_from_hass(self):
-        """Entity being removed from hass."""
-        events = [Events.CONNECTION_CHANGED, Events.DATA_CHANGED, "BSH.Common.Status.*"]
-        self._appliance.deregister_callback(self.async_on_update, events)
+    async def async_press(self) -> None:
+        """ Handle button press """
+        try:
+            await async_refresh_appliance(self._appliance)
+        except HomeConnectError as ex:
+            if ex.error_description:
+                raise HomeAssistantError(f"Failed to refresh the appliance data: {ex.error_description} ({ex.code})")
+            else:
+                raise HomeAssistantError(f"Failed to refresh the appliance data ({ex.code})")
 
     async def async_on_update(self, appliance:Appliance, key:str, value) -> None:
         self.async_write_ha_state()
@@ -168,17 +196,18 @@ class StopButton(EntityBase, ButtonEntity):
 class HomeConnectRefreshButton(ButtonEntity):
     """ Class for a button to trigger a global refresh of Home Connect data  """
 
-    def __init__(self, homeconnect:HomeConnect) -> None:
+    def __init__(self, entry_id:str, homeconnect:HomeConnect) -> None:
+        self._entry_id = entry_id
         self._homeconnect = homeconnect
 
     @property
     def device_info(self):
         """Return information to link this entity with the correct device."""
-        return HOME_CONNECT_DEVICE
+        return get_service_device_info(self._entry_id)
 
     @property
     def unique_id(self) -> str:
-        return 'homeconnect_refresh'
+        return f'{self._entry_id}_homeconnect_refresh'
 
     @property
     def name(self) -> str:
@@ -206,17 +235,18 @@ class HomeConnectRefreshButton(ButtonEntity):
 class HomeConnecDebugButton(ButtonEntity):
     """ Class for a button to trigger a global refresh of Home Connect data  """
 
-    def __init__(self, homeconnect:HomeConnect) -> None:
+    def __init__(self, entry_id:str, homeconnect:HomeConnect) -> None:
+        self._entry_id = entry_id
         self._homeconnect = homeconnect
 
     @property
     def device_info(self):
         """Return information to link this entity with the correct device."""
-        return HOME_CONNECT_DEVICE
+        return get_service_device_info(self._entry_id)
 
     @property
     def unique_id(self) -> str:
-        return 'homeconnect_debug'
+        return f'{self._entry_id}_homeconnect_debug'
 
     @property
     def name(self) -> str:
@@ -231,9 +261,12 @@ class HomeConnecDebugButton(ButtonEntity):
         return True
 
     async def async_press(self) -> None:
-        """ Handle button press """
-        try:
-            js=self._homeconnect.to_json(indent=2)
-            _LOGGER.error(js)
-        except Exception as ex:
-            raise HomeAssistantError("Failed to serialize to JSON")
+        """ Log a short summary, the full data is available with "Download diagnostics" on the integration page """
+        perf = get_perf_counters(self._homeconnect)
+        _LOGGER.info("Home Connect status: %s, appliances: %d, callbacks: %s, performance: %s - "
+            "download the diagnostics of the integration for the full details",
+            self._homeconnect.status.name,
+            len(self._homeconnect.appliances),
+            get_callback_counts(self._homeconnect),
+            perf.stats if perf else None
+        )
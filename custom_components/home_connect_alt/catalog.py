@@ -0,0 +1,127 @@
+""" An in-memory index of the programs, options and settings that every appliance supports """
+from __future__ import annotations
+import fnmatch
+import re
+
+from home_connect_async import Appliance, HomeConnect
+from home_connect_async.appliance import Option
+
+from .usage import ProgramUsage
+
+_CATALOG_ATTR = "_catalog"
+
+
+def _constraints(option:Option) -> dict:
+    """ The definition of an option or a setting without its current value """
+    return {
+        "name": option.name,
+        "type": option.type,
+        "unit": option.unit,
+        "min": option.min,
+        "max": option.max,
+        "step": option.stepsize,
+        "allowed_values": option.allowedvalues,
+        "execution": option.execution
+    }
+
+
+def _pattern(pattern:str|None) -> re.Pattern|None:
+    return re.compile(fnmatch.translate(pattern)) if pattern else None
+
+
+class _ApplianceCatalog():
+    """ The index of one appliance with the objects of the data model it was built from """
+    def __init__(self, programs_source:dict|None, settings_source:dict|None, programs:dict[str, dict], settings:dict[str, dict]) -> None:
+        self.programs_source = programs_source
+        self.settings_source = settings_source
+        self.programs = programs
+        self.settings = settings
+
+
+class CatalogIndex():
+    """ The programs of every appliance with the constraints of their options, and the constraints of the settings
+
+    The index of an appliance is built when it is first queried and is rebuilt only when the SDK replaces the
+    available programs of the appliance, which happens when they are fetched again, so answering a query doesn't
+    make any API call or walk the data model. The settings are indexed the same way when the settings are fetched
+    again. The SDK only loads the options of the current program, the options of the other programs are taken from
+    the previous index of the appliance or from the program usage history, when the lazy option entities are enabled,
+    and are None for the programs whose options were never seen.
+    """
+    def __init__(self) -> None:
+        self._appliances:dict[str, _ApplianceCatalog] = {}
+        self.program_usage:ProgramUsage|None = None
+        self.builds = 0
+
+    def attach(self, homeconnect:HomeConnect) -> None:
+        """ Make the index reachable from the services """
+        setattr(homeconnect, _CATALOG_ATTR, self)
+
+    def query(self, appliance:Appliance, program:str|None=None, key:str|None=None) -> dict:
+        """ The catalog of an appliance, optionally limited to the programs matching a program key pattern
+        and to the options and settings matching a key pattern
+        """
+        catalog = self._get(appliance)
+        program_pattern = _pattern(program)
+        key_pattern = _pattern(key)
+
+        programs = {}
+        for (program_key, entry) in catalog.programs.items():
+            if program_pattern and not program_pattern.match(program_key):
+                continue
+            options = entry["options"]
+            if key_pattern and options:
+                options = { option_key: option for (option_key, option) in options.items() if key_pattern.match(option_key) }
+            programs[program_key] = { **entry, "options": options }
+
+        settings = catalog.settings
+        if key_pattern:
+            settings = { setting_key: setting for (setting_key, setting) in settings.items() if key_pattern.match(setting_key) }
+        elif program_pattern:
+            settings = {}
+        return { "programs": programs, "settings": settings }
+
+    def _get(self, appliance:Appliance) -> _ApplianceCatalog:
+        previous = self._appliances.get(appliance.haId)
+        if previous and previous.programs_source is appliance.available_programs and previous.settings_source is appliance.settings:
+            return previous
+
+        if previous and previous.programs_source is appliance.available_programs:
+            programs = previous.programs
+        else:
+            programs = self._index_programs(appliance, previous)
+        if previous and previous.settings_source is appliance.settings:
+            settings = previous.settings
+        else:
+            settings = { setting_key: _constraints(setting) for (setting_key, setting) in (appliance.settings or {}).items() }
+
+        catalog = _ApplianceCatalog(appliance.available_programs, appliance.settings, programs, settings)
+        self._appliances[appliance.haId] = catalog
+        self.builds += 1
+        # Drop the index of the appliances that were removed
+        appliances = appliance._homeconnect.appliances if appliance._homeconnect else {}
+        for haid in [ haid for haid in self._appliances if haid not in appliances and haid != appliance.haId ]:
+            del self._appliances[haid]
+        return catalog
+
+    def _index_programs(self, appliance:Appliance, previous:_ApplianceCatalog|None) -> dict[str, dict]:
+        used = self.program_usage.get_programs(appliance) if self.program_usage else {}
+        current = { program.key: program for program in [ appliance.selected_program, appliance.active_program ] if program and program.options }
+        programs = {}
+        for (program_key, program) in (appliance.available_programs or {}).items():
+            loaded = program.options if program.options is not None else getattr(current.get(program_key), "options", None)
+            if loaded is not None:
+                options = { option_key: _constraints(option) for (option_key, option) in loaded.items() }
+            elif previous and previous.programs.get(program_key, {}).get("options") is not None:
+                options = previous.programs[program_key]["options"]
+            elif used.get(program_key):
+                options = { option_key: _constraints(option) for (option_key, option) in used[program_key].items() }
+            else:
+                options = None
+            programs[program_key] = { "name": program.name, "execution": program.execution, "options": options }
+        return programs
+
+
+def get_catalog(homeconnect:HomeConnect) -> CatalogIndex|None:
+    """ Get the catalog index attached to a HomeConnect object, if there is one """
+    return getattr(homeconnect, _CATALOG_ATTR, None)
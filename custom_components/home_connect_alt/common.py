@@ -1,28 +1,109 @@
 from __future__ import annotations
+import asyncio
 import logging
 import re
 from abc import ABC, abstractmethod
-from typing import Sequence
+from typing import Callable, Sequence
 
-from home_connect_async import Appliance, Events
+from home_connect_async import Appliance, Events, HomeConnect
+from home_connect_async.appliance import Option
+from homeassistant.core import CALLBACK_TYPE
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from .const import DOMAIN
+from .const import DOMAIN, HOME_CONNECT_DEVICE
+from .filters import EntityFilter
+from .perf import get_perf_counters
+from .tracing import trace_command
+from .usage import ProgramUsage
 
 _LOGGER = logging.getLogger(__name__)
 
+_DORMANCY_ATTR = "_dormancy"
+
+# The events after which a dormant entity may be available again
+WAKE_EVENTS = [
+    Events.CONNECTION_CHANGED,
+    Events.DATA_CHANGED,
+    "BSH.Common.Status.RemoteControlActive",
+    "BSH.Common.Status.RemoteControlStartAllowed"
+]
+
+
+def register_callback(source:HomeConnect|Appliance, callback:Callable, keys:str|Sequence[str]) -> CALLBACK_TYPE:
+    """ Register a callback with the HomeConnect object or an appliance and return a handle that deregisters it
+
+    The handle can be passed to ConfigEntry.async_on_unload() or Entity.async_on_remove() and it is safe to
+    call it more than once or after the callbacks were cleared by HomeConnect.close()
+    """
+    keys = list(keys) if isinstance(keys, (list, tuple)) else [ keys ]
+    appliance = source if isinstance(source, Appliance) else None
+    registry = source._callbacks
+    registry.register_callback(callback, keys, appliance)
+
+    def release() -> None:
+        try:
+            registry.deregister_callback(callback, keys, appliance)
+        except KeyError:
+            pass  # Already deregistered
+    return release
+
+
+def appliance_snapshot(appliance:Appliance, keys:re.Pattern|None=None) -> dict:
+    """ The status and setting values and the selected and active programs with their option values of an appliance,
+    optionally limited to the keys that match a regular expression
+    """
+    def values(items:dict|None) -> dict:
+        return { key: item.value for (key, item) in (items or {}).items() if keys is None or keys.fullmatch(key) }
+
+    def program_snapshot(program) -> dict|None:
+        return { "key": program.key, "options": values(program.options) } if program else None
+
+    return {
+        "status": values(appliance.status),
+        "settings": values(appliance.settings),
+        "selected_program": program_snapshot(appliance.selected_program),
+        "active_program": program_snapshot(appliance.active_program)
+    }
+
+
+def get_program_options(appliance:Appliance, usage:ProgramUsage|None) -> list[Option]:
+    """ The program options of an appliance that get option entities
+
+    These are the options of all the available programs, or only of the used programs when the lazy option entities
+    are enabled and the program usage is tracked
+    """
+    if usage:
+        return usage.get_options(appliance)
+    return [
+        option
+        for program in (appliance.available_programs or {}).values() if program.options
+        for option in program.options.values()
+    ]
+
+
+def get_service_device_info(entry_id:str) -> dict:
+    """ The device info of the Home Connect service device of a config entry, which holds the integration level entities """
+    return { **HOME_CONNECT_DEVICE, "identifiers": {(DOMAIN, f"homeconnect_{entry_id}")} }
+
+
 class EntityBase(ABC):
     """Base class with common methods for all the entities """
 
     should_poll = False
     _appliance: Appliance = None
+    # Set by the entities whose availability only changes with the WAKE_EVENTS
+    dormant_when_unavailable = False
+    _dormant = False
+    _release_updates:CALLBACK_TYPE|None = None
 
     def __init__(self, appliance:Appliance, key:str=None, conf:dict=None) -> None:
         """Initialize the sensor."""
         self._appliance = appliance
         self._key = key
         self._conf = conf if conf else {}
+        self._perf = get_perf_counters(appliance._homeconnect)
+        self._dormancy = get_dormancy(appliance._homeconnect)
         self.entity_id = f'home_connect.{self.unique_id}'
 
     @property
@@ -90,24 +171,41 @@ class EntityBase(ABC):
             )
 
 
-    async def async_added_to_hass(self):
-        """Run when this Entity has been added to HA."""
+    @property
+    def update_events(self) -> list[str]:
+        """ The events that trigger a state update of this entity """
         events = [Events.CONNECTION_CHANGED, Events.DATA_CHANGED]
         if self._key:
             events.append(self._key)
-        self._appliance.register_callback(self.async_on_update, events)
+        return events
 
-    async def async_will_remove_from_hass(self):
-        """Entity being removed from hass."""
-        events = [Events.CONNECTION_CHANGED, Events.DATA_CHANGED]
-        if self._key:
-            events.append(self._key)
-        self._appliance.deregister_callback(self.async_on_update, events)
+    async def async_added_to_hass(self):
+        """Run when this Entity has been added to HA."""
+        # The callback is deregistered when the entity is removed
+        if self._dormancy:
+            self.async_on_remove(self._dormancy.add(self))
+        else:
+            self.async_on_remove(register_callback(self._appliance, self.async_on_update, self.update_events))
+
+    def trace_command(self, command:str, confirm_key:str, confirm_value=None):
+        """ Trace a command sent to the appliance until the event with confirm_key, and confirm_value if set, is received """
+        return trace_command(self._perf, command, self._appliance, confirm_key, confirm_value)
+
+    def async_write_ha_state(self) -> None:
+        """ Write the state to Home Assistant and count the write """
+        super().async_write_ha_state()
+        if self._perf:
+            self._perf.state_written()
+        if self.dormant_when_unavailable and self._dormancy:
+            self._dormancy.update(self)
 
     @abstractmethod
     async def async_on_update(self, appliance:Appliance, key:str, value) -> None:
         pass
 
+    def on_wake(self) -> None:
+        """ Called before a dormant entity that became available again writes its state, it missed the events since """
+
     def pretty_enum(self, val:str) -> str:
         """ Extract display string from a Home COnnect Enum string """
         name = val.split('.')[-1]
@@ -123,16 +221,22 @@ class EntityManager():
     loads data from the Home Connect service and the initialization of the platforms.
     This class prevents that from happening
 
+    The entities that are rejected by the entity filter of the config entry are dropped before they are added
+    to Home Assistant so they never register callbacks or write their state.
     """
-    def __init__(self, async_add_entities:AddEntitiesCallback):
+    def __init__(self, async_add_entities:AddEntitiesCallback, entity_filter:EntityFilter|None=None, platform:str=None):
         self._existing_ids = set()
         self._pending_entities:dict[str, Entity] = {}
         self._entity_appliance_map = {}
         self._async_add_entities = async_add_entities
+        self._entity_filter = entity_filter
+        self._platform = platform
 
     def add(self, entity:Entity) -> None:
-        """ Add a new entiity unless it already esists """
+        """ Add a new entiity unless it already esists or it is filtered out """
         if entity and (entity.unique_id not in self._existing_ids) and (entity.unique_id not in self._pending_entities):
+            if self._entity_filter and not self._entity_filter.allows(self._platform, entity._appliance, entity._key):
+                return
             self._pending_entities[entity.unique_id] = entity
 
     def register(self) -> None:
@@ -149,10 +253,114 @@ class EntityManager():
 
 
     def remove_appliance(self, appliance:Appliance):
-        """ Remove an appliance and all its registered entities """
-        if appliance.haId in self._entity_appliance_map:
-            self._existing_ids -= self._entity_appliance_map[appliance.haId]
-            del self._entity_appliance_map[appliance.haId]
-
-
-
+        """ Forget an appliance and all its registered entities so they are created again if the appliance is paired again
+
+        The entities themselves are removed by Home Assistant together with the device of the appliance
+        """
+        haid = appliance.haId.lower().replace('-','_')    # The entities use the normalized haId
+        if self._entity_filter:
+            self._entity_filter.forget_appliance(appliance)
+        if haid in self._entity_appliance_map:
+            self._existing_ids -= self._entity_appliance_map[haid]
+            del self._entity_appliance_map[haid]
+
+
+class DormancyManager():
+    """ Detaches the entities that can't change while they are unavailable from their update callbacks
+
+    Option entities of programs that aren't selected, or the stop button while no program is active, would otherwise
+    be called for every DATA_CHANGED and CONNECTION_CHANGED event only to write the same unavailable state again.
+    An entity with dormant_when_unavailable goes dormant when it writes an unavailable state: its callbacks are released
+    and a single wake-up callback per appliance, for the WAKE_EVENTS, writes the state of the dormant entities that
+    became available again, which attaches their callbacks again. The SDK doesn't allow changing the callbacks of an
+    event while it is broadcast, so the callbacks are attached and released in a later iteration of the event loop.
+    """
+    def __init__(self) -> None:
+        self._entities:set[EntityBase] = set()
+        self._dormant:dict[str, set[EntityBase]] = {}       # haId -> dormant entities
+        self._release_wake:dict[str, CALLBACK_TYPE] = {}    # haId -> release handle of the wake-up callback
+
+    def attach(self, homeconnect:HomeConnect) -> None:
+        """ Make the manager reachable from the entities of the HomeConnect object """
+        setattr(homeconnect, _DORMANCY_ATTR, self)
+
+    def add(self, entity:EntityBase) -> CALLBACK_TYPE:
+        """ Register the update callbacks of a new entity, returns a handle that removes the entity """
+        self._entities.add(entity)
+        if entity.dormant_when_unavailable and not entity.available:
+            # Start dormant rather than attaching the callbacks only to release them after the first state write
+            entity._dormant = True
+            self._dormant.setdefault(entity._appliance.haId, set()).add(entity)
+            asyncio.get_running_loop().call_soon(self._sync_appliance, entity._appliance)
+        else:
+            entity._release_updates = register_callback(entity._appliance, entity.async_on_update, entity.update_events)
+
+        def remove() -> None:
+            self._entities.discard(entity)
+            if entity._release_updates:
+                entity._release_updates()
+                entity._release_updates = None
+            if entity._dormant:
+                entity._dormant = False
+                self._dormant.get(entity._appliance.haId, set()).discard(entity)
+                asyncio.get_running_loop().call_soon(self._sync_appliance, entity._appliance)
+        return remove
+
+    def update(self, entity:EntityBase) -> None:
+        """ Put an entity to sleep after it wrote an unavailable state, or wake it after it wrote an available state """
+        dormant = not entity.available
+        if dormant == entity._dormant or entity not in self._entities:
+            return
+        entity._dormant = dormant
+        haid = entity._appliance.haId
+        if dormant:
+            self._dormant.setdefault(haid, set()).add(entity)
+        else:
+            self._dormant.get(haid, set()).discard(entity)
+        loop = asyncio.get_running_loop()
+        loop.call_soon(self._sync_entity, entity)
+        loop.call_soon(self._sync_appliance, entity._appliance)
+
+    def _wake(self, appliance:Appliance) -> None:
+        for entity in list(self._dormant.get(appliance.haId, ())):
+            if entity.available:
+                entity.on_wake()
+                entity.async_write_ha_state()
+
+    def _sync_entity(self, entity:EntityBase) -> None:
+        """ Attach or release the callbacks of an entity to match its current state """
+        if entity._dormant and entity._release_updates:
+            entity._release_updates()
+            entity._release_updates = None
+        elif not entity._dormant and not entity._release_updates and entity in self._entities:
+            entity._release_updates = register_callback(entity._appliance, entity.async_on_update, entity.update_events)
+
+    def _sync_appliance(self, appliance:Appliance) -> None:
+        """ Register the wake-up callback of an appliance while it has dormant entities """
+        haid = appliance.haId
+        if self._dormant.get(haid):
+            if haid not in self._release_wake:
+                self._release_wake[haid] = register_callback(appliance, self._wake, WAKE_EVENTS)
+        else:
+            self._dormant.pop(haid, None)
+            release = self._release_wake.pop(haid, None)
+            if release:
+                release()
+
+    def counts(self) -> dict[str, int]:
+        """ The number of entities that are attached to their update callbacks and the number of dormant entities """
+        dormant = sum(len(entities) for entities in self._dormant.values())
+        return { "active": len(self._entities) - dormant, "dormant": dormant }
+
+    def as_dict(self) -> dict:
+        """ The counts with the dormant entities by type, for the diagnostics """
+        by_type:dict[str, int] = {}
+        for entities in self._dormant.values():
+            for entity in entities:
+                by_type[type(entity).__name__] = by_type.get(type(entity).__name__, 0) + 1
+        return { **self.counts(), "dormant_by_type": dict(sorted(by_type.items())) }
+
+
+def get_dormancy(homeconnect:HomeConnect) -> DormancyManager|None:
+    """ Get the dormancy manager attached to a HomeConnect object, if there is one """
+    return getattr(homeconnect, _DORMANCY_ATTR, None)
@@ -1,6 +1,5 @@
 """Constants for the Home Connect New integration."""
 
-
 DOMAIN = "home_connect_alt"
 SIM_HOST = "https://simulator.home-connect.com"
 API_HOST = "https://api.home-connect.com"
@@ -10,6 +9,36 @@ SCOPES = "IdentifyAppliance Monitor Control Settings"
 CONF_SIMULATE = "simulate"
 CONF_LANG = "language"
 CONF_CACHE = "cache"
+CONF_MAX_CONCURRENCY = "max_concurrency"
+CONF_SLOW_CALLBACK_THRESHOLD = "slow_callback_threshold"
+CONF_LAZY_OPTIONS = "lazy_options"
+CONF_ENTITY_FILTERS = "entity_filters"
+CONF_FILTER_INCLUDE = "include"
+CONF_FILTER_EXCLUDE = "exclude"
+CONF_FILTER_APPLIANCE_TYPE = "appliance_type"
+CONF_FILTER_HAID = "haid"
+CONF_FILTER_KEY = "key"
+CONF_FILTER_PLATFORM = "platform"
+CONF_COMPACT = "compact"
+
+DEFAULT_MAX_CONCURRENCY = 4
+EVENT_BUFFER_SIZE = 200
+RECENT_EVENTS_SIZE = 20
+DIAGNOSTICS_MAX_SIZE = 2 * 1024 * 1024
+
+ENTRIES = "entries"
+PARKED_RUNTIMES = "parked_runtimes"
+RELOAD_GRACE_PERIOD = 60
+
+API_DAILY_LIMIT = 1000
+PERF_UPDATE_INTERVAL = 30
+PERF_LATENCY_SAMPLES = 1000
+SLOW_CALLBACK_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000]     # Upper bounds in milliseconds
+SLOW_CALLBACK_WARNING_INTERVAL = 300
+COMMAND_TRACE_SIZE = 100
+COMMAND_TRACE_TIMEOUT = 120
+PROGRAM_USAGE_SAVE_DELAY = 30
+COMPACT_WRITE_DELAY = 1
 
 HOME_CONNECT_DEVICE = {
     "identifiers": {(DOMAIN, "homeconnect")},
@@ -27,10 +56,20 @@ SPECIAL_ENTITIES = {
     "options": {
         "BSH.Common.Option.FinishInRelative": { "unit": None, "class": f"{DOMAIN}__timespan"},
         "BSH.Common.Option.ElapsedProgramTime": { "unit": None, "class": f"{DOMAIN}__timespan"},
-        "BSH.Common.Option.RemainingProgramTime": {"class": "timestamp" }
+        "BSH.Common.Option.RemainingProgramTime": { "unit": None, "class": "timestamp" }
    }
 }
 
+# The entities that are created for every appliance in the compact mode, by platform, the rest of the data is in the
+# attributes of the snapshot sensor
+COMPACT_SNAPSHOT_KEY = "snapshot"
+# The large attributes of the snapshot sensor which are left out of the recorder
+COMPACT_SNAPSHOT_UNRECORDED = frozenset({ "status", "settings", "selected_program", "active_program" })
+COMPACT_ENTITIES = {
+    "sensor": frozenset({ COMPACT_SNAPSHOT_KEY, "BSH.Common.Status.OperationState", "BSH.Common.Option.RemainingProgramTime" }),
+    "binary_sensor": frozenset({ "BSH.Common.Status.DoorState" })
+}
+
 DEVICE_ICON_MAP = {
     "Dryer": "mdi:tumble-dryer",
     "Washer": "mdi:washing-machine",
@@ -45,11 +84,35 @@ DEVICE_ICON_MAP = {
     "Hood": "mdi:hvac"
 }
 
+PERF_SENSORS = {
+    "events_per_second": { "name": "Events per Second", "unit": "events/s", "icon": "mdi:transit-connection-variant", "state_class": "measurement" },
+    "callbacks_per_event": { "name": "Callbacks per Event", "unit": None, "icon": "mdi:call-split", "state_class": "measurement" },
+    "state_writes_per_second": { "name": "State Writes per Second", "unit": "writes/s", "icon": "mdi:database-edit", "state_class": "measurement" },
+    "api_calls_last_minute": { "name": "API Calls Last Minute", "unit": "calls", "icon": "mdi:api", "state_class": "measurement" },
+    "api_calls_last_day": { "name": "API Calls Last Day", "unit": "calls", "icon": "mdi:api", "state_class": "measurement" },
+    "api_calls_remaining": { "name": "API Calls Remaining", "unit": "calls", "icon": "mdi:gauge", "state_class": "measurement" },
+    "events_total": { "name": "Events Total", "unit": "events", "icon": "mdi:counter", "state_class": "total_increasing" },
+    "callbacks_total": { "name": "Callbacks Total", "unit": "callbacks", "icon": "mdi:counter", "state_class": "total_increasing" },
+    "stream_reconnects": { "name": "Stream Reconnects", "unit": None, "icon": "mdi:connection", "state_class": "total_increasing" },
+    "latency_average": { "name": "Event Latency Average", "unit": "ms", "icon": "mdi:timer-outline", "state_class": "measurement" },
+    "latency_p95": { "name": "Event Latency p95", "unit": "ms", "icon": "mdi:timer-alert-outline", "state_class": "measurement" },
+    "active_entities": { "name": "Active Entities", "unit": "entities", "icon": "mdi:sleep-off", "state_class": "measurement" },
+    "dormant_entities": { "name": "Dormant Entities", "unit": "entities", "icon": "mdi:sleep", "state_class": "measurement" }
+}
+
 PUBLISHED_EVENTS = [
     "BSH.Common.Status.OperationState",
     "*.event.*"
 ]
 
+REFRESH_SECTIONS = [
+    "status",
+    "settings",
+    "selected_program",
+    "active_program",
+    "available_programs"
+]
+
 TRIGGERS_CONFIG = {
     #"program_started": { "key": "BSH.Common.Event.ProgramFinished" },
     "program_started": { "key": "BSH.Common.Status.OperationState", "value": "BSH.Common.EnumType.OperationState.Run" },
@@ -0,0 +1,139 @@
+""" Diagnostics support for the integration """
+from __future__ import annotations
+import json
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Any
+
+from home_connect_async import HomeConnect
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
+
+from .const import DIAGNOSTICS_MAX_SIZE, DOMAIN
+from .loader import DataLoader
+from .perf import PerfCounters
+from .runtime import get_entry_runtime
+
+_LOGGER = logging.getLogger(__name__)
+
+TO_REDACT = { "token", "access_token", "refresh_token", "id_token", "vib", "enumber", "client_id", "client_secret" }
+REDACTED = "**REDACTED**"
+
+
+async def async_get_config_entry_diagnostics(hass:HomeAssistant, entry:ConfigEntry) -> dict[str, Any]:
+    """ Return the diagnostics of the config entry
+
+    The counts, the event buffers and a snapshot of the data model are taken on the event loop, which is the only
+    place the data model is updated, so they are consistent. Only the redaction and the serialization of the
+    snapshot run in an executor.
+    """
+    runtime = get_entry_runtime(hass, entry.entry_id)
+    homeconnect:HomeConnect = runtime.homeconnect
+    loader:DataLoader = runtime.loader
+    perf:PerfCounters = runtime.perf
+
+    recent_events = { haid: list(events) for (haid, events) in loader.recent_events.items() }
+    info = {
+        "entry": { "data": dict(entry.data), "options": dict(entry.options) },
+        "status": homeconnect.status.name,
+        "loader": {
+            "loading": loader.loading,
+            "buffered_events": { haid: len(buffer) for (haid, buffer) in loader._buffers.items() }
+        },
+        "perf": {
+            "events": perf.events,
+            "callbacks": perf.callbacks,
+            "state_writes": perf.state_writes,
+            "stream_connects": perf.stream_connects,
+            "stats": perf.stats
+        },
+        "commands": perf.commands.as_dict(),
+        "slow_callbacks": runtime.slow_callbacks.as_dict() if runtime.slow_callbacks else None,
+        "entities": get_entity_counts(hass, entry),
+        "dormancy": runtime.dormancy.as_dict(),
+        "callbacks": get_callback_counts(homeconnect)
+    }
+    appliances = { haid: appliance.to_dict() for (haid, appliance) in homeconnect.appliances.items() }
+
+    return await hass.async_add_executor_job(build_diagnostics, info, appliances, recent_events, DIAGNOSTICS_MAX_SIZE)
+
+
+def get_entity_counts(hass:HomeAssistant, entry:ConfigEntry) -> dict[str, dict[str, int]]:
+    """ Count the registered entities of every appliance by platform """
+    device_reg = dr.async_get(hass)
+    entity_reg = er.async_get(hass)
+    counts:dict[str, dict[str, int]] = {}
+    for entity in er.async_entries_for_config_entry(entity_reg, entry.entry_id):
+        device = device_reg.async_get(entity.device_id) if entity.device_id else None
+        identifier = next((id for (domain, id) in device.identifiers if domain == DOMAIN), None) if device else None
+        platform_counts = counts.setdefault(identifier or "none", {})
+        platform_counts[entity.domain] = platform_counts.get(entity.domain, 0) + 1
+    return counts
+
+
+def get_callback_counts(homeconnect:HomeConnect) -> dict[str, int]:
+    """ Count the callbacks that are registered for every appliance and for the global events """
+    return {
+        haid or "global": sum(len(callbacks) for callbacks in keys.values())
+        for (haid, keys) in homeconnect._callbacks._callbacks.items()
+    }
+
+
+def build_diagnostics(info:dict, appliances:dict[str, dict], recent_events:dict[str, list], max_size:int) -> dict[str, Any]:
+    """ Build the diagnostics dump within the size limit and replace the appliance IDs with aliases
+
+    The appliances are snapshots of the data model keyed by haId. They are added one by one and the ones that
+    don't fit in the size limit are only listed under "truncated".
+    """
+    aliases = {}
+    for (index, haid) in enumerate(appliances, 1):
+        aliases[haid] = f"appliance_{index}"
+        aliases[haid.lower().replace('-','_')] = f"appliance_{index}"
+    # The IDs also appear inside other strings, such as the unique IDs of the entities and the API endpoints
+    pattern = re.compile("|".join(re.escape(haid) for haid in sorted(aliases, key=len, reverse=True))) if aliases else None
+
+    def redact_text(text:str) -> str:
+        return pattern.sub(lambda match: aliases[match.group()], text) if pattern else text
+
+    def redact(data:Any) -> Any:
+        if isinstance(data, dict):
+            return {
+                redact_text(str(key)): REDACTED if key in TO_REDACT and value else redact(value)
+                for (key, value) in data.items()
+            }
+        if isinstance(data, (list, tuple, set)):
+            return [ redact(item) for item in data ]
+        if data is None or isinstance(data, (bool, int, float)):
+            return data
+        return redact_text(str(data))
+
+    dump = redact(info)
+    dump["generated"] = datetime.now(timezone.utc).isoformat()
+    dump["max_size"] = max_size
+    dump["appliances"] = {}
+    dump["truncated"] = []
+    size = len(json.dumps(dump))
+
+    for (haid, model) in appliances.items():
+        section = redact({
+            "model": model,
+            "recent_events": [
+                { "time": datetime.fromtimestamp(timestamp, timezone.utc).isoformat(), "type": event_type, "data": data }
+                for (timestamp, event_type, data) in recent_events.get(haid, [])
+            ]
+        })
+        section_size = len(json.dumps(section))
+        alias = aliases[haid]
+        if size + section_size > max_size:
+            dump["truncated"].append(alias)
+            continue
+        dump["appliances"][alias] = section
+        size += section_size
+
+    if dump["truncated"]:
+        dump["truncated_reason"] = f"The data of {len(dump['truncated'])} appliances was left out to keep the diagnostics under {max_size} bytes"
+        _LOGGER.debug("The diagnostics of %d appliances were left out to fit in %d bytes", len(dump["truncated"]), max_size)
+    return dump
@@ -0,0 +1,89 @@
+""" Include and exclude filters for the entities of the appliances """
+from __future__ import annotations
+import fnmatch
+import re
+
+from home_connect_async import Appliance
+
+from .const import (
+    COMPACT_ENTITIES, CONF_FILTER_APPLIANCE_TYPE, CONF_FILTER_EXCLUDE, CONF_FILTER_HAID, CONF_FILTER_INCLUDE, CONF_FILTER_KEY, CONF_FILTER_PLATFORM
+)
+
+# The fields of a rule, in the order they are matched, with whether the glob is case sensitive
+RULE_FIELDS = [
+    (CONF_FILTER_PLATFORM, False),
+    (CONF_FILTER_APPLIANCE_TYPE, False),
+    (CONF_FILTER_HAID, False),
+    (CONF_FILTER_KEY, True)
+]
+
+
+def _compile_rules(rules:list[dict], fields:list[tuple[str, bool]]) -> list[tuple[re.Pattern|None, ...]]|None:
+    """ Compile the glob patterns of every rule into one regular expression per field, in the order of the fields
+
+    A field that is missing from a rule is None and matches any value
+    """
+    compiled = [
+        tuple(
+            re.compile(fnmatch.translate(rule[field]), 0 if case_sensitive else re.IGNORECASE) if rule.get(field) is not None else None
+            for (field, case_sensitive) in fields
+        )
+        for rule in rules
+    ]
+    return compiled or None
+
+
+def _matches(rules:list[tuple[re.Pattern|None, ...]], values:tuple[str, ...]) -> bool:
+    """ Whether every field of any of the rules matches the values """
+    return any(all(pattern is None or pattern.match(value) for (pattern, value) in zip(rule, values)) for rule in rules)
+
+
+class EntityFilter():
+    """ Decides which entities are created for the keys of the appliances
+
+    The glob patterns of the include and exclude rules are compiled once into regular expressions. When there are include rules only the
+    entities that match one of them are created, the entities that match an exclude rule are never created. Entities
+    without a key, such as the program select or the start button, are only filtered by the exclude rules that don't
+    have a key pattern. The decisions are cached by platform, appliance and key because the platforms scan every
+    appliance again whenever it is paired or a program is selected, so the rules are only evaluated once for every entity.
+
+    In the compact mode only the COMPACT_ENTITIES and the entities that match an include rule are created, entities
+    without a key aren't created at all.
+    """
+    def __init__(self, include:list[dict]=None, exclude:list[dict]=None, compact:bool=False) -> None:
+        self.compact = compact
+        self._include = _compile_rules(include or [], RULE_FIELDS)
+        self._exclude = _compile_rules(exclude or [], RULE_FIELDS)
+        self._exclude_keyless = _compile_rules([ rule for rule in exclude or [] if rule.get(CONF_FILTER_KEY) is None ], RULE_FIELDS[:-1])
+        self._decisions:dict[tuple[str, str, str|None], bool] = {}
+
+    @classmethod
+    def from_config(cls, conf:dict|None, compact:bool=False) -> EntityFilter|None:
+        """ Create the filter from the entity_filters configuration, None when there are no rules and it isn't compact """
+        if not compact and (not conf or not (conf.get(CONF_FILTER_INCLUDE) or conf.get(CONF_FILTER_EXCLUDE))):
+            return None
+        conf = conf or {}
+        return cls(conf.get(CONF_FILTER_INCLUDE), conf.get(CONF_FILTER_EXCLUDE), compact)
+
+    def allows(self, platform:str, appliance:Appliance, key:str|None) -> bool:
+        """ Whether the entity of the platform for the key of the appliance should be created """
+        cache_key = (platform, appliance.haId, key)
+        decision = self._decisions.get(cache_key)
+        if decision is None:
+            values = (platform, appliance.type or "", appliance.haId)
+            if key is None:
+                decision = not self.compact and (self._exclude_keyless is None or not _matches(self._exclude_keyless, values))
+            else:
+                values += (key,)
+                if self.compact:
+                    included = key in COMPACT_ENTITIES.get(platform, ()) or (self._include is not None and _matches(self._include, values))
+                else:
+                    included = self._include is None or _matches(self._include, values)
+                decision = included and (self._exclude is None or not _matches(self._exclude, values))
+            self._decisions[cache_key] = decision
+        return decision
+
+    def forget_appliance(self, appliance:Appliance) -> None:
+        """ Drop the cached decisions of a depaired appliance """
+        for cache_key in [ cache_key for cache_key in self._decisions if cache_key[1] == appliance.haId ]:
+            del self._decisions[cache_key]
@@ -0,0 +1,43 @@
+""" Interning of the keys, units and types of the Home Connect data """
+from __future__ import annotations
+import json
+import sys
+from typing import Any
+
+# The fields whose string values are keys, units, types or other constants that repeat across appliances and events.
+# The "value" field isn't interned, it also holds free text such as names and timestamps which would stay in the
+# interned strings table for the life of the process.
+INTERNED_FIELDS = frozenset({ "key", "haId", "type", "unit", "execution", "allowedvalues" })
+
+_intern = sys.intern
+
+
+def intern_data(data:Any) -> Any:
+    """ Return a copy of decoded JSON data with all the object keys, and the values of INTERNED_FIELDS, interned
+
+    Keys such as BSH.Common.Option.RemainingProgramTime, units and types appear in every program, option, status and
+    setting of every appliance and in every stream event. Interning keeps a single copy of every one of them and lets
+    the dictionary lookups by the keys in the data model and the callback registry match on identity instead of
+    comparing the characters.
+    """
+    if type(data) is dict:
+        return {
+            _intern(key): _intern_value(value) if key in INTERNED_FIELDS else intern_data(value)
+            for (key, value) in data.items()
+        }
+    if type(data) is list:
+        return [ intern_data(item) for item in data ]
+    return data
+
+
+def _intern_value(value:Any) -> Any:
+    if type(value) is str:
+        return _intern(value)
+    if type(value) is list:
+        return [ _intern(item) if type(item) is str else intern_data(item) for item in value ]
+    return intern_data(value)
+
+
+def intern_loads(text:str|bytes, **kwargs) -> Any:
+    """ json.loads() which interns the keys, units and types of the decoded data """
+    return intern_data(json.loads(text, **kwargs))
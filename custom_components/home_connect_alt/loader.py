@@ -0,0 +1,345 @@
+""" Concurrent loading of the Home Connect data model """
+from __future__ import annotations
+import asyncio
+import inspect
+import json
+import logging
+import time
+from collections import deque
+from collections.abc import Callable
+
+from home_connect_async import Appliance, HomeConnect, HomeConnectError, Events
+
+from .const import EVENT_BUFFER_SIZE, RECENT_EVENTS_SIZE
+from .interning import intern_loads
+from .perf import PerfCounters
+from .recorder import EventRecorder
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DataLoader():
+    """ Loads the appliances of a HomeConnect object concurrently
+
+    Appliances, and the data sections of each appliance, are fetched in parallel while the number of
+    appliances being loaded at the same time is bounded by a semaphore. The actual number of concurrent API
+    requests is bounded by the auth object. Each appliance is published, with the PAIRED event, as soon as it
+    finishes loading rather than after the whole list was loaded.
+
+    The event stream can be opened before the loading starts. Events of appliances that are still being loaded
+    are buffered in a bounded queue per appliance and replayed once the appliance snapshot was loaded, skipping
+    events that are not newer than the snapshot. If events newer than the snapshot were dropped because the queue
+    overflowed, the appliance data is fetched again before the remaining events are replayed.
+    """
+    def __init__(self, homeconnect:HomeConnect, max_concurrency:int, buffer_size:int=EVENT_BUFFER_SIZE) -> None:
+        self._homeconnect = homeconnect
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._load_task:asyncio.Task = None
+        self._on_complete:Callable[[HomeConnect], None] = None
+        self._on_error:Callable[[HomeConnect, Exception], None] = None
+
+        self._buffer_size = buffer_size
+        self._buffering = True
+        self._buffers:dict[str, deque] = {}
+        self._dropped:dict[str, float] = {}
+        self._pending:set[str]|None = None      # None until the list of appliances is known
+        self._process_updates:Callable = None
+        self.recorder:EventRecorder|None = None
+        self.perf:PerfCounters|None = None
+        self.recent_events:dict[str, deque] = {}    # The last few stream events of every appliance, for diagnostics
+
+    def subscribe_for_updates(self) -> None:
+        """ Open the event stream without waiting for the data to be loaded """
+        homeconnect = self._homeconnect
+        if not self._process_updates:
+            # The SDK has no hook for stream events so the handler is wrapped on this instance
+            self._process_updates = homeconnect._async_process_updates
+            homeconnect._async_process_updates = self._async_process_event
+        homeconnect.subscribe_for_updates()
+
+    loading = property(lambda self: self._load_task is not None and not self._load_task.done())
+
+    def set_max_concurrency(self, max_concurrency:int) -> None:
+        """ Change the number of appliances that are loaded at the same time """
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def set_callbacks(self,
+        on_complete:Callable[[HomeConnect], None] = None,
+        on_error:Callable[[HomeConnect, Exception], None] = None
+    ) -> None:
+        """ Set the callbacks that are called when the loading completes, also while the loading is in progress """
+        self._on_complete = on_complete
+        self._on_error = on_error
+
+    def start_load_data_task(self,
+        on_complete:Callable[[HomeConnect], None] = None,
+        on_error:Callable[[HomeConnect, Exception], None] = None
+    ) -> asyncio.Task:
+        """ Start loading the data model in a background task """
+        self.set_callbacks(on_complete, on_error)
+        self._load_task = asyncio.create_task(self.async_load_data(), name="home_connect_alt_load_data")
+        return self._load_task
+
+    def close(self) -> None:
+        """ Cancel the loading task if it is still running and the delayed retries of all the appliances """
+        if self._load_task and not self._load_task.done():
+            self._load_task.cancel()
+        self._load_task = None
+        for appliance in self._homeconnect.appliances.values():
+            self.cancel_appliance_tasks(appliance)
+        self._buffers.clear()
+        self._dropped.clear()
+        self.recent_events.clear()
+        self.recorder = None
+        self.set_callbacks(None, None)
+
+    @staticmethod
+    def cancel_appliance_tasks(appliance:Appliance) -> None:
+        """ Cancel the delayed data fetch retries of an appliance """
+        # The SDK keeps the latest retry task, which schedules the next one, on the appliance
+        task:asyncio.Task = getattr(appliance, "_wait_for_device_task", None)
+        if task and not task.done():
+            task.cancel()
+        appliance._wait_for_device_task = None
+
+    async def async_load_data(self) -> None:
+        """ Load the list of appliances and then load all the appliances concurrently """
+        homeconnect = self._homeconnect
+        homeconnect.status |= HomeConnect.HomeConnectStatus.LOADING
+
+        try:
+            list_time = time.monotonic()
+            response = await homeconnect._api.async_get('/api/homeappliances')
+            if response.status != 200:
+                _LOGGER.warning("Failed to get the list of appliances code=%d error=%s", response.status, response.error_key)
+                raise HomeConnectError(f"Failed to get the list of appliances (code={response.status})", response=response)
+
+            appliances = response.data.get('homeappliances', []) if response.data else []
+            self._pending = { properties['haId'] for properties in appliances }
+
+            # Appliances that are not in the list were paired after it was fetched so their events are processed now
+            for haid in [ haid for haid in self._buffers if haid not in self._pending ]:
+                self._pending.add(haid)
+                await self._async_replay_events(haid, list_time)
+
+            # A failure of one appliance doesn't stop the others, the appliance isn't published and its buffered
+            # events are dropped when the buffering stops
+            results = await asyncio.gather(*[ self.async_load_appliance(properties, list_time) for properties in appliances ], return_exceptions=True)
+            for (properties, result) in zip(appliances, results):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                if isinstance(result, Exception):
+                    _LOGGER.warning("Failed to load the appliance %s (%s)", properties.get('name'), properties['haId'], exc_info=result)
+
+            # clear appliances that are no longer paired with the service
+            haid_list = [ properties['haId'] for properties in appliances ]
+            for haid in [ haid for haid in homeconnect.appliances if haid not in haid_list ]:
+                await homeconnect._callbacks.async_broadcast_event(homeconnect.appliances[haid], Events.DEPAIRED)
+                del homeconnect.appliances[haid]
+
+            homeconnect.status |= HomeConnect.HomeConnectStatus.LOADED
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            _LOGGER.warning("Failed to load data from Home Connect (%s)", str(ex), exc_info=ex)
+            homeconnect.status = HomeConnect.HomeConnectStatus.LOADING_FAILED
+            if self._on_error:
+                await self._async_call(self._on_error, homeconnect, ex)
+            return
+        finally:
+            await self._async_stop_buffering()
+
+        if self._on_complete:
+            await self._async_call(self._on_complete, homeconnect)
+
+    async def async_load_appliance(self, properties:dict, list_time:float) -> None:
+        """ Load or refresh a single appliance, publish it and replay its buffered events """
+        homeconnect = self._homeconnect
+        haid = properties['haId']
+
+        if not properties['connected']:
+            if haid in homeconnect.appliances:
+                _LOGGER.warning("The appliance (%s) is disconnected when loading for the first time", haid)
+                await homeconnect.appliances[haid].async_set_connection_state(False)
+            await self._async_replay_events(haid, list_time)
+            return
+
+        async with self._semaphore:
+            appliance = homeconnect.appliances.get(haid)
+            if not appliance:
+                appliance = Appliance(
+                    name = properties['name'],
+                    brand = properties['brand'],
+                    type = properties['type'],
+                    vib = properties['vib'],
+                    connected = properties['connected'],
+                    enumber = properties['enumber'],
+                    haId = haid,
+                    uri = f"/api/homeappliances/{haid}"
+                )
+                appliance._homeconnect = homeconnect
+                appliance._callbacks = homeconnect._callbacks
+                appliance._api = homeconnect._api
+
+            try:
+                snapshot_time = time.monotonic()
+                await self.async_fetch_appliance_data(appliance)
+            except HomeConnectError as ex:
+                snapshot_time = 0
+                if ex.error_key:
+                    # Let the SDK handle the disconnected state and the delayed retries
+                    _LOGGER.debug("Got an error loading appliance data for %s (%s) code=%s error=%s - will retry", appliance.name, haid, ex.code, ex.error_key)
+                    await appliance.async_set_connection_state(False)
+                    appliance._wait_for_device_task = asyncio.create_task(appliance.async_fetch_data(delay=60))
+                elif haid in homeconnect.appliances:
+                    _LOGGER.warning("Failed to refresh the data of %s (%s) code=%s (%s), keeping the existing data", appliance.name, haid, ex.code, ex.msg)
+                else:
+                    # Like the SDK, only an error that is reported for the appliance means it is offline. Other errors,
+                    # such as an expired token or an unavailable service, are not retried with the appliance.
+                    raise
+
+        homeconnect.appliances[haid] = appliance
+        await homeconnect._callbacks.async_broadcast_event(appliance, Events.PAIRED)
+        _LOGGER.debug("Loaded appliance: %s", appliance.name)
+        await self._async_replay_events(haid, snapshot_time)
+
+    async def async_fetch_appliance_data(self, appliance:Appliance) -> None:
+        """ Fetch the independent data sections of an appliance in parallel """
+        _LOGGER.debug("Starting to load appliance data for %s (%s)", appliance.name, appliance.haId)
+        results = await asyncio.gather(
+            appliance._async_fetch_programs('selected'),
+            appliance._async_fetch_programs('active'),
+            appliance._async_fetch_settings(),
+            appliance._async_fetch_status(),
+            appliance._async_fetch_commands(),
+            return_exceptions=True
+        )
+        # All the sections finish before an error is raised so no request is left running
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        (
+            appliance.selected_program,
+            appliance.active_program,
+            appliance.settings,
+            appliance.status,
+            appliance.commands
+        ) = results
+        # The options of the current program are fetched with the available programs so this must come last
+        appliance.available_programs = await appliance._async_fetch_programs('available')
+        _LOGGER.debug("Finished loading appliance data for %s (%s)", appliance.name, appliance.haId)
+
+        if not appliance.connected:
+            appliance.connected = True
+            await appliance._callbacks.async_broadcast_event(appliance, Events.CONNECTION_CHANGED, True)
+        else:
+            await appliance._callbacks.async_broadcast_event(appliance, Events.DATA_CHANGED)
+
+    async def _async_process_event(self, event) -> None:
+        """ Process a stream event or buffer it if its appliance is still being loaded """
+        if self.recorder:
+            self.recorder.record(event)
+        if event.type != 'KEEP-ALIVE':
+            recent = self.recent_events.get(event.last_event_id)
+            if recent is None:
+                recent = self.recent_events[event.last_event_id] = deque(maxlen=RECENT_EVENTS_SIZE)
+            recent.append((time.time(), event.type, event.data))
+        if self._buffering and event.type != 'KEEP-ALIVE':
+            haid = self._get_event_haid(event)
+            if self._pending is None or haid in self._pending:
+                buffer = self._buffers.get(haid)
+                if buffer is None:
+                    buffer = self._buffers[haid] = deque(maxlen=self._buffer_size)
+                elif len(buffer) == buffer.maxlen:
+                    self._dropped[haid] = buffer[0][0]
+                buffer.append((time.monotonic(), event))
+                return
+        if self.perf:
+            await self._async_dispatch_event(event, time.monotonic())
+        else:
+            await self._async_process_updates(event)
+
+    async def _async_dispatch_event(self, event, received:float) -> None:
+        """ Process an event while the performance counters track the callbacks and state writes it causes """
+        perf = self.perf
+        if event.type != 'KEEP-ALIVE':
+            perf.events += 1
+        perf.event_time = received
+        try:
+            await self._async_process_updates(event)
+        finally:
+            perf.event_time = None
+
+    async def _async_process_updates(self, event) -> None:
+        """ Process a stream event, the items of data change events are decoded with interned keys
+
+        This replaces the handling of NOTIFY, STATUS and EVENT events by the SDK, which decodes the event with
+        json.loads(), the other events are passed to the SDK as they are
+        """
+        if event.type not in ('NOTIFY', 'STATUS', 'EVENT'):
+            await self._process_updates(event)
+            return
+        data = intern_loads(event.data)
+        appliance = self._homeconnect.appliances.get(data['haId'])
+        if appliance:
+            for item in data.get('items', []):
+                await appliance.async_update_data(item)
+
+    async def _async_replay_events(self, haid:str, since:float) -> None:
+        """ Replay the buffered events of an appliance which were received after the snapshot was taken """
+        appliance = self._homeconnect.appliances.get(haid)
+        if self._overflowed(haid, since) and appliance and appliance.connected:
+            _LOGGER.debug("The event buffer of %s overflowed while loading, fetching the appliance data again", haid)
+            try:
+                snapshot_time = time.monotonic()
+                await self.async_fetch_appliance_data(appliance)
+                since = snapshot_time
+            except HomeConnectError as ex:
+                _LOGGER.warning("Failed to fetch the data of %s again after its event buffer overflowed code=%s", haid, ex.code)
+
+        buffer = self._buffers.get(haid)
+        replayed = 0
+        # Events received while replaying are appended to the same buffer so they are processed in order
+        while buffer:
+            (timestamp, event) = buffer.popleft()
+            if timestamp > since:
+                if self.perf:
+                    await self._async_dispatch_event(event, timestamp)
+                else:
+                    await self._async_process_updates(event)
+                replayed += 1
+        if buffer is not None:
+            _LOGGER.debug("Replayed %d buffered events for %s", replayed, haid)
+        self._buffers.pop(haid, None)
+        self._dropped.pop(haid, None)
+        if self._pending:
+            self._pending.discard(haid)
+
+    def _overflowed(self, haid:str, since:float) -> bool:
+        """ Check and clear whether buffered events of an appliance that are newer than since were dropped """
+        dropped = self._dropped.pop(haid, None)
+        return dropped is not None and dropped > since
+
+    async def _async_stop_buffering(self) -> None:
+        """ Process whatever is left in the buffers and let all the following events through """
+        self._pending = set(self._buffers.keys())
+        for haid in list(self._buffers.keys()):
+            await self._async_replay_events(haid, 0)
+        self._buffering = False
+
+    @staticmethod
+    def _get_event_haid(event) -> str|None:
+        """ Get the haId of the appliance a stream event refers to """
+        if event.type in ['NOTIFY', 'STATUS', 'EVENT']:
+            try:
+                return json.loads(event.data).get('haId', event.last_event_id)
+            except ValueError:
+                pass
+        return event.last_event_id
+
+    async def _async_call(self, callback:Callable, *args) -> None:
+        """ Call a callback which may be either sync or async """
+        if inspect.iscoroutinefunction(callback):
+            await callback(*args)
+        else:
+            callback(*args)
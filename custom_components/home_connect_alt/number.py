@@ -7,24 +7,23 @@ from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType
 
-from .common import EntityBase, EntityManager
+from .common import EntityBase, EntityManager, get_program_options, register_callback
 from .const import DOMAIN, SPECIAL_ENTITIES
+from .runtime import get_entry_runtime
 
 
 async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_add_entities:AddEntitiesCallback) -> None:
     """Add Numbers for passed config_entry in HA."""
     #auth = hass.data[DOMAIN][config_entry.entry_id]
-    homeconnect:HomeConnect = hass.data[DOMAIN]['homeconnect']
-    entity_manager = EntityManager(async_add_entities)
+    runtime = get_entry_runtime(hass, config_entry.entry_id)
+    homeconnect:HomeConnect = runtime.homeconnect
+    entity_manager = EntityManager(async_add_entities, runtime.entity_filter, "number")
 
     def add_appliance(appliance:Appliance) -> None:
-        if appliance.available_programs:
-            for program in appliance.available_programs.values():
-                if program.options:
-                    for option in program.options.values():
-                        if option.key not in SPECIAL_ENTITIES['ignore'] and option.type in ["Int", "Float", "Double"]:
-                            device = OptionNumber(appliance, option.key, {"opt": option})
-                            entity_manager.add(device)
+        for option in get_program_options(appliance, runtime.program_usage):
+            if option.key not in SPECIAL_ENTITIES['ignore'] and option.type in ["Int", "Float", "Double"]:
+                device = OptionNumber(appliance, option.key, {"opt": option})
+                entity_manager.add(device)
 
         for setting in appliance.settings.values():
             if setting.key not in SPECIAL_ENTITIES['ignore'] and setting.type in ["Int", "Float", "Double"]:
@@ -37,14 +36,16 @@ async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_
     def remove_appliance(appliance:Appliance) -> None:
         entity_manager.remove_appliance(appliance)
 
-    homeconnect.register_callback(add_appliance, [Events.PAIRED, Events.PROGRAM_SELECTED])
-    homeconnect.register_callback(remove_appliance, Events.DEPAIRED)
+    config_entry.async_on_unload(register_callback(homeconnect, add_appliance, [Events.PAIRED, Events.PROGRAM_SELECTED]))
+    config_entry.async_on_unload(register_callback(homeconnect, remove_appliance, Events.DEPAIRED))
     for appliance in homeconnect.appliances.values():
         add_appliance(appliance)
 
 
 class OptionNumber(EntityBase, NumberEntity):
     """ Class for numeric options """
+    dormant_when_unavailable = True
+
     @property
     def device_class(self) -> str:
         return f"{DOMAIN}__options"
@@ -101,7 +102,8 @@ class OptionNumber(EntityBase, NumberEntity):
         try:
             if self._conf['opt'].type == 'Int':
                 value = int(value)
-            await self._appliance.async_set_option(self._key, value)
+            async with self.trace_command("set_option", self._key, value):
+                await self._appliance.async_set_option(self._key, value)
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to set the option value: {ex.error_description} ({ex.code} - {self._key}={value})")
@@ -156,7 +158,8 @@ class SettingsNumber(EntityBase, NumberEntity):
 
     async def async_set_value(self, value: float) -> None:
         try:
-            await self._appliance.async_apply_setting(self._key, value)
+            async with self.trace_command("apply_setting", self._key, value):
+                await self._appliance.async_apply_setting(self._key, value)
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to apply the setting value: {ex.error_description} ({ex.code})")
@@ -0,0 +1,233 @@
+""" Low overhead performance counters of the integration """
+from __future__ import annotations
+import functools
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable
+
+from home_connect_async import HomeConnect
+from homeassistant.core import CALLBACK_TYPE, callback
+
+from .const import API_DAILY_LIMIT, PERF_LATENCY_SAMPLES, SLOW_CALLBACK_BUCKETS, SLOW_CALLBACK_WARNING_INTERVAL
+from .tracing import CommandTracer
+
+if TYPE_CHECKING:
+    from .common import DormancyManager
+
+_LOGGER = logging.getLogger(__name__)
+
+_COUNTERS_ATTR = "_perf_counters"
+
+
+class PerfCounters():
+    """ Counts the work done on the event hot path and computes the statistics on a fixed interval
+
+    The hot path only increments plain integer counters and appends to bounded queues, the rates, averages
+    and percentiles are computed by update() which is called by a timer. The listeners are notified after
+    every update so the diagnostic sensors are written once per interval and not for every event.
+    """
+    def __init__(self) -> None:
+        self.events = 0
+        self.callbacks = 0
+        self.state_writes = 0
+        self.stream_connects = 0
+        self.event_time:float|None = None      # The time the event that is currently processed was received
+        self._api_calls:deque[float] = deque()
+        self._latencies:deque[float] = deque(maxlen=PERF_LATENCY_SAMPLES)
+        self._listeners:list[Callable[[], None]] = []
+        self._call_wrappers:list[Callable] = []
+        self._base_call:Callable = None
+        self._call:Callable = None
+        self._last = (time.monotonic(), 0, 0, 0)
+        self.stats:dict[str, float|int] = {}
+        self.commands = CommandTracer(self)
+        self.dormancy:DormancyManager|None = None
+
+    def attach(self, homeconnect:HomeConnect) -> None:
+        """ Count the callbacks invoked by the HomeConnect object and make the counters reachable from its entities """
+        setattr(homeconnect, _COUNTERS_ATTR, self)
+        registry = homeconnect._callbacks
+        if getattr(registry, _COUNTERS_ATTR, None):
+            return
+        # The SDK has no hook for callback invocations so the method is wrapped on this instance
+        self._base_call = self._call = registry._async_call
+        async def async_counted_call(*args) -> None:
+            self.callbacks += 1
+            await self._call(*args)
+        registry._async_call = async_counted_call
+        setattr(registry, _COUNTERS_ATTR, self)
+
+    def add_call_wrapper(self, wrapper:Callable) -> CALLBACK_TYPE:
+        """ Wrap every callback invocation, returns a handle that removes the wrapper
+
+        The wrapper is called as wrapper(call, callback, appliance, event_key, value) and must await call() with the
+        rest of the arguments. Wrappers are only added by opt-in diagnostic tools so the hot path pays nothing for them
+        when none is active.
+        """
+        self._call_wrappers.append(wrapper)
+        self._chain_call_wrappers()
+        def remove() -> None:
+            if wrapper in self._call_wrappers:
+                self._call_wrappers.remove(wrapper)
+                self._chain_call_wrappers()
+        return remove
+
+    def _chain_call_wrappers(self) -> None:
+        call = self._base_call
+        for wrapper in self._call_wrappers:
+            call = functools.partial(wrapper, call)
+        self._call = call
+
+    def api_call(self) -> None:
+        """ Count a request to the Home Connect API """
+        self._api_calls.append(time.monotonic())
+
+    def state_written(self) -> None:
+        """ Count a state write and record its latency if it was triggered by a stream event """
+        self.state_writes += 1
+        if self.event_time is not None:
+            self._latencies.append(time.monotonic() - self.event_time)
+
+    def add_listener(self, listener:Callable[[], None]) -> CALLBACK_TYPE:
+        """ Add a listener that is called after every update, returns a handle that removes it """
+        self._listeners.append(listener)
+        def remove() -> None:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+        return remove
+
+    @callback
+    def update(self, now=None) -> None:
+        """ Compute the statistics for the time since the last update and notify the listeners """
+        timestamp = time.monotonic()
+        (last_time, last_events, last_callbacks, last_writes) = self._last
+        elapsed = max(timestamp - last_time, 1e-6)
+        events = self.events - last_events
+        callbacks = self.callbacks - last_callbacks
+        writes = self.state_writes - last_writes
+        self._last = (timestamp, self.events, self.callbacks, self.state_writes)
+
+        api_calls = self._api_calls
+        while api_calls and api_calls[0] < timestamp - 86400:
+            api_calls.popleft()
+        calls_last_minute = 0
+        for call_time in reversed(api_calls):
+            if call_time < timestamp - 60:
+                break
+            calls_last_minute += 1
+
+        latencies = sorted(self._latencies)
+        self._latencies.clear()
+        entities = self.dormancy.counts() if self.dormancy else {}
+
+        self.stats = {
+            "events_per_second": round(events / elapsed, 2),
+            "callbacks_per_event": round(callbacks / events, 1) if events else 0,
+            "state_writes_per_second": round(writes / elapsed, 2),
+            "api_calls_last_minute": calls_last_minute,
+            "api_calls_last_day": len(api_calls),
+            "api_calls_remaining": max(API_DAILY_LIMIT - len(api_calls), 0),
+            "events_total": self.events,
+            "callbacks_total": self.callbacks,
+            "stream_reconnects": max(self.stream_connects - 1, 0),
+            "latency_average": round(sum(latencies) * 1000 / len(latencies), 2) if latencies else None,
+            "latency_p95": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000, 2) if latencies else None,
+            "active_entities": entities.get("active"),
+            "dormant_entities": entities.get("dormant")
+        }
+        for listener in list(self._listeners):
+            listener()
+
+
+class _TimedSteps():
+    """ Await a coroutine and add up the time of each of its steps, without the time it was suspended """
+    def __init__(self, coro) -> None:
+        self._coro = coro
+        self.duration = 0.0
+
+    def __await__(self):
+        coro = self._coro
+        (value, error) = (None, None)
+        while True:
+            start = time.perf_counter()
+            try:
+                future = coro.send(value) if error is None else coro.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.duration += time.perf_counter() - start
+            try:
+                value = yield future
+                error = None
+            except BaseException as ex:     # Forward the cancellation and the other errors to the coroutine
+                (value, error) = (None, ex)
+
+
+class SlowCallbackDetector():
+    """ Times every callback invocation and warns about the callbacks that take longer than a threshold
+
+    The durations are counted in fixed bucket histograms per callback type, such as "ProgramOptionSensor.async_on_update"
+    or "sensor.add_appliance", and event key. Only the time the callback runs on the event loop is counted, the time
+    it is suspended while it awaits, for example an API request, is left out because it doesn't block the loop.
+    At most one warning is logged for every callback type and event key in SLOW_CALLBACK_WARNING_INTERVAL seconds.
+    """
+    def __init__(self, threshold_ms:float) -> None:
+        self._threshold = threshold_ms / 1000
+        self._histograms:dict[tuple[str, str], list[int]] = {}
+        self._max:dict[tuple[str, str], float] = {}
+        self._warned:dict[tuple[str, str], float] = {}
+
+    async def async_call(self, call:Callable, callback:Callable, appliance, event_key, value) -> None:
+        """ Call wrapper for PerfCounters.add_call_wrapper() """
+        timed = _TimedSteps(call(callback, appliance, event_key, value))
+        try:
+            await timed
+        finally:
+            self.record(callback, event_key, timed.duration)
+
+    def record(self, callback:Callable, event_key, duration:float) -> None:
+        """ Count the duration of a single callback invocation """
+        owner = getattr(callback, "__self__", None)
+        if owner is not None:
+            callback_type = f"{type(owner).__name__}.{callback.__name__}"
+        else:
+            callback_type = f"{callback.__module__.rsplit('.', 1)[-1]}.{getattr(callback, '__name__', type(callback).__name__)}"
+        key = (callback_type, str(getattr(event_key, "value", event_key)))
+
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = [0] * (len(SLOW_CALLBACK_BUCKETS) + 1)
+        duration_ms = duration * 1000
+        bucket = 0
+        while bucket < len(SLOW_CALLBACK_BUCKETS) and duration_ms > SLOW_CALLBACK_BUCKETS[bucket]:
+            bucket += 1
+        histogram[bucket] += 1
+        if duration > self._max.get(key, 0):
+            self._max[key] = duration
+
+        if duration >= self._threshold:
+            now = time.monotonic()
+            if now - self._warned.get(key, -SLOW_CALLBACK_WARNING_INTERVAL) >= SLOW_CALLBACK_WARNING_INTERVAL:
+                self._warned[key] = now
+                _LOGGER.warning("The %s callback for %s took %.1f ms", callback_type, key[1], duration_ms)
+
+    def as_dict(self) -> dict:
+        """ The histograms, keyed by callback type and event key, for the diagnostics """
+        labels = [ f"<={bound}ms" for bound in SLOW_CALLBACK_BUCKETS ] + [ f">{SLOW_CALLBACK_BUCKETS[-1]}ms" ]
+        return {
+            "threshold_ms": self._threshold * 1000,
+            "callbacks": {
+                f"{callback_type} {event_key}": {
+                    "count": sum(histogram),
+                    "max_ms": round(self._max.get((callback_type, event_key), 0) * 1000, 2),
+                    "histogram": { label: count for (label, count) in zip(labels, histogram) if count }
+                }
+                for ((callback_type, event_key), histogram) in sorted(self._histograms.items())
+            }
+        }
+
+
+def get_perf_counters(homeconnect:HomeConnect) -> PerfCounters|None:
+    """ Get the counters attached to a HomeConnect object, if there are any """
+    return getattr(homeconnect, _COUNTERS_ATTR, None)
@@ -0,0 +1,69 @@
+""" Profiling of the callbacks and services of the integration """
+from __future__ import annotations
+import cProfile
+import logging
+import os
+import pstats
+from typing import Any, Callable
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CallbackProfiler():
+    """ Collects a cProfile profile only while the callbacks and services of the integration are running
+
+    The profiler is enabled around every wrapped call, so the time Home Assistant spends on other integrations
+    is left out, except for tasks that run while a callback is awaiting. The profiling stops after max_calls
+    calls and then on_limit() is called.
+    """
+    def __init__(self, path:str, max_calls:int, top:int) -> None:
+        self._path = path
+        self._max_calls = max_calls
+        self._top = top
+        self._profile = cProfile.Profile()
+        self._depth = 0
+        self.calls = 0
+        self.on_limit:Callable[[], None] = None
+
+    path = property(lambda self: self._path)
+
+    async def async_call(self, call:Callable, *args) -> Any:
+        """ Call and await a callback or a service handler while profiling, returns the result of the call """
+        if self.calls >= self._max_calls:
+            return await call(*args)
+        self.calls += 1
+        self._depth += 1
+        if self._depth == 1:
+            self._profile.enable()
+        try:
+            result = await call(*args)
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self._profile.disable()
+        if self.calls == self._max_calls and self.on_limit:
+            self.on_limit()
+        return result
+
+    def save(self) -> str:
+        """ Write the pstats file and return the top functions by own time as a markdown table
+
+        This does blocking I/O so it must be called in an executor
+        """
+        self._profile.disable()
+        self._profile.dump_stats(self._path)
+        stats = pstats.Stats(self._profile)
+        if not stats.stats:
+            return "No calls were profiled"
+
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:self._top]
+        lines = [
+            f"Profiled {self.calls} calls, total {stats.total_tt * 1000:.1f} ms",
+            "",
+            "| Function | Calls | Own (ms) | Cumulative (ms) |",
+            "|---|---:|---:|---:|"
+        ]
+        for ((filename, line, function), (_, calls, own, cumulative, _)) in rows:
+            location = f"{os.path.basename(filename)}:{line}" if line else filename
+            lines.append(f"| {function} ({location}) | {calls} | {own * 1000:.2f} | {cumulative * 1000:.2f} |")
+        return "\n".join(lines)
@@ -0,0 +1,83 @@
+""" Recording of the raw event stream for reproducing issues and load tests
+
+Home Assistant also loads this module as the recorder platform of the integration, see exclude_attributes()
+"""
+from __future__ import annotations
+import json
+import logging
+import time
+from datetime import datetime
+
+from home_connect_async import HomeConnect
+from homeassistant.core import HomeAssistant, callback
+
+from .const import COMPACT_SNAPSHOT_UNRECORDED
+
+_LOGGER = logging.getLogger(__name__)
+
+RECORDING_VERSION = 1
+
+
+class EventRecorder():
+    """ Records the raw stream events into a compact newline delimited JSON file
+
+    The first line holds the to_json() snapshot of the data model when the recording started and every
+    following line holds a single event with its offset, in seconds, from the start of the recording:
+
+        {"v":1,"kind":"snapshot","time":"2022-01-01T10:00:00","data":{...}}
+        {"t":1.234,"type":"NOTIFY","id":"<haId>","data":"<raw event data>"}
+
+    The lines are kept in memory and written by the executor when the recording is saved.
+    """
+    def __init__(self, homeconnect:HomeConnect, path:str, max_events:int) -> None:
+        self._path = path
+        self._max_events = max_events
+        self._start = time.monotonic()
+        self._lines:list[str] = [
+            json.dumps({
+                "v": RECORDING_VERSION,
+                "kind": "snapshot",
+                "time": datetime.now().isoformat(),
+                "data": json.loads(homeconnect.to_json())
+            }, separators=(',', ':'))
+        ]
+        self.event_count = 0
+        self.dropped_count = 0
+
+    path = property(lambda self: self._path)
+
+    def record(self, event) -> None:
+        """ Record a single raw event """
+        if self.event_count >= self._max_events:
+            self.dropped_count += 1
+            return
+        self._lines.append(json.dumps({
+            "t": round(time.monotonic() - self._start, 4),
+            "type": event.type,
+            "id": event.last_event_id,
+            "data": event.data
+        }, separators=(',', ':')))
+        self.event_count += 1
+
+    async def async_save(self, hass:HomeAssistant) -> None:
+        """ Write the recording to the file """
+        lines = self._lines
+        self._lines = []
+        await hass.async_add_executor_job(self._write, lines)
+        _LOGGER.info("Saved %d recorded events to %s (%d events were not recorded because the limit was reached)",
+            self.event_count, self._path, self.dropped_count)
+
+    def _write(self, lines:list[str]) -> None:
+        with open(self._path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines))
+            file.write("\n")
+
+
+@callback
+def exclude_attributes(hass:HomeAssistant) -> set[str]:
+    """ Leave the attributes of the snapshot sensors, which hold all the data of an appliance, out of the recorder
+
+    Only the snapshot sensors have these attributes. Home Assistant 2024.1 and newer also use the
+    _unrecorded_attributes of the entity, the versions before only this.
+    """
+    return set(COMPACT_SNAPSHOT_UNRECORDED)
@@ -0,0 +1,166 @@
+""" Targeted refresh of appliance data sections """
+from __future__ import annotations
+import dataclasses
+import logging
+from typing import Sequence
+
+from home_connect_async import Appliance, Events
+from home_connect_async.common import Synchronization
+
+from .const import REFRESH_SECTIONS
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_refresh_appliance(appliance:Appliance, sections:Sequence[str]=None) -> None:
+    """ Re-fetch only the requested data sections of a single appliance and merge them into the model
+
+    Values that did not change are left untouched and only the keys that actually changed are broadcast
+    so entities which are not affected by the refresh are not written
+    """
+    if not sections:
+        sections = REFRESH_SECTIONS
+
+    changed_keys:list[tuple[str, any]] = []
+    program_events:list[Events] = []
+    structure_changed = False
+
+    if "status" in sections:
+        status = await appliance._async_fetch_status()
+        if status:
+            if appliance.status is None:
+                appliance.status = {}
+            keys, added = merge_items(appliance.status, status)
+            changed_keys.extend(keys)
+            structure_changed |= added
+        else:
+            _LOGGER.debug("Didn't get any status data when refreshing %s, keeping the existing values", appliance.haId)
+
+    if "settings" in sections:
+        settings = await appliance._async_fetch_settings()
+        if settings:
+            if appliance.settings is None:
+                appliance.settings = {}
+            keys, added = merge_items(appliance.settings, settings)
+            changed_keys.extend(keys)
+            structure_changed |= added
+        else:
+            _LOGGER.debug("Didn't get any settings data when refreshing %s, keeping the existing values", appliance.haId)
+
+    if "selected_program" in sections:
+        async with Synchronization.selected_program_lock:
+            keys, event, added = await async_refresh_program(appliance, "selected")
+        changed_keys.extend(keys)
+        structure_changed |= added
+        if event:
+            program_events.append(event)
+
+    if "active_program" in sections:
+        keys, event, added = await async_refresh_program(appliance, "active")
+        changed_keys.extend(keys)
+        structure_changed |= added
+        if event:
+            program_events.append(event)
+            appliance.commands = await appliance._async_fetch_commands()
+
+    if "available_programs" in sections:
+        available_programs = await appliance._async_fetch_programs("available")
+        if available_programs is not None:
+            structure_changed |= merge_programs(appliance, available_programs)
+
+    callbacks = appliance._callbacks
+    for event in program_events:
+        await callbacks.async_broadcast_event(appliance, event)
+    if structure_changed:
+        # Let the platforms discover entities for keys that didn't exist before
+        await callbacks.async_broadcast_event(appliance, Events.PAIRED)
+
+    if program_events or structure_changed:
+        # DATA_CHANGED already updates every entity of the appliance so there is no need for the per key events
+        await callbacks.async_broadcast_event(appliance, Events.DATA_CHANGED)
+    else:
+        for (key, value) in changed_keys:
+            await callbacks.async_broadcast_event(appliance, key, value)
+
+    _LOGGER.debug("Refreshed %s for %s (%s) with %d changed keys", ",".join(sections), appliance.name, appliance.haId, len(changed_keys))
+
+
+async def async_refresh_program(appliance:Appliance, program_type:str) -> tuple[list[tuple[str, any]], Events|None, bool]:
+    """ Refresh the selected or active program
+
+    Returns the changed option keys, the program event to fire (if any) and whether options were added or removed
+    """
+    attr = f"{program_type}_program"
+    current = getattr(appliance, attr)
+    program = await appliance._async_fetch_programs(program_type)
+
+    if current and program and current.key == program.key:
+        if current.options is None or program.options is None:
+            added = current.options is not program.options
+            current.options = program.options
+            return [], None, added
+        keys, added = merge_items(current.options, program.options)
+        return keys, None, added
+
+    if not current and not program:
+        return [], None, False
+
+    setattr(appliance, attr, program)
+    if program_type == "selected":
+        return [], Events.PROGRAM_SELECTED, False
+    return [], Events.PROGRAM_STARTED if program else Events.PROGRAM_FINISHED, False
+
+
+def merge_programs(appliance:Appliance, available_programs:dict) -> bool:
+    """ Merge the refreshed available programs into the model, returns True if programs or options were added or removed """
+    current = appliance.available_programs
+    if not current or current.keys() != available_programs.keys():
+        appliance.available_programs = available_programs
+        return True
+
+    structure_changed = False
+    changed = False
+    for (key, program) in available_programs.items():
+        if program.options is None:
+            # The options are only fetched for the current program so keep whatever was loaded before
+            continue
+        if current[key].options is None:
+            current[key].options = program.options
+            structure_changed = True
+        else:
+            keys, added = merge_items(current[key].options, program.options)
+            structure_changed |= added
+            changed |= bool(keys)
+    if structure_changed or changed:
+        # The programs are merged in place but the dict is replaced, like the SDK does when it fetches them, so
+        # the consumers that cache by the identity of the available programs, such as the catalog, see the change
+        appliance.available_programs = dict(current)
+    return structure_changed
+
+
+def merge_items(current:dict, fetched:dict) -> tuple[list[tuple[str, any]], bool]:
+    """ Update a dict of model objects in-place from freshly fetched ones
+
+    The existing objects are updated rather than replaced because entities may hold references to them.
+    Returns the list of (key, value) pairs that changed and whether keys were added or removed, or the unit or the type
+    of an item changed, which the entities only pick up from DATA_CHANGED.
+    """
+    changed = []
+    structure_changed = False
+    for (key, item) in fetched.items():
+        existing = current.get(key)
+        if existing is None:
+            current[key] = item
+            structure_changed = True
+        elif existing != item:
+            if getattr(existing, "unit", None) != getattr(item, "unit", None) or getattr(existing, "type", None) != getattr(item, "type", None):
+                structure_changed = True
+            for field in dataclasses.fields(item):
+                setattr(existing, field.name, getattr(item, field.name))
+            changed.append((key, item.value))
+
+    for key in [ key for key in current if key not in fetched ]:
+        del current[key]
+        structure_changed = True
+
+    return changed, structure_changed
@@ -0,0 +1,115 @@
+""" The long lived objects of a config entry which are kept across reloads of the entry """
+from __future__ import annotations
+import logging
+from typing import Callable
+
+from home_connect_async import HomeConnect
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant
+from homeassistant.helpers.event import async_call_later
+
+from .api import AsyncConfigEntryAuth
+from .catalog import CatalogIndex
+from .common import DormancyManager
+from .filters import EntityFilter
+from .const import DOMAIN, ENTRIES, PARKED_RUNTIMES, RELOAD_GRACE_PERIOD
+from .loader import DataLoader
+from .perf import PerfCounters, SlowCallbackDetector
+from .usage import ProgramUsage
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EntryRuntime():
+    """ The auth object, the data model with its open event stream and the loader of a config entry
+
+    When the entry is unloaded the runtime is parked instead of closed. If the entry is set up again within the
+    grace period, with the same settings, the runtime is reused so the data isn't fetched from the cloud service
+    again and the event stream stays open. Otherwise it is closed.
+    """
+    def __init__(self, entry_id:str, auth:AsyncConfigEntryAuth, homeconnect:HomeConnect, loader:DataLoader, settings:dict) -> None:
+        self.entry_id = entry_id
+        self.auth = auth
+        self.homeconnect = homeconnect
+        self.loader = loader
+        self.settings = settings
+        self._cancel_expiry:CALLBACK_TYPE = None
+        self._unload_listeners:list[Callable[[], None]] = []
+
+        self.perf = PerfCounters()
+        self.perf.attach(homeconnect)
+        auth.perf = self.perf
+        loader.perf = self.perf
+        self.dormancy = DormancyManager()
+        self.dormancy.attach(homeconnect)
+        self.perf.dormancy = self.dormancy
+        self.catalog = CatalogIndex()
+        self.catalog.attach(homeconnect)
+        self.slow_callbacks:SlowCallbackDetector|None = None
+        self.program_usage:ProgramUsage|None = None
+        self.entity_filter:EntityFilter|None = None
+
+    def add_unload_listener(self, listener:Callable[[], None]) -> CALLBACK_TYPE:
+        """ Add a listener that is called when the entry is unloaded, returns a handle that removes it """
+        self._unload_listeners.append(listener)
+        def remove() -> None:
+            if listener in self._unload_listeners:
+                self._unload_listeners.remove(listener)
+        return remove
+
+    def unloaded(self) -> None:
+        """ Notify and remove the unload listeners, the runtime itself may be kept for a reload """
+        (listeners, self._unload_listeners) = (self._unload_listeners, [])
+        for listener in listeners:
+            listener()
+
+    def close(self) -> None:
+        """ Stop loading, close the event stream and clear all the callbacks """
+        if self._cancel_expiry:
+            self._cancel_expiry()
+            self._cancel_expiry = None
+        self.loader.close()
+        self.perf.commands.close()
+        self.homeconnect.close()
+
+
+def get_entry_runtime(hass:HomeAssistant, entry_id:str) -> EntryRuntime:
+    """ Get the runtime of a config entry that is set up """
+    return hass.data[DOMAIN][ENTRIES][entry_id]
+
+
+def park_runtime(hass:HomeAssistant, entry_id:str, runtime:EntryRuntime) -> None:
+    """ Keep the runtime of an unloaded entry for a while so a reload of the entry can reuse it """
+    parked:dict[str, EntryRuntime] = hass.data[DOMAIN].setdefault(PARKED_RUNTIMES, {})
+    discard_runtime(hass, entry_id)
+
+    async def async_expire(now) -> None:
+        runtime._cancel_expiry = None
+        if parked.get(entry_id) is runtime:
+            del parked[entry_id]
+            runtime.close()
+            _LOGGER.debug("Closed the Home Connect data model of entry %s which wasn't set up again", entry_id)
+
+    runtime._cancel_expiry = async_call_later(hass, RELOAD_GRACE_PERIOD, async_expire)
+    parked[entry_id] = runtime
+
+
+def claim_runtime(hass:HomeAssistant, entry_id:str, settings:dict) -> EntryRuntime|None:
+    """ Take the parked runtime of an entry if it was created with the same settings """
+    runtime:EntryRuntime = hass.data[DOMAIN].get(PARKED_RUNTIMES, {}).pop(entry_id, None)
+    if runtime is None:
+        return None
+    if runtime._cancel_expiry:
+        runtime._cancel_expiry()
+        runtime._cancel_expiry = None
+    if runtime.settings != settings:
+        _LOGGER.debug("The settings of entry %s changed, the Home Connect data model will be loaded again", entry_id)
+        runtime.close()
+        return None
+    return runtime
+
+
+def discard_runtime(hass:HomeAssistant, entry_id:str) -> None:
+    """ Close the parked runtime of an entry, if there is one """
+    runtime:EntryRuntime = hass.data[DOMAIN].get(PARKED_RUNTIMES, {}).pop(entry_id, None)
+    if runtime:
+        runtime.close()
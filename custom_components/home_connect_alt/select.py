@@ -8,28 +8,27 @@ from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType
 
-from .common import EntityBase, EntityManager
+from .common import EntityBase, EntityManager, get_program_options, register_callback
 from .const import DEVICE_ICON_MAP, DOMAIN, SPECIAL_ENTITIES
+from .runtime import get_entry_runtime
 
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_add_entities:AddEntitiesCallback) -> None:
     """Add Selects for passed config_entry in HA."""
-    homeconnect:HomeConnect = hass.data[DOMAIN]['homeconnect']
-    entity_manager = EntityManager(async_add_entities)
+    runtime = get_entry_runtime(hass, config_entry.entry_id)
+    homeconnect:HomeConnect = runtime.homeconnect
+    entity_manager = EntityManager(async_add_entities, runtime.entity_filter, "select")
 
     def add_appliance(appliance:Appliance) -> None:
         if appliance.available_programs:
             device = ProgramSelect(appliance)
             entity_manager.add(device)
 
-        if appliance.available_programs:
-            for program in appliance.available_programs.values():
-                if program.options:
-                    for option in program.options.values():
-                        if option.key not in SPECIAL_ENTITIES['ignore'] and option.allowedvalues and len(option.allowedvalues)>1:
-                            device = OptionSelect(appliance, option.key)
-                            entity_manager.add(device)
+        for option in get_program_options(appliance, runtime.program_usage):
+            if option.key not in SPECIAL_ENTITIES['ignore'] and option.allowedvalues and len(option.allowedvalues)>1:
+                device = OptionSelect(appliance, option.key)
+                entity_manager.add(device)
 
         for setting in appliance.settings.values():
             if setting.key not in SPECIAL_ENTITIES['ignore'] and setting.allowedvalues and len(setting.allowedvalues)>1:
@@ -41,8 +40,8 @@ async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_
     def remove_appliance(appliance:Appliance) -> None:
         entity_manager.remove_appliance(appliance)
 
-    homeconnect.register_callback(add_appliance, [Events.PAIRED, Events.PROGRAM_SELECTED])
-    homeconnect.register_callback(remove_appliance, Events.DEPAIRED)
+    config_entry.async_on_unload(register_callback(homeconnect, add_appliance, [Events.PAIRED, Events.PROGRAM_SELECTED]))
+    config_entry.async_on_unload(register_callback(homeconnect, remove_appliance, Events.DEPAIRED))
     for appliance in homeconnect.appliances.values():
         add_appliance(appliance)
 
@@ -96,7 +95,8 @@ class ProgramSelect(EntityBase, SelectEntity):
 
     async def async_select_option(self, option: str) -> None:
         try:
-            await self._appliance.async_select_program(key=option)
+            async with self.trace_command("select_program", "BSH.Common.Root.SelectedProgram", option):
+                await self._appliance.async_select_program(key=option)
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to set the selected program: {ex.error_description} ({ex.code} - {self._key}={option})")
@@ -109,6 +109,8 @@ class ProgramSelect(EntityBase, SelectEntity):
 
 class OptionSelect(EntityBase, SelectEntity):
     """ Selection of program options """
+    dormant_when_unavailable = True
+
     @property
     def device_class(self) -> str:
         return f"{DOMAIN}__options"
@@ -161,7 +163,8 @@ class OptionSelect(EntityBase, SelectEntity):
 
     async def async_select_option(self, option: str) -> None:
         try:
-            await self._appliance.async_set_option(self._key, option)
+            async with self.trace_command("set_option", self._key, option):
+                await self._appliance.async_set_option(self._key, option)
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to set the selected option: {ex.error_description} ({ex.code})")
@@ -212,7 +215,8 @@ class SettingsSelect(EntityBase, SelectEntity):
 
     async def async_select_option(self, option: str) -> None:
         try:
-            await self._appliance.async_apply_setting(self._key, option)
+            async with self.trace_command("apply_setting", self._key, option):
+                await self._appliance.async_apply_setting(self._key, option)
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to apply the setting: {ex.error_description} ({ex.code})")
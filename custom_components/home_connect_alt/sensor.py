@@ -2,24 +2,33 @@
 from __future__ import annotations
 from datetime import datetime, timedelta, timezone
 import logging
+from typing import Any, Callable
 from home_connect_async import Appliance, HomeConnect, Events
+from home_connect_async.appliance import Option
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType
 
-from .common import EntityBase, EntityManager
-from .const import DEVICE_ICON_MAP, DOMAIN, SPECIAL_ENTITIES, HOME_CONNECT_DEVICE, CONF_LANG
+from .common import EntityBase, EntityManager, appliance_snapshot, get_service_device_info, register_callback
+from .const import COMPACT_SNAPSHOT_KEY, COMPACT_SNAPSHOT_UNRECORDED, COMPACT_WRITE_DELAY, DEVICE_ICON_MAP, DOMAIN, PERF_SENSORS, SPECIAL_ENTITIES, CONF_LANG
+from .perf import PerfCounters
+from .runtime import get_entry_runtime
 
 _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_add_entities:AddEntitiesCallback) -> None:
     """ Add sensors for passed config_entry in HA """
-    homeconnect:HomeConnect = hass.data[DOMAIN]['homeconnect']
-    entity_manager = EntityManager(async_add_entities)
+    runtime = get_entry_runtime(hass, config_entry.entry_id)
+    homeconnect:HomeConnect = runtime.homeconnect
+    entity_manager = EntityManager(async_add_entities, runtime.entity_filter, "sensor")
 
     def add_appliance(appliance:Appliance) -> None:
+        if runtime.entity_filter and runtime.entity_filter.compact:
+            entity_manager.add(ApplianceSnapshotSensor(appliance, COMPACT_SNAPSHOT_KEY))
+
         if appliance.available_programs and appliance.selected_program:
             device = SelectedProgramSensor(appliance)
             entity_manager.add(device)
@@ -66,11 +75,12 @@ async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_
 
 
     # First add the global home connect satus sensor
-    async_add_entities([HomeConnectStatusSensor(homeconnect)])
+    async_add_entities([HomeConnectStatusSensor(config_entry.entry_id, homeconnect)])
+    async_add_entities([ PerfSensor(config_entry.entry_id, runtime.perf, key, conf) for (key, conf) in PERF_SENSORS.items() ])
 
     # Subscribe for events and register the existing appliances
-    homeconnect.register_callback(add_appliance, [Events.PAIRED, Events.PROGRAM_STARTED])
-    homeconnect.register_callback(remove_appliance, Events.DEPAIRED)
+    config_entry.async_on_unload(register_callback(homeconnect, add_appliance, [Events.PAIRED, Events.PROGRAM_STARTED]))
+    config_entry.async_on_unload(register_callback(homeconnect, remove_appliance, Events.DEPAIRED))
     for appliance in homeconnect.appliances.values():
         add_appliance(appliance)
 
@@ -116,8 +126,49 @@ class SelectedProgramSensor(EntityBase, SensorEntity):
     #     return await self._appliance.async_select_program(key=program, options=options)
 
 
+def render_timestamp(option:Option) -> datetime:
+    """ Render a number of seconds from now as the time it ends """
+    return datetime.now(timezone.utc).astimezone() + timedelta(seconds=option.value)
+
+def render_timespan(option:Option) -> str:
+    """ Render a number of seconds as hours and minutes """
+    m, s = divmod(option.value, 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02d}"
+
+def render_grams(option:Option) -> float:
+    """ Render grams as kilograms """
+    return round(option.value/1000, 1)
+
+def render_value(option:Option) -> Any:
+    """ Render the display value, if there is one, or the value with the On and Off enum values shortened """
+    if option.displayvalue:
+        return option.displayvalue
+    if isinstance(option.value, str):
+        if option.value.endswith(".Off"):
+            return "Off"
+        if option.value.endswith(".On"):
+            return "On"
+    return option.value
+
+
 class ProgramOptionSensor(EntityBase, SensorEntity):
-    """ Special active program sensor """
+    """ Special active program sensor
+
+    The function that renders the option value depends on the device class and on the unit and the type of the option
+    in the current program. It is chosen, together with the unit, when the entity is created and again by the events
+    that change the programs, PROGRAM_SELECTED, PROGRAM_STARTED and DATA_CHANGED, which a refresh that changes the unit
+    of an option also sends, so the state writes only call it.
+    """
+    dormant_when_unavailable = True
+    _renderer:Callable[[Option], Any] = None
+    _internal_unit:str|None = None
+    _native_unit:str|None = None
+
+    def __init__(self, appliance:Appliance, key:str=None, conf:dict=None) -> None:
+        super().__init__(appliance, key, conf)
+        self._select_renderer()
+
     @property
     def device_class(self) -> str:
         if "class" in self._conf:
@@ -145,53 +196,71 @@ class ProgramOptionSensor(EntityBase, SensorEntity):
     @property
     def internal_unit(self) -> str | None:
         """ Get the original unit before manipulations """
-        if "unit" in self._conf:
-            return self._conf["unit"]
-        if self._appliance.active_program and (self._key in  self._appliance.active_program.options):
-            return self._appliance.active_program.options[self._key].unit
-        if self._appliance.selected_program and (self._key in  self._appliance.selected_program.options):
-            return self._appliance.selected_program.options[self._key].unit
-        return None
+        return self._internal_unit
 
     @property
     def native_unit_of_measurement(self) -> str | None:
-        unit = self.internal_unit
-        if unit=="gram":
-            return "kg"
-        return unit
+        return self._native_unit
+
+    @property
+    def update_events(self) -> list[str]:
+        return [ *super().update_events, Events.PROGRAM_SELECTED, Events.PROGRAM_STARTED ]
+
+    def _select_renderer(self) -> None:
+        """ Choose the renderer and the unit for the option of the current program """
+        appliance = self._appliance
+        option = None
+        if appliance.active_program and (self._key in appliance.active_program.options):
+            option = appliance.active_program.options[self._key]
+        elif appliance.selected_program and (self._key in appliance.selected_program.options):
+            option = appliance.selected_program.options[self._key]
+
+        if "unit" in self._conf:
+            self._internal_unit = self._conf["unit"]
+        else:
+            self._internal_unit = option.unit if option else None
+        self._native_unit = "kg" if self._internal_unit=="gram" else self._internal_unit
+
+        device_class = self.device_class
+        if device_class == "timestamp":
+            self._renderer = render_timestamp
+        elif "timespan" in device_class:
+            self._renderer = render_timespan
+        elif self._internal_unit=="gram":
+            self._renderer = render_grams
+        else:
+            self._renderer = render_value
 
     @property
     def native_value(self):
         """Return the state of the sensor."""
 
-        program = self._appliance.active_program if self._appliance.active_program else self._appliance.selected_program
+        program = self._appliance.active_program or self._appliance.selected_program
         if program is None:
             return None
 
-        if self._key not in program.options:
+        option = program.options.get(self._key)
+        if option is None:
             _LOGGER.debug("Option key %s is missing from program", self._key)
             return None
 
-        option = program.options[self._key]
-
-        if self.device_class == "timestamp":
-            return  datetime.now(timezone.utc).astimezone() + timedelta(seconds=option.value)
-        if "timespan" in self.device_class:
-            m, s = divmod(option.value, 60)
-            h, m = divmod(m, 60)
-            return f"{h}:{m:02d}"
-        if self.internal_unit=="gram":
-            return round(option.value/1000, 1)
-        if option.displayvalue:
-            return option.displayvalue
-        if isinstance(option.value, str):
-            if option.value.endswith(".Off"):
-                return "Off"
-            if option.value.endswith(".On"):
-                return "On"
-        return option.value
+        return self._renderer(option)
+
+    def on_wake(self) -> None:
+        # The program may have changed while the entity was dormant
+        self._select_renderer()
+
+    async def async_added_to_hass(self):
+        self._select_renderer()
+        await super().async_added_to_hass()
 
     async def async_on_update(self, appliance:Appliance, key:str, value) -> None:
+        if key is Events.PROGRAM_SELECTED or key is Events.PROGRAM_STARTED:
+            # Followed by DATA_CHANGED, which writes the state
+            self._select_renderer()
+            return
+        if key is Events.DATA_CHANGED:
+            self._select_renderer()
         self.async_write_ha_state()
 
 
@@ -269,21 +338,74 @@ class SettingsSensor(EntityBase, SensorEntity):
         self.async_write_ha_state()
 
 
+class ApplianceSnapshotSensor(EntityBase, SensorEntity):
+    """ The snapshot of all the data of an appliance for the compact mode
+
+    The state is the operation state and the attributes hold the status, settings and the selected and active programs.
+    The sensor is updated by every event of the appliance but the writes are coalesced, the state is written once,
+    COMPACT_WRITE_DELAY seconds after the first event that wasn't written yet.
+    """
+    # Home Assistant 2024.1 and newer leave the large attributes out of the recorder, older versions use the
+    # exclude_attributes() of the recorder platform
+    _unrecorded_attributes = COMPACT_SNAPSHOT_UNRECORDED
+    _cancel_write = None
+
+    @property
+    def name_ext(self) -> str:
+        return "Snapshot"
+
+    @property
+    def icon(self) -> str:
+        return DEVICE_ICON_MAP.get(self._appliance.type)
+
+    @property
+    def device_class(self) -> str:
+        return f"{DOMAIN}__status"
+
+    @property
+    def native_value(self):
+        # The status is None until it was loaded, for example while the appliance is disconnected
+        status = (self._appliance.status or {}).get("BSH.Common.Status.OperationState")
+        return status.value.rsplit(".", 1)[-1] if status and isinstance(status.value, str) else None
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        return appliance_snapshot(self._appliance)
+
+    @property
+    def update_events(self) -> list[str]:
+        return ["*"]
+
+    async def async_on_update(self, appliance:Appliance, key:str, value) -> None:
+        if self._cancel_write is None:
+            self._cancel_write = self.hass.loop.call_later(COMPACT_WRITE_DELAY, self._write_coalesced).cancel
+
+    def _write_coalesced(self) -> None:
+        self._cancel_write = None
+        self.async_write_ha_state()
+
+    async def async_will_remove_from_hass(self) -> None:
+        if self._cancel_write:
+            self._cancel_write()
+            self._cancel_write = None
+
+
 class HomeConnectStatusSensor(SensorEntity):
     """ Global Home Connect status sensor """
     should_poll = True
 
-    def __init__(self, homeconnect:HomeConnect) -> None:
+    def __init__(self, entry_id:str, homeconnect:HomeConnect) -> None:
+        self._entry_id = entry_id
         self._homeconnect = homeconnect
 
     @property
     def device_info(self):
         """Return information to link this entity with the correct device."""
-        return HOME_CONNECT_DEVICE
+        return get_service_device_info(self._entry_id)
 
     @property
     def unique_id(self) -> str:
-        return "homeconnect_status"
+        return f"{self._entry_id}_homeconnect_status"
 
     @property
     def name(self) -> str:
@@ -296,3 +418,56 @@ class HomeConnectStatusSensor(SensorEntity):
     @property
     def native_value(self):
         return self._homeconnect.status.name
+
+
+class PerfSensor(SensorEntity):
+    """ Diagnostic sensor for a performance statistic of the integration """
+    should_poll = False
+
+    def __init__(self, entry_id:str, perf:PerfCounters, key:str, conf:dict) -> None:
+        self._entry_id = entry_id
+        self._perf = perf
+        self._key = key
+        self._conf = conf
+
+    @property
+    def device_info(self):
+        """Return information to link this entity with the correct device."""
+        return get_service_device_info(self._entry_id)
+
+    @property
+    def unique_id(self) -> str:
+        return f"{self._entry_id}_homeconnect_perf_{self._key}"
+
+    @property
+    def name(self) -> str:
+        return f"Home Connect {self._conf['name']}"
+
+    @property
+    def icon(self) -> str:
+        return self._conf['icon']
+
+    @property
+    def entity_category(self) -> EntityCategory:
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def state_class(self) -> str:
+        # The counters only go up (they restart from zero with the runtime), the rest are gauges
+        return self._conf['state_class']
+
+    @property
+    def native_unit_of_measurement(self) -> str:
+        return self._conf['unit']
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    @property
+    def native_value(self):
+        return self._perf.stats.get(self._key)
+
+    async def async_added_to_hass(self):
+        """ The statistics are computed on a fixed interval and the state is written after every update """
+        self.async_on_remove(self._perf.add_listener(self.async_write_ha_state))
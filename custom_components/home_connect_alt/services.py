@@ -1,26 +1,117 @@
 """ Implement the services of this implementation """
-from home_connect_async import HomeConnect, HomeConnectError
-from homeassistant.core import HomeAssistant
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from home_connect_async import Appliance, Events, HomeConnect, HomeConnectError
+from homeassistant.components import persistent_notification
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, ServiceResponse, callback
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.event import async_call_later
+
+from .catalog import get_catalog
+from .common import register_callback
+from .const import CONF_MAX_CONCURRENCY, DOMAIN
+from .perf import get_perf_counters
+from .tracing import trace_command
+from .profiler import CallbackProfiler
+from .recorder import EventRecorder
+from .refresh import async_refresh_appliance
+
+if TYPE_CHECKING:
+    from .runtime import EntryRuntime
+
+_LOGGER = logging.getLogger(__name__)
 
 
 class Services():
-    """ Collection of the Services offered by the integration """
-    def __init__(self, hass:HomeAssistant,  homeconnect:HomeConnect) -> None:
-        self.homeconnect = homeconnect
+    """ Collection of the Services offered by the integration
+
+    The services are shared by all the config entries. The calls are routed to the appliance through an index of
+    the appliances of every entry, keyed by the device identifier, which is kept up to date by the PAIRED,
+    CONNECTED and DEPAIRED events.
+    """
+    def __init__(self, hass:HomeAssistant) -> None:
         self.hass = hass
         self.dr = dr.async_get(hass)
+        self._entries:dict[str, EntryRuntime] = {}
+        self._appliances:dict[str, tuple[HomeConnect, str]] = {}     # device identifier -> (HomeConnect, haId)
+        self._cancel_recording = None
+        self._recorders:dict[str, EventRecorder] = {}
+        self.profiler:CallbackProfiler|None = None
+        self._stop_profiling = None
+        self._remove_profiler_wrappers:dict[str, CALLBACK_TYPE] = {}
+
+    def add_entry(self, runtime:EntryRuntime) -> CALLBACK_TYPE:
+        """ Route the service calls to the appliances of a config entry, returns a handle that removes the entry """
+        homeconnect = runtime.homeconnect
+
+        def index_appliance(appliance:Appliance) -> None:
+            self._appliances[appliance.haId.lower().replace('-','_')] = (homeconnect, appliance.haId)
+
+        def unindex_appliance(appliance:Appliance) -> None:
+            self._appliances.pop(appliance.haId.lower().replace('-','_'), None)
+
+        self._entries[runtime.entry_id] = runtime
+        handles = [
+            register_callback(homeconnect, index_appliance, [Events.PAIRED, Events.CONNECTED]),
+            register_callback(homeconnect, unindex_appliance, Events.DEPAIRED)
+        ]
+        for appliance in homeconnect.appliances.values():
+            index_appliance(appliance)
+        if self.profiler:
+            self._remove_profiler_wrappers[runtime.entry_id] = runtime.perf.add_call_wrapper(self.profiler.async_call)
+
+        def remove() -> None:
+            for handle in handles:
+                handle()
+            self._entries.pop(runtime.entry_id, None)
+            for (identifier, (indexed, _)) in list(self._appliances.items()):
+                if indexed is homeconnect:
+                    del self._appliances[identifier]
+            remove_wrapper = self._remove_profiler_wrappers.pop(runtime.entry_id, None)
+            if remove_wrapper:
+                remove_wrapper()
+            recorder = self._recorders.pop(runtime.entry_id, None)
+            if recorder and runtime.loader.recorder is recorder:
+                runtime.loader.recorder = None
+        return remove
+
+    def profiled(self, handler):
+        """ Wrap a service handler so it is included in a profile that is in progress """
+        async def async_handle(call) -> ServiceResponse:
+            if self.profiler:
+                return await self.profiler.async_call(handler, call)
+            return await handler(call)
+        return async_handle
+
+    @staticmethod
+    async def _async_select_program(appliance:Appliance, program_key:str, options:list[dict]|None) -> None:
+        async with trace_command(get_perf_counters(appliance._homeconnect), "select_program", appliance, "BSH.Common.Root.SelectedProgram", program_key):
+            await appliance.async_select_program(program_key, options)
+
+    @staticmethod
+    async def _async_start_program(appliance:Appliance, program_key:str|None, options:list[dict]|None) -> None:
+        async with trace_command(get_perf_counters(appliance._homeconnect), "start_program", appliance, "BSH.Common.Status.OperationState", "BSH.Common.EnumType.OperationState.Run"):
+            await appliance.async_start_program(program_key, options)
+
+    @staticmethod
+    async def _async_stop_program(appliance:Appliance) -> None:
+        async with trace_command(get_perf_counters(appliance._homeconnect), "stop_program", appliance, "BSH.Common.Status.OperationState"):
+            await appliance.async_stop_active_program()
 
     async def async_select_program(self, call) -> None:
         """ Service for selecting a program """
         data = call.data
         appliance = self.get_appliance_from_device_id(data['device_id'])
         if appliance:
-            program_key = data['program_key']
-            options = data.get('options')
             try:
-                await appliance.async_select_program(program_key, options)
+                await self._async_select_program(appliance, data['program_key'], data.get('options'))
             except HomeConnectError as ex:
                 raise HomeAssistantError(ex.error_description if ex.error_description else ex.msg)
 
@@ -29,10 +120,8 @@ class Services():
         data = call.data
         appliance = self.get_appliance_from_device_id(data['device_id'])
         if appliance:
-            program_key = data.get('program_key')
-            options = data.get('options')
             try:
-                await appliance.async_start_program(program_key, options)
+                await self._async_start_program(appliance, data.get('program_key'), data.get('options'))
             except HomeConnectError as ex:
                 raise HomeAssistantError(ex.error_description if ex.error_description else ex.msg)
 
@@ -43,16 +132,232 @@ class Services():
         appliance = self.get_appliance_from_device_id(data['device_id'])
         if appliance:
             try:
-                await appliance.async_stop_active_program()
+                await self._async_stop_program(appliance)
             except HomeConnectError as ex:
                 raise HomeAssistantError(ex.error_description if ex.error_description else ex.msg)
 
+    async def async_bulk_select_program(self, call) -> ServiceResponse:
+        """ Service for selecting a program on many appliances """
+        data = call.data
+        return await self.async_run_bulk(
+            self.get_device_ids_from_targets(data),
+            lambda appliance: self._async_select_program(appliance, data['program_key'], data.get('options'))
+        )
+
+    async def async_bulk_start_program(self, call) -> ServiceResponse:
+        """ Service for starting a program on many appliances """
+        data = call.data
+        return await self.async_run_bulk(
+            self.get_device_ids_from_targets(data),
+            lambda appliance: self._async_start_program(appliance, data.get('program_key'), data.get('options'))
+        )
+
+    async def async_bulk_stop_program(self, call) -> ServiceResponse:
+        """ Service for stopping the active program on many appliances """
+        return await self.async_run_bulk(self.get_device_ids_from_targets(call.data), self._async_stop_program)
+
+    async def async_get_catalog(self, call) -> ServiceResponse:
+        """ Service for getting the programs, options and settings an appliance supports """
+        data = call.data
+        appliance = self.get_appliance_from_device_id(data['device_id'])
+        if not appliance:
+            raise HomeAssistantError("The device isn't a Home Connect appliance")
+        return get_catalog(appliance._homeconnect).query(appliance, data.get('program'), data.get('key'))
+
+    async def async_run_bulk(self, device_ids:list[str], operation:Callable[[Appliance], Awaitable[None]]) -> dict:
+        """ Run an operation on the appliances of many devices concurrently and return the result of every device
+
+        No more than max_concurrency operations run at the same time and their API requests also wait for the request
+        semaphore, which is shared with the rest of the integration. A failure on one appliance doesn't stop the
+        others, it is reported in the result of its device with the time the operation took and the time it was queued.
+        """
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.hass.data[DOMAIN][CONF_MAX_CONCURRENCY])
+
+        async def async_run(device_id:str) -> dict:
+            appliance = self.get_appliance_from_device_id(device_id)
+            if not appliance:
+                return { "appliance": None, "success": False, "error": "The device isn't a Home Connect appliance", "queued_ms": 0, "duration_ms": 0 }
+            async with semaphore:
+                device_started = time.monotonic()
+                error = None
+                try:
+                    await operation(appliance)
+                except HomeConnectError as ex:
+                    error = ex.error_description if ex.error_description else ex.msg
+                except HomeAssistantError as ex:
+                    error = str(ex)
+                except Exception as ex:
+                    _LOGGER.warning("A bulk operation failed unexpectedly on %s", appliance.name or appliance.haId, exc_info=ex)
+                    error = str(ex) or type(ex).__name__
+                return {
+                    "appliance": appliance.name or appliance.type,
+                    "success": error is None,
+                    "error": error,
+                    "queued_ms": round((device_started - started) * 1000, 2),
+                    "duration_ms": round((time.monotonic() - device_started) * 1000, 2)
+                }
+
+        results = await asyncio.gather(*[ async_run(device_id) for device_id in device_ids ])
+        failed = sum(1 for result in results if not result["success"])
+        if failed:
+            _LOGGER.info("A bulk operation failed on %d of %d appliances", failed, len(results))
+        return {
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "duration_ms": round((time.monotonic() - started) * 1000, 2),
+            "results": dict(zip(device_ids, results))
+        }
+
+    async def async_refresh(self, call) -> None:
+        """ Service for refreshing the data of a single appliance """
+        data = call.data
+        appliance = self.get_appliance_from_device_id(data['device_id'])
+        if not appliance:
+            raise HomeAssistantError("The device isn't a Home Connect appliance")
+        section = data.get('section')
+        try:
+            await async_refresh_appliance(appliance, [section] if section else None)
+        except HomeConnectError as ex:
+            raise HomeAssistantError(ex.error_description if ex.error_description else ex.msg)
+
+
+    async def async_record_events(self, call) -> None:
+        """ Service for recording the raw event stream to a file for a limited time
+
+        The events of every config entry are recorded to a separate file
+        """
+        if self._recorders:
+            paths = ", ".join(recorder.path for recorder in self._recorders.values())
+            raise HomeAssistantError(f"A recording to {paths} is already in progress")
+
+        data = call.data
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        recorders:dict[str, EventRecorder] = {}
+        for (entry_id, runtime) in self._entries.items():
+            suffix = f"_{entry_id}" if len(self._entries) > 1 else ""
+            path = self.hass.config.path(f"{DOMAIN}_events_{timestamp}{suffix}.jsonl")
+            recorders[entry_id] = runtime.loader.recorder = EventRecorder(runtime.homeconnect, path, data['max_events'])
+            _LOGGER.info("Recording Home Connect events to %s for %d seconds", path, data['duration'])
+        self._recorders = recorders
+
+        async def async_stop_recording(now) -> None:
+            self._cancel_recording = None
+            for (entry_id, recorder) in recorders.items():
+                runtime = self._entries.get(entry_id)
+                if runtime and runtime.loader.recorder is recorder:
+                    runtime.loader.recorder = None
+                if self._recorders.get(entry_id) is recorder:
+                    del self._recorders[entry_id]
+                await recorder.async_save(self.hass)
+
+        self._cancel_recording = async_call_later(self.hass, data['duration'], async_stop_recording)
+
+    async def async_profile(self, call) -> ServiceResponse:
+        """ Service for profiling the callbacks and services of the integration for a limited time or number of calls
+
+        The profile is still running when the service returns, so the response only has the path of the file it
+        will be saved to, the summary is shown in a notification when it is saved
+        """
+        if self.profiler:
+            raise HomeAssistantError(f"Profiling to {self.profiler.path} is already in progress")
+        if not self._entries:
+            raise HomeAssistantError("The integration isn't fully set up yet")
+
+        data = call.data
+        path = self.hass.config.path(f"{DOMAIN}_profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+        profiler = CallbackProfiler(path, data['max_calls'], data['top'])
+        self.profiler = profiler
+        # The callbacks of all the entries are profiled together
+        self._remove_profiler_wrappers = {
+            entry_id: runtime.perf.add_call_wrapper(profiler.async_call) for (entry_id, runtime) in self._entries.items()
+        }
+        _LOGGER.info("Profiling the Home Connect callbacks to %s for %d seconds", path, data['duration'])
+
+        def stop(save:bool) -> None:
+            cancel_timer()
+            for remove_wrapper in self._remove_profiler_wrappers.values():
+                remove_wrapper()
+            self._remove_profiler_wrappers = {}
+            self._stop_profiling = None
+            if self.profiler is profiler:
+                self.profiler = None
+            profiler.on_limit = None
+            if save:
+                self.hass.async_create_task(async_save())
+
+        async def async_save() -> None:
+            summary = await self.hass.async_add_executor_job(profiler.save)
+            _LOGGER.info("Saved the Home Connect profile to %s", path)
+            persistent_notification.async_create(
+                self.hass,
+                f"The profile was saved to `{path}`\n\n{summary}",
+                title="Home Connect profile",
+                notification_id=f"{DOMAIN}_profile"
+            )
+
+        @callback
+        def async_timeout(now) -> None:
+            stop(True)
+
+        cancel_timer = async_call_later(self.hass, data['duration'], async_timeout)
+        profiler.on_limit = lambda: stop(True)
+        self._stop_profiling = stop
+        return { "path": path, "duration": data['duration'], "max_calls": data['max_calls'] }
+
+    def close(self) -> None:
+        """ Release the timers and the references to the data model """
+        if self._cancel_recording:
+            # An unfinished recording is discarded
+            self._cancel_recording()
+            self._cancel_recording = None
+        for (entry_id, recorder) in self._recorders.items():
+            runtime = self._entries.get(entry_id)
+            if runtime and runtime.loader.recorder is recorder:
+                runtime.loader.recorder = None
+        self._recorders = {}
+        if self._stop_profiling:
+            # An unfinished profile is discarded
+            self._stop_profiling(False)
+
+    def get_device_ids_from_targets(self, data:dict) -> list[str]:
+        """ The IDs of the devices that are targeted by a service call, directly or through their entities, areas or labels
+
+        The devices that are found through areas and labels are limited to the devices of the appliances, the
+        Home Connect service devices are left out
+        """
+        device_ids = list(data.get('device_id', []))
+        entity_reg = er.async_get(self.hass)
+        for entity_id in data.get('entity_id', []):
+            entity = entity_reg.async_get(entity_id)
+            if entity and entity.device_id:
+                device_ids.append(entity.device_id)
+
+        devices:list[dr.DeviceEntry] = []
+        for area_id in data.get('area_id', []):
+            devices += dr.async_entries_for_area(self.dr, area_id)
+        if data.get('label_id'):
+            # Labels were added in Home Assistant 2024.4
+            entries_for_label = getattr(dr, "async_entries_for_label", None)
+            if not entries_for_label:
+                raise HomeAssistantError("Targeting labels requires a newer version of Home Assistant")
+            for label_id in data['label_id']:
+                devices += entries_for_label(self.dr, label_id)
+        device_ids += [ device.id for device in devices if any(domain == DOMAIN and id in self._appliances for (domain, id) in device.identifiers) ]
+
+        if not device_ids:
+            raise HomeAssistantError("No Home Connect appliances were found for the target of the service call")
+        return list(dict.fromkeys(device_ids))
+
+    def get_entry_runtime(self, appliance:Appliance) -> EntryRuntime|None:
+        """ The runtime of the config entry an appliance belongs to """
+        return next((runtime for runtime in self._entries.values() if runtime.homeconnect.appliances.get(appliance.haId) is appliance), None)
 
-    def get_appliance_from_device_id(self, device_id):
+    def get_appliance_from_device_id(self, device_id) -> Appliance|None:
         """ Helper function to get an appliance from the Home Assistant device_id """
-        device = self.dr.devices[device_id]
-        haId = list(device.identifiers)[0][1]
-        for (key, appliance) in self.homeconnect.appliances.items():
-            if key.lower().replace('-','_') == haId:
-                return appliance
-        return None
+        device = self.dr.async_get(device_id)
+        if not device:
+            return None
+        identifier = next((id for (domain, id) in device.identifiers if domain == DOMAIN), None)
+        (homeconnect, haId) = self._appliances.get(identifier, (None, None))
+        return homeconnect.appliances.get(haId) if homeconnect else None
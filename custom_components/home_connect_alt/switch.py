@@ -10,23 +10,22 @@ from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.typing import ConfigType
 
-from .common import EntityBase, EntityManager
+from .common import EntityBase, EntityManager, get_program_options, register_callback
 from .const import DOMAIN, SPECIAL_ENTITIES
+from .runtime import get_entry_runtime
 
 
 async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_add_entities:AddEntitiesCallback) -> None:
     """Add sensors for passed config_entry in HA."""
-    homeconnect:HomeConnect = hass.data[DOMAIN]['homeconnect']
-    entity_manager = EntityManager(async_add_entities)
+    runtime = get_entry_runtime(hass, config_entry.entry_id)
+    homeconnect:HomeConnect = runtime.homeconnect
+    entity_manager = EntityManager(async_add_entities, runtime.entity_filter, "switch")
 
     def add_appliance(appliance:Appliance) -> None:
-        if appliance.available_programs:
-            for program in appliance.available_programs.values():
-                if program.options:
-                    for option in program.options.values():
-                        if option.key not in SPECIAL_ENTITIES['ignore'] and (option.type == "Boolean" or isinstance(option.value, bool)):
-                            device = OptionSwitch(appliance, option.key)
-                            entity_manager.add(device)
+        for option in get_program_options(appliance, runtime.program_usage):
+            if option.key not in SPECIAL_ENTITIES['ignore'] and (option.type == "Boolean" or isinstance(option.value, bool)):
+                device = OptionSwitch(appliance, option.key)
+                entity_manager.add(device)
 
         for setting in appliance.settings.values():
             if setting.key not in SPECIAL_ENTITIES['ignore'] and (setting.type == "Boolean" or isinstance(setting.value, bool)):
@@ -39,14 +38,16 @@ async def async_setup_entry(hass:HomeAssistant , config_entry:ConfigType, async_
     def remove_appliance(appliance:Appliance) -> None:
         entity_manager.remove_appliance(appliance)
 
-    homeconnect.register_callback(add_appliance, [Events.PAIRED, Events.PROGRAM_SELECTED])
-    homeconnect.register_callback(remove_appliance, Events.DEPAIRED)
+    config_entry.async_on_unload(register_callback(homeconnect, add_appliance, [Events.PAIRED, Events.PROGRAM_SELECTED]))
+    config_entry.async_on_unload(register_callback(homeconnect, remove_appliance, Events.DEPAIRED))
     for appliance in homeconnect.appliances.values():
         add_appliance(appliance)
 
 
 class OptionSwitch(EntityBase, SwitchEntity):
     """ Switch for binary options """
+    dormant_when_unavailable = True
+
     @property
     def device_class(self) -> str:
         return f"{DOMAIN}__options"
@@ -77,7 +78,8 @@ class OptionSwitch(EntityBase, SwitchEntity):
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn the entity on."""
         try:
-            await self._appliance.async_set_option(self._key, True)
+            async with self.trace_command("set_option", self._key, True):
+                await self._appliance.async_set_option(self._key, True)
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to set the option: {ex.error_description} ({ex.code})")
@@ -87,7 +89,8 @@ class OptionSwitch(EntityBase, SwitchEntity):
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn the entity off."""
         try:
-            await self._appliance.async_set_option(self._key, False)
+            async with self.trace_command("set_option", self._key, False):
+                await self._appliance.async_set_option(self._key, False)
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to set the option: {ex.error_description} ({ex.code})")
@@ -133,7 +136,8 @@ class SettingsSwitch(EntityBase, SwitchEntity):
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         try:
-            await self._appliance.async_apply_setting(self._key, True)
+            async with self.trace_command("apply_setting", self._key, True):
+                await self._appliance.async_apply_setting(self._key, True)
         except HomeConnectError as ex:
             if ex.error_description:
                 raise HomeAssistantError(f"Failed to apply the setting: {ex.error_description} ({ex.code})")
@@ -143,7 +147,8 @@ class SettingsSwitch(EntityBase, SwitchEntity):
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn the entity off."""
-        await self._appliance.async_apply_setting(self._key, False)
+        async with self.trace_command("apply_setting", self._key, False):
+            await self._appliance.async_apply_setting(self._key, False)
 
 
     async def async_on_update(self, appliance:Appliance, key:str, value) -> None:
@@ -0,0 +1,178 @@
+""" Tracing of commands from the user action to the stream event that confirms them """
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable
+
+from home_connect_async import Appliance
+
+from .const import COMMAND_TRACE_SIZE, COMMAND_TRACE_TIMEOUT
+
+if TYPE_CHECKING:
+    from .perf import PerfCounters
+
+# The trace of the command that is being sent by the current task, the auth object records the API requests on it
+CURRENT_TRACE:ContextVar[CommandTrace|None] = ContextVar("home_connect_alt_command_trace", default=None)
+
+
+class CommandTrace():
+    """ The timing of a single command
+
+    All the times are time.monotonic() values:
+    * started - the service was called or the entity action was invoked
+    * api_started, api_finished - the first API request was sent and the last response was received
+    * event_received - the confirming stream event was received
+    * confirmed - the confirming stream event was processed by the integration
+    """
+    def __init__(self, command:str, haid:str) -> None:
+        self.command = command
+        self.haid = haid
+        self.started = time.monotonic()
+        self.api_started:float|None = None
+        self.api_finished:float|None = None
+        self.api_requests = 0
+        self.event_received:float|None = None
+        self.confirmed:float|None = None
+        self.error:str|None = None
+
+    def api_request_started(self) -> None:
+        if self.api_started is None:
+            self.api_started = time.monotonic()
+        self.api_requests += 1
+
+    def api_request_finished(self) -> None:
+        self.api_finished = time.monotonic()
+
+    def spans(self) -> dict[str, float|None]:
+        """ The spans of the trace in milliseconds, None for the spans that didn't complete """
+        def span(start:float|None, end:float|None) -> float|None:
+            return round((end - start) * 1000, 2) if start is not None and end is not None else None
+
+        overhead = None
+        if self.api_started is not None and self.confirmed is not None and self.event_received is not None:
+            overhead = round(((self.api_started - self.started) + (self.confirmed - self.event_received)) * 1000, 2)
+        return {
+            "total": span(self.started, self.confirmed),
+            "before_api": span(self.started, self.api_started),
+            "api": span(self.api_started, self.api_finished),
+            "cloud": span(self.api_finished, self.event_received),
+            "processing": span(self.event_received, self.confirmed),
+            "overhead": overhead
+        }
+
+
+class CommandTracer():
+    """ Traces commands and keeps the latest traces in a ring buffer
+
+    A trace waits up to COMMAND_TRACE_TIMEOUT seconds for the confirming event after the API request completed.
+    """
+    def __init__(self, perf:PerfCounters) -> None:
+        self._perf = perf
+        self._pending:dict[CommandTrace, Callable[[], None]] = {}     # The release handles of the pending traces
+        self._timers:dict[CommandTrace, asyncio.TimerHandle] = {}
+        self.traces:deque[CommandTrace] = deque(maxlen=COMMAND_TRACE_SIZE)
+
+    @asynccontextmanager
+    async def async_trace(self, command:str, appliance:Appliance, confirm_key:str, confirm_value:Any=None) -> AsyncIterator[CommandTrace]:
+        """ Trace the command that is sent in the body of the context
+
+        The command is confirmed by the first event of confirm_key, with confirm_value if it is not None
+        """
+        trace = CommandTrace(command, appliance.haId)
+        registry = appliance._callbacks
+
+        def on_event(appliance:Appliance, key:str, value) -> None:
+            if trace.confirmed is None and (confirm_value is None or value == confirm_value):
+                trace.confirmed = time.monotonic()
+                trace.event_received = self._perf.event_time or trace.confirmed
+                if trace.api_finished is not None:
+                    # The callback can't be deregistered while the event is being broadcast
+                    asyncio.get_running_loop().call_soon(self._finish, trace)
+
+        def release() -> None:
+            try:
+                registry.deregister_callback(on_event, [confirm_key], appliance)
+            except KeyError:
+                pass  # The callbacks were cleared
+
+        # The confirming event may be processed before the API response is received
+        registry.register_callback(on_event, [confirm_key], appliance)
+        self._pending[trace] = release
+        token = CURRENT_TRACE.set(trace)
+        try:
+            yield trace
+        except Exception as ex:
+            trace.error = str(ex) or type(ex).__name__
+            self._finish(trace)
+            raise
+        finally:
+            CURRENT_TRACE.reset(token)
+
+        if trace.api_finished is None:
+            trace.api_finished = time.monotonic()
+        if trace.confirmed is not None:
+            self._finish(trace)
+        elif trace in self._pending:
+            self._timers[trace] = asyncio.get_running_loop().call_later(COMMAND_TRACE_TIMEOUT, self._expire, trace)
+
+    def _expire(self, trace:CommandTrace) -> None:
+        trace.error = "Not confirmed"
+        self._finish(trace)
+
+    def _finish(self, trace:CommandTrace) -> None:
+        release = self._pending.pop(trace, None)
+        if release is None:
+            return
+        release()
+        timer = self._timers.pop(trace, None)
+        if timer:
+            timer.cancel()
+        self.traces.append(trace)
+
+    def close(self) -> None:
+        """ Stop waiting for the confirmation of the pending commands """
+        for trace in list(self._pending):
+            trace.error = "Closed"
+            self._finish(trace)
+
+    def as_dict(self) -> dict:
+        """ The latency percentiles of every command type and the latest traces, for the diagnostics """
+        by_command:dict[str, list[dict]] = {}
+        traces = []
+        for trace in self.traces:
+            spans = trace.spans()
+            by_command.setdefault(trace.command, []).append(spans)
+            traces.append({ "command": trace.command, "haId": trace.haid, "api_requests": trace.api_requests, "error": trace.error, **spans })
+
+        def percentiles(values:list[float]) -> dict[str, float]|None:
+            values = sorted(v for v in values if v is not None)
+            if not values:
+                return None
+            return { f"p{p}": values[min(int(len(values) * p / 100), len(values) - 1)] for p in (50, 95, 99) }
+
+        return {
+            "commands": {
+                command: {
+                    "count": len(spans),
+                    "confirmed": sum(1 for s in spans if s["total"] is not None),
+                    **{ name: percentiles([ s[name] for s in spans ]) for name in ("total", "api", "cloud", "overhead") }
+                }
+                for (command, spans) in by_command.items()
+            },
+            "traces": traces
+        }
+
+
+@asynccontextmanager
+async def _no_trace() -> AsyncIterator[None]:
+    yield None
+
+
+def trace_command(perf:PerfCounters|None, command:str, appliance:Appliance, confirm_key:str, confirm_value:Any=None):
+    """ Trace a command if the performance counters are available, for use with "async with" """
+    if perf is None:
+        return _no_trace()
+    return perf.commands.async_trace(command, appliance, confirm_key, confirm_value)
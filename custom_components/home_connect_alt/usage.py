@@ -0,0 +1,92 @@
+""" Tracking of the programs that are used on every appliance, for the lazy option entities """
+from __future__ import annotations
+import logging
+
+from home_connect_async import Appliance
+from home_connect_async.appliance import Option
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import storage
+
+from .const import DOMAIN, PROGRAM_USAGE_SAVE_DELAY
+from .interning import intern_data
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ProgramUsage():
+    """ The programs that were selected or started on every appliance with the definitions of their options
+
+    When the lazy option entities are enabled the option entities are only created for these programs instead of
+    for every available program. The SDK only loads the options of the current program, so the option definitions
+    are kept in the history and persisted in the storage, which lets the entities of all the used programs be
+    created again after a restart.
+    """
+    def __init__(self, hass:HomeAssistant, entry_id:str) -> None:
+        self._store = storage.Store(hass, version=1, key=f"{DOMAIN}_program_usage_{entry_id}", private=True)
+        self._programs:dict[str, dict[str, dict[str, Option]]] = {}     # haId -> program key -> option key -> option
+        self.loaded = False
+
+    async def async_load(self) -> None:
+        """ Load the history from the storage """
+        data = await self._store.async_load()
+        if data:
+            data = intern_data(data)
+            self._programs = {
+                haid: {
+                    program_key: { option["key"]: Option.from_dict(option) for option in options }
+                    for (program_key, options) in programs.items()
+                }
+                for (haid, programs) in data.items()
+            }
+        self.loaded = True
+
+    async def async_remove(self) -> None:
+        """ Remove the history from the storage """
+        self._programs = {}
+        await self._store.async_remove()
+
+    def record(self, appliance:Appliance) -> None:
+        """ Add the selected and the active programs of an appliance to the history """
+        changed = False
+        for program in [ appliance.selected_program, appliance.active_program ]:
+            if program:
+                options = self._current_options(appliance, program.key)
+                programs = self._programs.setdefault(appliance.haId, {})
+                if options and options.keys() != programs.get(program.key, {}).keys():
+                    programs[program.key] = dict(options)
+                    changed = True
+                elif program.key not in programs:
+                    programs[program.key] = {}
+                    changed = True
+        if changed:
+            self._store.async_delay_save(self._data_to_save, PROGRAM_USAGE_SAVE_DELAY)
+
+    def get_options(self, appliance:Appliance) -> list[Option]:
+        """ The options of the used programs and of the current program of an appliance """
+        options = []
+        used = self._programs.get(appliance.haId, {})
+        current = [ program.key for program in [ appliance.selected_program, appliance.active_program ] if program ]
+        for program_key in list(used) + [ key for key in current if key not in used ]:
+            program_options = self._current_options(appliance, program_key) or used.get(program_key)
+            if program_options:
+                options.extend(program_options.values())
+        return options
+
+    def get_programs(self, appliance:Appliance) -> dict[str, dict[str, Option]]:
+        """ The option definitions of the used programs of an appliance, by program key """
+        return self._programs.get(appliance.haId, {})
+
+    @staticmethod
+    def _current_options(appliance:Appliance, program_key:str) -> dict[str, Option]|None:
+        """ The option definitions of a program that are currently loaded in the data model """
+        program = (appliance.available_programs or {}).get(program_key)
+        return program.options if program else None
+
+    def _data_to_save(self) -> dict:
+        return {
+            haid: {
+                program_key: [ option.to_dict() for option in options.values() ]
+                for (program_key, options) in programs.items()
+            }
+            for (haid, programs) in self._programs.items()
+        }
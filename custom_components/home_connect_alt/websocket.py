@@ -0,0 +1,143 @@
+""" WebSocket commands for streaming the data of the appliances to the frontend """
+from __future__ import annotations
+import fnmatch
+import logging
+import re
+from typing import TYPE_CHECKING, Any
+
+import voluptuous as vol
+from home_connect_async import Appliance, Events
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+
+from .common import appliance_snapshot, register_callback
+from .const import DOMAIN
+
+if TYPE_CHECKING:
+    from .runtime import EntryRuntime
+
+_LOGGER = logging.getLogger(__name__)
+
+# The events which change more than a single key, they are followed by a new snapshot
+RESYNC_EVENTS = [ Events.PAIRED, Events.DATA_CHANGED ]
+
+
+class ApplianceSubscription():
+    """ Streams the changes of an appliance to a WebSocket connection
+
+    The subscription registers a wildcard callback with the appliance, so it is fed by the same event dispatch that
+    updates the entities. The values of the changed keys are collected and coalesced, only the last value of every key
+    is sent, and are flushed together once per tick, which is the next iteration of the event loop or the interval
+    requested by the client. The events that change more than a single key, such as selecting a program or a refresh
+    of the appliance, send a new snapshot instead. When the client gives key patterns only the matching keys are sent.
+    The subscription is ended with an error when the appliance is depaired or its config entry is unloaded.
+    """
+    def __init__(self, hass:HomeAssistant, connection:websocket_api.ActiveConnection, msg_id:int, appliance:Appliance,
+        runtime:EntryRuntime, keys:list[str]|None, interval:float
+    ) -> None:
+        self._hass = hass
+        self._connection = connection
+        self._msg_id = msg_id
+        self._appliance = appliance
+        self._runtime = runtime
+        self._keys = re.compile("|".join(f"(?:{fnmatch.translate(key)})" for key in keys)) if keys else None
+        self._interval = interval
+        self._changes:dict[str, Any] = {}
+        self._resync = False
+        self._cancel_flush = None
+        self._release = None
+        self._release_unload = None
+
+    def start(self) -> None:
+        """ Send the snapshot of the appliance and start streaming its changes """
+        self._send({ "snapshot": self._snapshot() })
+        self._release = register_callback(self._appliance, self._async_on_event, "*")
+        self._release_unload = self._runtime.add_unload_listener(self._on_unloaded)
+
+    @callback
+    def stop(self) -> None:
+        """ Stop streaming, called when the client unsubscribes or disconnects and when the subscription ends """
+        if self._release:
+            # Deferred because the callbacks of the appliance can't be changed while an event is being dispatched
+            self._hass.loop.call_soon(self._release)
+            self._release = None
+        if self._release_unload:
+            self._release_unload()
+            self._release_unload = None
+        if self._cancel_flush:
+            self._cancel_flush()
+            self._cancel_flush = None
+
+    def _end(self, message:str) -> None:
+        """ End the subscription from the server side, the error tells the client to drop it """
+        self._connection.subscriptions.pop(self._msg_id, None)
+        self.stop()
+        self._connection.send_error(self._msg_id, websocket_api.const.ERR_NOT_FOUND, message)
+
+    def _on_unloaded(self) -> None:
+        self._release_unload = None
+        self._end("The Home Connect entry of the appliance was unloaded")
+
+    def _snapshot(self) -> dict:
+        return { "connected": self._appliance.connected, **appliance_snapshot(self._appliance, self._keys) }
+
+    async def _async_on_event(self, appliance:Appliance, key:str, value) -> None:
+        if key == Events.DEPAIRED:
+            self._send({ "depaired": True })
+            self._end("The appliance was depaired")
+            return
+        if key == Events.CONNECTION_CHANGED:
+            self._changes["connected"] = appliance.connected
+        elif key in RESYNC_EVENTS:
+            self._resync = True
+        elif isinstance(key, Events) or (self._keys and not self._keys.fullmatch(key)):
+            return
+        else:
+            self._changes[key] = value
+        if self._cancel_flush is None:
+            if self._interval:
+                self._cancel_flush = self._hass.loop.call_later(self._interval, self._flush).cancel
+            else:
+                self._cancel_flush = self._hass.loop.call_soon(self._flush).cancel
+
+    def _flush(self) -> None:
+        self._cancel_flush = None
+        if self._resync:
+            # The snapshot already has the latest value of every key
+            self._send({ "snapshot": self._snapshot() })
+        elif self._changes:
+            self._send({ "changes": self._changes })
+        self._resync = False
+        self._changes = {}
+
+    def _send(self, event:dict) -> None:
+        self._connection.send_message(websocket_api.event_message(self._msg_id, event))
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): f"{DOMAIN}/subscribe_appliance",
+        vol.Required("device_id"): str,
+        vol.Optional("keys"): [str],
+        vol.Optional("interval", default=0): vol.All(vol.Coerce(float), vol.Range(min=0, max=60))
+    }
+)
+@callback
+def ws_subscribe_appliance(hass:HomeAssistant, connection:websocket_api.ActiveConnection, msg:dict) -> None:
+    """ Send the snapshot of an appliance and then its changes """
+    services = hass.data.get(DOMAIN, {}).get("services")
+    appliance = services.get_appliance_from_device_id(msg["device_id"]) if services else None
+    runtime = services.get_entry_runtime(appliance) if appliance else None
+    if not runtime:
+        connection.send_error(msg["id"], websocket_api.const.ERR_NOT_FOUND, "The device isn't a Home Connect appliance")
+        return
+
+    subscription = ApplianceSubscription(hass, connection, msg["id"], appliance, runtime, msg.get("keys"), msg["interval"])
+    connection.subscriptions[msg["id"]] = subscription.stop
+    connection.send_result(msg["id"])
+    subscription.start()
+
+
+def async_register_websocket_commands(hass:HomeAssistant) -> None:
+    """ Register the WebSocket commands of the integration """
+    websocket_api.async_register_command(hass, ws_subscribe_appliance)
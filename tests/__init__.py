@@ -0,0 +1 @@
+""" Tests for the Home Connect Alt integration """
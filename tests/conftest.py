@@ -0,0 +1,90 @@
+""" Fixtures for the Home Connect Alt tests """
+from __future__ import annotations
+import time
+from unittest.mock import patch
+
+import pytest
+from home_connect_async import HomeConnect
+from homeassistant.const import CONF_CLIENT_ID, CONF_CLIENT_SECRET
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+from homeassistant.setup import async_setup_component
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.home_connect_alt.const import DOMAIN, ENTRIES
+from custom_components.home_connect_alt.runtime import discard_runtime
+from tools.fleet import build_fleet, scale_mix
+from tools.harness import ModelApi, create_model
+
+pytest_plugins = "pytest_homeassistant_custom_component"
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """ Load the integration from custom_components """
+    yield
+
+
+@pytest.fixture
+def template_model() -> HomeConnect:
+    """ A loaded data model of a small synthetic fleet which answers the API requests of the integration """
+    return create_model(build_fleet(scale_mix(6), seed=1), active_every=3)
+
+
+@pytest.fixture
+def config_entry(hass:HomeAssistant) -> MockConfigEntry:
+    """ A config entry with a valid token """
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            "auth_implementation": DOMAIN,
+            "token": {
+                "access_token": "access",
+                "refresh_token": "refresh",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+                "expires_at": time.time() + 3600
+            }
+        }
+    )
+    entry.add_to_hass(hass)
+    return entry
+
+
+@pytest.fixture
+async def setup_integration(hass:HomeAssistant, config_entry:MockConfigEntry, template_model:HomeConnect):
+    """ Set up the integration with the cloud service replaced by the template data model
+
+    Only the API and the event stream are replaced, the data is loaded by the integration through the SDK
+    """
+    async def async_create(auth, *args, **kwargs) -> HomeConnect:
+        homeconnect = HomeConnect()
+        api = ModelApi(template_model)
+        api.catalog = { haid: appliance.available_programs for (haid, appliance) in template_model.appliances.items() }
+        homeconnect._api = api
+        return homeconnect
+
+    with patch.object(HomeConnect, "async_create", async_create), patch.object(HomeConnect, "subscribe_for_updates"), \
+        patch("custom_components.home_connect_alt.async_integration_yaml_config", return_value=None):
+        assert await async_setup_component(hass, DOMAIN, { DOMAIN: { CONF_CLIENT_ID: "client", CONF_CLIENT_SECRET: "secret" } })
+        # The appliances are loaded in the background after the entry was set up
+        await hass.data[DOMAIN][ENTRIES][config_entry.entry_id].loader._load_task
+        await hass.async_block_till_done()
+        yield config_entry
+        await hass.config_entries.async_unload(config_entry.entry_id)
+        # Close the runtime that is kept for a reload, like the end of the grace period does
+        discard_runtime(hass, config_entry.entry_id)
+        await hass.async_block_till_done()
+
+
+@pytest.fixture
+def device_ids(hass:HomeAssistant, setup_integration) -> dict[str, str]:
+    """ The device ID of every appliance by haId """
+    devices = dr.async_entries_for_config_entry(dr.async_get(hass), setup_integration.entry_id)
+    homeconnect = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect
+    return {
+        haid: device.id
+        for haid in homeconnect.appliances
+        for device in devices
+        if (DOMAIN, haid.lower().replace('-', '_')) in device.identifiers
+    }
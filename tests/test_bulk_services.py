@@ -0,0 +1,94 @@
+""" Services that run an operation on many appliances """
+from __future__ import annotations
+import asyncio
+
+from home_connect_async import HomeConnectError
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import area_registry as ar
+from homeassistant.helpers import device_registry as dr
+
+from custom_components.home_connect_alt.const import CONF_MAX_CONCURRENCY, DOMAIN, ENTRIES
+
+
+async def test_bulk_results_are_aggregated_per_device(hass:HomeAssistant, setup_integration, device_ids) -> None:
+    """ A failing appliance and a device that isn't an appliance don't stop the other appliances """
+    appliances = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect.appliances
+    (failing, *working) = list(device_ids)[:3]
+
+    async def async_fail() -> None:
+        raise HomeConnectError("The appliance is busy")
+    appliances[failing].async_stop_active_program = async_fail
+
+    targets = [ device_ids[haid] for haid in [failing, *working] ] + ["not-a-device"]
+    response = await hass.services.async_call(DOMAIN, "bulk_stop_program", { "device_id": targets }, blocking=True, return_response=True)
+
+    assert response["succeeded"] == len(working)
+    assert response["failed"] == 2
+    assert list(response["results"]) == targets
+    failed = response["results"][device_ids[failing]]
+    assert not failed["success"] and failed["error"] == "The appliance is busy"
+    assert failed["appliance"] == appliances[failing].name
+    for haid in working:
+        assert response["results"][device_ids[haid]]["success"]
+        assert response["results"][device_ids[haid]]["error"] is None
+    unknown = response["results"]["not-a-device"]
+    assert not unknown["success"] and unknown["appliance"] is None
+
+
+async def test_bulk_operations_are_bounded_by_max_concurrency(hass:HomeAssistant, setup_integration, device_ids) -> None:
+    """ No more than max_concurrency operations run at the same time """
+    hass.data[DOMAIN][CONF_MAX_CONCURRENCY] = 2
+    appliances = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect.appliances
+    running = 0
+    peak = 0
+
+    async def async_stop() -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+    for haid in device_ids:
+        appliances[haid].async_stop_active_program = async_stop
+
+    response = await hass.services.async_call(
+        DOMAIN, "bulk_stop_program", { "device_id": list(device_ids.values()) }, blocking=True, return_response=True
+    )
+
+    assert response["succeeded"] == len(device_ids)
+    assert peak == 2
+
+
+async def test_unexpected_errors_are_reported_per_device(hass:HomeAssistant, setup_integration, device_ids, caplog) -> None:
+    """ An error that isn't a Home Connect error is logged and reported in the result of its device """
+    appliances = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect.appliances
+    (failing, working) = list(device_ids)[:2]
+
+    async def async_fail() -> None:
+        raise KeyError("BSH.Common.Status.OperationState")
+    appliances[failing].async_stop_active_program = async_fail
+
+    response = await hass.services.async_call(
+        DOMAIN, "bulk_stop_program", { "device_id": [device_ids[failing], device_ids[working]] }, blocking=True, return_response=True
+    )
+
+    assert response["succeeded"] == 1 and response["failed"] == 1
+    failed = response["results"][device_ids[failing]]
+    assert not failed["success"] and "BSH.Common.Status.OperationState" in failed["error"]
+    assert response["results"][device_ids[working]]["success"]
+    assert any(record.exc_info and record.exc_info[0] is KeyError for record in caplog.records)
+
+
+async def test_area_targets_leave_out_the_service_device(hass:HomeAssistant, setup_integration, device_ids) -> None:
+    """ Only the appliance devices of an area are targeted, not the Home Connect service device in the same area """
+    device_reg = dr.async_get(hass)
+    area = ar.async_get(hass).async_create("Laundry")
+    haid = next(iter(device_ids))
+    service_device = device_reg.async_get_device({(DOMAIN, f"homeconnect_{setup_integration.entry_id}")})
+    for device_id in [device_ids[haid], service_device.id]:
+        device_reg.async_update_device(device_id, area_id=area.id)
+
+    response = await hass.services.async_call(DOMAIN, "bulk_stop_program", { "area_id": area.id }, blocking=True, return_response=True)
+
+    assert list(response["results"]) == [device_ids[haid]]
+    assert response["failed"] == 0
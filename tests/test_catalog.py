@@ -0,0 +1,98 @@
+""" The catalog of the programs, options and settings of the appliances """
+from __future__ import annotations
+import copy
+import dataclasses
+
+import pytest
+from home_connect_async import HomeConnect
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+
+from custom_components.home_connect_alt.catalog import CatalogIndex
+from custom_components.home_connect_alt.const import DOMAIN
+from custom_components.home_connect_alt.refresh import merge_programs
+
+
+@pytest.fixture
+def washer(template_model:HomeConnect):
+    return next(appliance for appliance in template_model.appliances.values() if appliance.type == "Washer")
+
+
+def test_query_returns_the_constraints(washer) -> None:
+    """ Every available program is listed with the constraints of its options, without their values """
+    catalog = CatalogIndex().query(washer)
+
+    assert set(catalog["programs"]) == set(washer.available_programs)
+    assert set(catalog["settings"]) == set(washer.settings)
+    (program_key, program) = next(iter(washer.available_programs.items()))
+    (option_key, option) = next(iter(program.options.items()))
+    constraints = catalog["programs"][program_key]["options"][option_key]
+    assert constraints["unit"] == option.unit and constraints["max"] == option.max
+    assert "value" not in constraints
+
+
+def test_the_index_is_only_rebuilt_when_the_programs_are_replaced(washer) -> None:
+    """ Queries reuse the index until the SDK replaces the available programs """
+    index = CatalogIndex()
+    index.query(washer)
+    index.query(washer, program="*Cotton")
+    assert index.builds == 1
+
+    washer.available_programs = copy.deepcopy(washer.available_programs)
+    index.query(washer)
+    assert index.builds == 2
+
+
+def test_options_that_were_not_fetched_again_are_kept(washer) -> None:
+    """ The SDK only fetches the options of the current program, the options indexed before are kept """
+    index = CatalogIndex()
+    before = index.query(washer)
+    washer.available_programs = { key: dataclasses.replace(program, options=None) for (key, program) in washer.available_programs.items() }
+    washer.selected_program = washer.active_program = None
+
+    after = index.query(washer)
+    assert after["programs"] == before["programs"]
+
+
+def test_refreshed_constraints_are_indexed(washer) -> None:
+    """ Option constraints that change with a refresh are indexed again """
+    index = CatalogIndex()
+    index.query(washer)
+    fetched = copy.deepcopy(washer.available_programs)
+    (program_key, program) = next(iter(fetched.items()))
+    (option_key, option) = next((key, option) for (key, option) in program.options.items() if option.max is not None)
+    option.max += 10
+
+    merge_programs(washer, fetched)
+
+    assert index.query(washer)["programs"][program_key]["options"][option_key]["max"] == option.max
+    assert index.builds == 2
+
+
+def test_query_patterns(washer) -> None:
+    """ The program pattern limits the programs and leaves out the settings, the key pattern limits options and settings """
+    index = CatalogIndex()
+    catalog = index.query(washer, program="*.cotton")
+    assert list(catalog["programs"]) == []
+    catalog = index.query(washer, program="*.Cotton")
+    assert list(catalog["programs"]) == ["LaundryCare.Washer.Program.Cotton"]
+    assert catalog["settings"] == {}
+
+    catalog = index.query(washer, key="*.Temperature")
+    for program in catalog["programs"].values():
+        assert all(key.endswith(".Temperature") for key in program["options"])
+    assert all(key.endswith(".Temperature") for key in catalog["settings"])
+    assert any(program["options"] for program in catalog["programs"].values())
+
+
+async def test_get_catalog_service_returns_the_catalog(hass:HomeAssistant, setup_integration, device_ids, template_model) -> None:
+    """ The service returns the catalog as its response and rejects devices that aren't appliances """
+    (haid, appliance) = next((haid, appliance) for (haid, appliance) in template_model.appliances.items() if appliance.available_programs)
+    response = await hass.services.async_call(
+        DOMAIN, "get_catalog", { "device_id": device_ids[haid], "key": "BSH.Common.*" }, blocking=True, return_response=True
+    )
+    assert set(response["programs"]) == set(appliance.available_programs)
+    assert all(key.startswith("BSH.Common.") for key in response["settings"])
+
+    with pytest.raises(HomeAssistantError, match="isn't a Home Connect appliance"):
+        await hass.services.async_call(DOMAIN, "get_catalog", { "device_id": "not-a-device" }, blocking=True, return_response=True)
@@ -0,0 +1,54 @@
+""" Diagnostics of the config entry """
+from __future__ import annotations
+import json
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.home_connect_alt.diagnostics import async_get_config_entry_diagnostics, build_diagnostics
+
+
+async def test_diagnostics_alias_the_appliances(hass:HomeAssistant, setup_integration, template_model) -> None:
+    """ Every appliance is dumped under an alias and the appliance IDs don't appear anywhere """
+    diagnostics = await async_get_config_entry_diagnostics(hass, setup_integration)
+
+    assert len(diagnostics["appliances"]) + len(diagnostics["truncated"]) == len(template_model.appliances)
+    text = json.dumps(diagnostics)
+    for haid in template_model.appliances:
+        assert haid not in text
+    assert diagnostics["entry"]["data"]["token"] == "**REDACTED**"
+
+
+def test_build_diagnostics_redacts_structurally() -> None:
+    """ The IDs are replaced in keys, values and inside strings and the sensitive values are redacted at any depth """
+    haid = "SIEMENS-WM14T6H0-68A40E000001"
+    appliances = { haid: { "haId": haid, "vib": "WM14T6H0", "enumber": "WM14T6H0/01", "brand": "SIEMENS", "settings": { "Power": 1 } } }
+    info = {
+        "loader": { "buffered_events": { haid: 2 } },
+        "entities": { "siemens_wm14t6h0_68a40e000001": { "sensor": 3 } },
+        "commands": [ { "endpoint": f"/api/homeappliances/{haid}/programs/active", "token": None } ],
+        "entry": { "data": { "token": { "access_token": "secret" } } }
+    }
+
+    dump = build_diagnostics(info, appliances, { haid: [ (0, "STATUS", { "haId": haid }) ] }, 10000)
+
+    assert haid not in json.dumps(dump)
+    assert dump["loader"]["buffered_events"] == { "appliance_1": 2 }
+    assert dump["entities"] == { "appliance_1": { "sensor": 3 } }
+    assert dump["commands"] == [ { "endpoint": "/api/homeappliances/appliance_1/programs/active", "token": None } ]
+    assert dump["entry"]["data"]["token"] == "**REDACTED**"
+    model = dump["appliances"]["appliance_1"]["model"]
+    assert model == { "haId": "appliance_1", "vib": "**REDACTED**", "enumber": "**REDACTED**", "brand": "SIEMENS", "settings": { "Power": 1 } }
+    assert dump["appliances"]["appliance_1"]["recent_events"][0]["data"] == { "haId": "appliance_1" }
+    assert dump["truncated"] == [] and "truncated_reason" not in dump
+
+
+def test_build_diagnostics_documents_the_truncation() -> None:
+    """ The appliances that don't fit are listed with the reason and the size limit """
+    appliances = { f"BOSCH-HBG-{index:012}": { "settings": { "Key": "x" * 400 } } for index in range(3) }
+
+    dump = build_diagnostics({}, appliances, {}, 1000)
+
+    assert list(dump["appliances"]) == ["appliance_1"]
+    assert dump["truncated"] == ["appliance_2", "appliance_3"]
+    assert dump["max_size"] == 1000
+    assert "2 appliances" in dump["truncated_reason"]
@@ -0,0 +1,60 @@
+""" Dormant entities that are detached from their update callbacks while they are unavailable """
+from __future__ import annotations
+
+from home_connect_async import Events
+from homeassistant.const import STATE_UNAVAILABLE
+from homeassistant.core import HomeAssistant
+
+from custom_components.home_connect_alt.button import StopButton
+from custom_components.home_connect_alt.const import DOMAIN, ENTRIES
+
+
+def _stop_buttons(hass:HomeAssistant, entry_id:str) -> dict[str, StopButton]:
+    dormancy = hass.data[DOMAIN][ENTRIES][entry_id].dormancy
+    return { entity.haId: entity for entity in dormancy._entities if isinstance(entity, StopButton) }
+
+
+async def test_unavailable_entities_start_dormant(hass:HomeAssistant, setup_integration) -> None:
+    """ The stop button of an appliance without an active program has no callbacks except the wake-up callback """
+    dormancy = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].dormancy
+    buttons = _stop_buttons(hass, setup_integration.entry_id)
+    assert buttons
+
+    for button in buttons.values():
+        if button._appliance.active_program:
+            assert not button._dormant and button._release_updates
+        else:
+            assert button._dormant and not button._release_updates
+            assert button in dormancy._dormant[button._appliance.haId]
+            assert button._appliance.haId in dormancy._release_wake
+    assert dormancy.counts()["dormant"] == sum(len(entities) for entities in dormancy._dormant.values())
+
+
+async def test_dormant_entities_wake_up_and_sleep_again(hass:HomeAssistant, setup_integration) -> None:
+    """ A data change that makes a dormant entity available attaches its callbacks and a later one releases them """
+    button = next(button for button in _stop_buttons(hass, setup_integration.entry_id).values() if button._dormant)
+    appliance = button._appliance
+    program = next(iter(appliance.available_programs.values()))
+
+    appliance.active_program = program
+    await appliance._callbacks.async_broadcast_event(appliance, Events.DATA_CHANGED)
+    await hass.async_block_till_done()
+    assert not button._dormant and button._release_updates
+    assert hass.states.get(button.entity_id).state != STATE_UNAVAILABLE
+
+    appliance.active_program = None
+    await appliance._callbacks.async_broadcast_event(appliance, Events.DATA_CHANGED)
+    await hass.async_block_till_done()
+    assert button._dormant and not button._release_updates
+    assert hass.states.get(button.entity_id).state == STATE_UNAVAILABLE
+
+
+async def test_unload_releases_the_wake_up_callbacks(hass:HomeAssistant, setup_integration) -> None:
+    """ Removing the entities releases the wake-up callbacks of their appliances """
+    dormancy = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].dormancy
+    assert dormancy._release_wake
+
+    assert await hass.config_entries.async_unload(setup_integration.entry_id)
+    await hass.async_block_till_done()
+    assert dormancy.counts() == { "active": 0, "dormant": 0 }
+    assert not dormancy._release_wake
@@ -0,0 +1,81 @@
+""" Include and exclude filters for the entities of the appliances """
+from __future__ import annotations
+from types import SimpleNamespace
+
+from custom_components.home_connect_alt.filters import EntityFilter
+
+WASHER = SimpleNamespace(haId="BOSCH-WAT28400-68A40E2A1B2C", type="Washer")
+OVEN = SimpleNamespace(haId="SIEMENS-HB676G5S6-3E1C8F0D4A5B", type="Oven")
+
+
+def test_no_rules_and_not_compact_creates_no_filter() -> None:
+    """ There is nothing to filter without rules """
+    assert EntityFilter.from_config(None) is None
+    assert EntityFilter.from_config({ "include": [], "exclude": [] }) is None
+    assert EntityFilter.from_config(None, compact=True) is not None
+
+
+def test_include_rules_match_every_field() -> None:
+    """ Only the entities matching all the fields of an include rule are created """
+    entity_filter = EntityFilter(include=[ { "platform": "sensor", "appliance_type": "washer", "key": "BSH.Common.Status.*" } ])
+    assert entity_filter.allows("sensor", WASHER, "BSH.Common.Status.OperationState")
+    assert not entity_filter.allows("sensor", WASHER, "BSH.Common.Setting.PowerState")
+    assert not entity_filter.allows("sensor", OVEN, "BSH.Common.Status.OperationState")
+    assert not entity_filter.allows("switch", WASHER, "BSH.Common.Status.OperationState")
+
+
+def test_key_patterns_are_case_sensitive_and_other_fields_are_not() -> None:
+    """ The platform, appliance type and haId globs ignore the case, the key glob doesn't """
+    entity_filter = EntityFilter(exclude=[ { "platform": "SENSOR", "haid": "bosch-*", "key": "*.DoorState" } ])
+    assert not entity_filter.allows("sensor", WASHER, "BSH.Common.Status.DoorState")
+    assert entity_filter.allows("sensor", WASHER, "BSH.Common.Status.doorstate")
+    assert entity_filter.allows("sensor", OVEN, "BSH.Common.Status.DoorState")
+
+
+def test_exclude_rules_win_over_include_rules() -> None:
+    """ An entity matching both an include and an exclude rule isn't created """
+    entity_filter = EntityFilter(
+        include=[ { "appliance_type": "Washer" } ],
+        exclude=[ { "key": "*.SpinSpeed" } ]
+    )
+    assert entity_filter.allows("select", WASHER, "LaundryCare.Washer.Option.Temperature")
+    assert not entity_filter.allows("select", WASHER, "LaundryCare.Washer.Option.SpinSpeed")
+
+
+def test_patterns_match_whole_values() -> None:
+    """ Patterns are anchored on both ends and regular expression characters in globs are literal """
+    entity_filter = EntityFilter(exclude=[ { "key": "BSH.Common.Status.Door" }, { "key": "[ab]|c" } ])
+    assert not entity_filter.allows("sensor", WASHER, "BSH.Common.Status.Door")
+    assert entity_filter.allows("sensor", WASHER, "BSH.Common.Status.DoorState")
+    assert entity_filter.allows("sensor", WASHER, "BSHxCommon.Status.Door")
+    assert not entity_filter.allows("sensor", WASHER, "a|c")
+    assert entity_filter.allows("sensor", WASHER, "a")
+
+
+def test_entities_without_a_key() -> None:
+    """ Entities without a key are only filtered by the exclude rules that don't have a key pattern """
+    entity_filter = EntityFilter(
+        include=[ { "key": "BSH.Common.*" } ],
+        exclude=[ { "platform": "button", "appliance_type": "Oven" }, { "platform": "select", "key": "*" } ]
+    )
+    assert entity_filter.allows("select", WASHER, None)
+    assert entity_filter.allows("button", WASHER, None)
+    assert not entity_filter.allows("button", OVEN, None)
+
+
+def test_compact_mode() -> None:
+    """ In the compact mode only the compact entities and the included entities are created """
+    entity_filter = EntityFilter(include=[ { "key": "*.PowerState" } ], compact=True)
+    assert entity_filter.allows("sensor", WASHER, "BSH.Common.Status.OperationState")
+    assert entity_filter.allows("switch", WASHER, "BSH.Common.Setting.PowerState")
+    assert not entity_filter.allows("sensor", WASHER, "BSH.Common.Status.RemoteControlActive")
+    assert not entity_filter.allows("button", WASHER, None)
+
+
+def test_forget_appliance_drops_the_cached_decisions() -> None:
+    """ The decisions of a depaired appliance are dropped from the cache """
+    entity_filter = EntityFilter(exclude=[ { "appliance_type": "Oven" } ])
+    entity_filter.allows("sensor", WASHER, "BSH.Common.Status.DoorState")
+    entity_filter.allows("sensor", OVEN, "BSH.Common.Status.DoorState")
+    entity_filter.forget_appliance(OVEN)
+    assert { haid for (_, haid, _) in entity_filter._decisions } == { WASHER.haId }
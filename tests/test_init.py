@@ -0,0 +1,57 @@
+""" Setup, services and unload of the integration """
+from __future__ import annotations
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+
+from custom_components.home_connect_alt.const import DOMAIN, ENTRIES
+
+SERVICES = [
+    "select_program", "start_program", "stop_program", "bulk_select_program", "bulk_start_program", "bulk_stop_program",
+    "get_catalog", "refresh", "record_events", "profile"
+]
+
+
+async def test_setup_registers_services_and_loads_appliances(hass:HomeAssistant, setup_integration, template_model) -> None:
+    """ The entry is set up, all the services are registered and every appliance gets a device """
+    assert setup_integration.state is ConfigEntryState.LOADED
+    for service in SERVICES:
+        assert hass.services.has_service(DOMAIN, service), service
+
+    homeconnect = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect
+    assert set(homeconnect.appliances) == set(template_model.appliances)
+    devices = dr.async_entries_for_config_entry(dr.async_get(hass), setup_integration.entry_id)
+    identifiers = { identifier for device in devices for (domain, identifier) in device.identifiers if domain == DOMAIN }
+    for haid in template_model.appliances:
+        assert haid.lower().replace('-', '_') in identifiers
+
+
+async def test_unload_removes_services(hass:HomeAssistant, setup_integration) -> None:
+    """ The services are removed with the last entry """
+    assert await hass.config_entries.async_unload(setup_integration.entry_id)
+    await hass.async_block_till_done()
+    assert setup_integration.state is ConfigEntryState.NOT_LOADED
+    assert not hass.services.has_service(DOMAIN, "select_program")
+
+
+async def test_refresh_service(hass:HomeAssistant, setup_integration, device_ids) -> None:
+    """ The refresh service reloads a section of an appliance through the API """
+    runtime = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id]
+    (haid, device_id) = next(iter(device_ids.items()))
+    requests = runtime.homeconnect._api.request_count
+    await hass.services.async_call(DOMAIN, "refresh", { "device_id": device_id, "section": "status" }, blocking=True)
+    assert runtime.homeconnect._api.request_count > requests
+    assert runtime.homeconnect.appliances[haid].status
+
+
+async def test_profile_service_returns_the_path(hass:HomeAssistant, setup_integration, tmp_path) -> None:
+    """ The profile service returns the file it saves the profile to """
+    hass.config.config_dir = str(tmp_path)
+    response = await hass.services.async_call(
+        DOMAIN, "profile", { "duration": 1, "max_calls": 1 }, blocking=True, return_response=True
+    )
+    assert response["path"].startswith(str(tmp_path))
+    assert response["path"].endswith(".prof")
+    # Stop it without saving, like an unload does
+    hass.data[DOMAIN]["services"].close()
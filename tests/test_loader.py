@@ -0,0 +1,216 @@
+""" Buffering and replay of the stream events while the data model is loaded """
+from __future__ import annotations
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from home_connect_async import HomeConnect, HomeConnectError
+
+from custom_components.home_connect_alt import loader as loader_module
+from custom_components.home_connect_alt.loader import DataLoader
+from tools.harness import ModelApi, OfflineResponse
+
+
+class FakeClock():
+    """ A monotonic clock that only moves when told to """
+    def __init__(self) -> None:
+        self.now = 100.0
+        self.time = time.time
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def _event(haid:str, value:int) -> SimpleNamespace:
+    data = json.dumps({ "haId": haid, "items": [ { "key": "BSH.Common.Status.DoorState", "value": value } ] })
+    return SimpleNamespace(type="NOTIFY", data=data, last_event_id=haid)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(loader_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def loader(template_model:HomeConnect) -> DataLoader:
+    """ A loader of the template model which records the events it processes and the appliances it fetches """
+    loader = DataLoader(template_model, 4, buffer_size=3)
+    loader.processed = []
+    loader.fetched = []
+
+    async def process_updates(event) -> None:
+        loader.processed.append(json.loads(event.data)["items"][0]["value"])
+
+    async def fetch_appliance_data(appliance) -> None:
+        loader.fetched.append(appliance.haId)
+
+    loader._async_process_updates = process_updates
+    loader.async_fetch_appliance_data = fetch_appliance_data
+    return loader
+
+
+async def test_events_are_buffered_until_the_appliance_is_loaded(loader:DataLoader, template_model:HomeConnect) -> None:
+    """ Events of pending appliances are buffered, the events of other appliances are processed """
+    (loading, loaded) = list(template_model.appliances)[:2]
+    loader._pending = { loading }
+
+    await loader._async_process_event(_event(loading, 1))
+    await loader._async_process_event(_event(loaded, 2))
+
+    assert loader.processed == [2]
+    assert len(loader._buffers[loading]) == 1
+
+
+async def test_replay_skips_events_that_are_not_newer_than_the_snapshot(loader:DataLoader, template_model:HomeConnect, clock:FakeClock) -> None:
+    """ Events received up to the time the snapshot was taken are already part of it """
+    haid = next(iter(template_model.appliances))
+    loader._pending = { haid }
+    await loader._async_process_event(_event(haid, 1))
+    clock.now += 1
+    await loader._async_process_event(_event(haid, 2))
+    snapshot_time = clock.now
+    clock.now += 1
+    await loader._async_process_event(_event(haid, 3))
+
+    await loader._async_replay_events(haid, snapshot_time)
+
+    assert loader.processed == [3]
+    assert loader.fetched == []
+    assert haid not in loader._buffers and haid not in loader._pending
+
+    await loader._async_process_event(_event(haid, 4))
+    assert loader.processed == [3, 4]
+
+
+async def test_overflow_after_the_snapshot_fetches_the_data_again(loader:DataLoader, template_model:HomeConnect, clock:FakeClock) -> None:
+    """ Dropping events that are newer than the snapshot refreshes the appliance before the rest is replayed """
+    haid = next(iter(template_model.appliances))
+    loader._pending = { haid }
+    snapshot_time = clock.now
+    for value in range(1, 6):
+        clock.now += 1
+        await loader._async_process_event(_event(haid, value))
+    assert loader._dropped[haid] > snapshot_time
+
+    async def fetch_appliance_data(appliance) -> None:
+        loader.fetched.append(appliance.haId)
+        clock.now += 1
+    loader.async_fetch_appliance_data = fetch_appliance_data
+
+    await loader._async_replay_events(haid, snapshot_time)
+
+    assert loader.fetched == [haid]
+    assert loader.processed == []
+    assert haid not in loader._dropped
+
+
+async def test_overflow_before_the_snapshot_is_ignored(loader:DataLoader, template_model:HomeConnect, clock:FakeClock) -> None:
+    """ Dropped events that are older than the snapshot don't need another fetch """
+    haid = next(iter(template_model.appliances))
+    loader._pending = { haid }
+    for value in range(1, 5):
+        clock.now += 1
+        await loader._async_process_event(_event(haid, value))
+    clock.now += 1
+
+    await loader._async_replay_events(haid, clock.now)
+
+    assert loader.fetched == []
+    assert haid not in loader._dropped
+
+
+async def test_stopping_the_buffering_replays_the_overflowed_buffers(loader:DataLoader, template_model:HomeConnect, clock:FakeClock) -> None:
+    """ Buffers that overflowed before the appliance was loaded are checked when the buffering stops """
+    haid = next(iter(template_model.appliances))
+    for value in range(1, 5):
+        clock.now += 1
+        await loader._async_process_event(_event(haid, value))
+
+    await loader._async_stop_buffering()
+
+    assert loader.fetched == [haid]
+    assert loader._buffers == {} and loader._dropped == {}
+    await loader._async_process_event(_event(haid, 5))
+    assert loader.processed == [5]
+
+
+@pytest.fixture
+def empty_model(template_model:HomeConnect) -> HomeConnect:
+    """ An empty data model whose API answers from the template model """
+    homeconnect = HomeConnect()
+    api = ModelApi(template_model)
+    api.catalog = { haid: appliance.available_programs for (haid, appliance) in template_model.appliances.items() }
+    homeconnect._api = api
+    return homeconnect
+
+
+async def test_loading_is_bounded_by_max_concurrency(empty_model:HomeConnect, template_model:HomeConnect) -> None:
+    """ No more than max_concurrency appliances are loaded at the same time and all of them are published """
+    loader = DataLoader(empty_model, 2)
+    fetch_appliance_data = loader.async_fetch_appliance_data
+    running = 0
+    peak = 0
+
+    async def async_fetch(appliance) -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        await fetch_appliance_data(appliance)
+        running -= 1
+    loader.async_fetch_appliance_data = async_fetch
+
+    await loader.async_load_data()
+
+    assert peak == 2
+    assert set(empty_model.appliances) == set(template_model.appliances)
+    assert empty_model.status & HomeConnect.HomeConnectStatus.LOADED
+
+
+async def test_a_failing_appliance_does_not_stop_the_others(empty_model:HomeConnect, template_model:HomeConnect) -> None:
+    """ An unexpected error of one appliance leaves it out and the other appliances are still loaded """
+    (failing, *others) = list(template_model.appliances)
+    loader = DataLoader(empty_model, 2)
+    fetch_appliance_data = loader.async_fetch_appliance_data
+    completed = []
+
+    async def async_fetch(appliance) -> None:
+        if appliance.haId == failing:
+            raise ValueError("Unexpected data")
+        await fetch_appliance_data(appliance)
+    loader.async_fetch_appliance_data = async_fetch
+
+    loader.set_callbacks(completed.append)
+    await loader.async_load_data()
+
+    assert completed == [empty_model]
+    assert set(empty_model.appliances) == set(others)
+    assert empty_model.status & HomeConnect.HomeConnectStatus.LOADED
+    assert loader._pending == set() and loader._buffers == {}
+
+
+async def test_only_appliance_errors_mark_the_appliance_offline(empty_model:HomeConnect, template_model:HomeConnect) -> None:
+    """ An error with an error key is retried as an offline appliance, other API errors are not """
+    (offline, unavailable, *_) = list(template_model.appliances)
+    loader = DataLoader(empty_model, 2)
+    fetch_appliance_data = loader.async_fetch_appliance_data
+
+    async def async_fetch(appliance) -> None:
+        if appliance.haId == offline:
+            raise HomeConnectError("Offline", response=OfflineResponse(409, error_key="SDK.Error.HomeAppliance.Connection.Initialization.Failed"))
+        if appliance.haId == unavailable:
+            raise HomeConnectError("Failed to get a valid response from Home Connect server", 902)
+        await fetch_appliance_data(appliance)
+    loader.async_fetch_appliance_data = async_fetch
+
+    await loader.async_load_data()
+
+    appliance = empty_model.appliances[offline]
+    assert not appliance.connected
+    assert appliance._wait_for_device_task is not None
+    loader.cancel_appliance_tasks(appliance)
+    assert unavailable not in empty_model.appliances
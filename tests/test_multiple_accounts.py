@@ -0,0 +1,123 @@
+""" Several config entries, one for every Home Connect account """
+from __future__ import annotations
+import time
+from unittest.mock import patch
+
+import pytest
+from home_connect_async import HomeConnect
+from homeassistant.const import CONF_CLIENT_ID, CONF_CLIENT_SECRET
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
+from homeassistant.setup import async_setup_component
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.home_connect_alt.const import DOMAIN, ENTRIES
+from custom_components.home_connect_alt.runtime import discard_runtime
+from tools.fleet import build_fleet, scale_mix
+from tools.harness import ModelApi, create_model
+
+
+def _create_entry(hass:HomeAssistant) -> MockConfigEntry:
+    entry = MockConfigEntry(
+        domain=DOMAIN,
+        data={
+            "auth_implementation": DOMAIN,
+            "token": { "access_token": "access", "refresh_token": "refresh", "token_type": "Bearer", "expires_in": 3600, "expires_at": time.time() + 3600 }
+        }
+    )
+    entry.add_to_hass(hass)
+    return entry
+
+
+@pytest.fixture
+async def setup_entries(hass:HomeAssistant):
+    """ Set up two entries, each with its own half of a synthetic fleet, and return them with their models """
+    fleet = list(build_fleet(scale_mix(8), seed=1).items())
+    models = [ create_model(dict(fleet[0::2]), active_every=3), create_model(dict(fleet[1::2]), active_every=3) ]
+    entries = [ _create_entry(hass), _create_entry(hass) ]
+    remaining = list(models)
+
+    async def async_create(auth, *args, **kwargs) -> HomeConnect:
+        homeconnect = HomeConnect()
+        homeconnect._api = ModelApi(remaining.pop(0))
+        return homeconnect
+
+    with patch.object(HomeConnect, "async_create", async_create), patch.object(HomeConnect, "subscribe_for_updates"), \
+        patch("custom_components.home_connect_alt.async_integration_yaml_config", return_value=None):
+        yield (entries, models)
+        for entry in entries:
+            await hass.config_entries.async_unload(entry.entry_id)
+            discard_runtime(hass, entry.entry_id)
+        await hass.async_block_till_done()
+
+
+async def _async_setup(hass:HomeAssistant, entries:list[MockConfigEntry]) -> None:
+    assert await async_setup_component(hass, DOMAIN, { DOMAIN: { CONF_CLIENT_ID: "client", CONF_CLIENT_SECRET: "secret" } })
+    for entry in entries:
+        await hass.data[DOMAIN][ENTRIES][entry.entry_id].loader._load_task
+    await hass.async_block_till_done()
+
+
+def _runtime_of(hass:HomeAssistant, model:HomeConnect):
+    return next(runtime for runtime in hass.data[DOMAIN][ENTRIES].values() if set(runtime.homeconnect.appliances) == set(model.appliances))
+
+
+async def test_service_device_is_migrated_from_a_single_entry_install(hass:HomeAssistant, setup_entries) -> None:
+    """ The shared service device and the unique IDs of its entities are moved to the entry that owned them """
+    (entries, _) = setup_entries
+    entry = entries[0]
+    device_reg = dr.async_get(hass)
+    entity_reg = er.async_get(hass)
+    device = device_reg.async_get_or_create(config_entry_id=entry.entry_id, identifiers={(DOMAIN, "homeconnect")}, name="Home Connect Service")
+    entity = entity_reg.async_get_or_create("sensor", DOMAIN, "homeconnect_perf_events_per_second", config_entry=entry, device_id=device.id)
+
+    await _async_setup(hass, entries)
+
+    assert device_reg.async_get_device({(DOMAIN, "homeconnect")}) is None
+    assert device_reg.async_get(device.id).identifiers == {(DOMAIN, f"homeconnect_{entry.entry_id}")}
+    assert entity_reg.async_get(entity.entity_id).unique_id == f"{entry.entry_id}_homeconnect_perf_events_per_second"
+    assert hass.states.get(entity.entity_id) is not None
+
+
+async def test_service_calls_are_routed_to_the_entry_of_the_appliance(hass:HomeAssistant, setup_entries) -> None:
+    """ Every device is resolved to the appliance of its own entry and the calls only reach that account """
+    (entries, models) = setup_entries
+    await _async_setup(hass, entries)
+    services = hass.data[DOMAIN]["services"]
+    device_reg = dr.async_get(hass)
+
+    runtimes = [ _runtime_of(hass, model) for model in models ]
+    for runtime in runtimes:
+        for (haid, appliance) in runtime.homeconnect.appliances.items():
+            device = device_reg.async_get_device({(DOMAIN, haid.lower().replace('-', '_'))})
+            assert services.get_appliance_from_device_id(device.id) is appliance
+
+    (first, second) = runtimes
+    haid = next(iter(second.homeconnect.appliances))
+    device = device_reg.async_get_device({(DOMAIN, haid.lower().replace('-', '_'))})
+    requests = (first.homeconnect._api.request_count, second.homeconnect._api.request_count)
+    await hass.services.async_call(DOMAIN, "refresh", { "device_id": device.id, "section": "status" }, blocking=True)
+    assert first.homeconnect._api.request_count == requests[0]
+    assert second.homeconnect._api.request_count > requests[1]
+
+
+async def test_services_are_removed_with_the_last_entry(hass:HomeAssistant, setup_entries) -> None:
+    """ Unloading one entry keeps the services for the other entry """
+    (entries, models) = setup_entries
+    await _async_setup(hass, entries)
+    second = _runtime_of(hass, models[1])
+    device_reg = dr.async_get(hass)
+
+    first_entry = next(entry for entry in entries if entry.entry_id != second.entry_id)
+    assert await hass.config_entries.async_unload(first_entry.entry_id)
+    await hass.async_block_till_done()
+    assert hass.services.has_service(DOMAIN, "refresh")
+    haid = next(iter(second.homeconnect.appliances))
+    device = device_reg.async_get_device({(DOMAIN, haid.lower().replace('-', '_'))})
+    assert hass.data[DOMAIN]["services"].get_appliance_from_device_id(device.id) is second.homeconnect.appliances[haid]
+
+    assert await hass.config_entries.async_unload(second.entry_id)
+    await hass.async_block_till_done()
+    assert not hass.services.has_service(DOMAIN, "refresh")
+    assert "services" not in hass.data[DOMAIN]
@@ -0,0 +1,128 @@
+""" Performance counters and their diagnostic sensors """
+from __future__ import annotations
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.home_connect_alt.const import API_DAILY_LIMIT, DOMAIN, PERF_SENSORS
+from custom_components.home_connect_alt.perf import PerfCounters, SlowCallbackDetector
+
+
+def test_update_computes_the_rates_since_the_last_update() -> None:
+    """ The rates cover the interval since the previous update and the totals keep counting """
+    perf = PerfCounters()
+    with patch("custom_components.home_connect_alt.perf.time.monotonic", return_value=perf._last[0] + 10):
+        perf.events = 20
+        perf.callbacks = 50
+        perf.state_writes = 30
+        perf.update()
+    assert perf.stats["events_per_second"] == 2
+    assert perf.stats["callbacks_per_event"] == 2.5
+    assert perf.stats["state_writes_per_second"] == 3
+    assert perf.stats["events_total"] == 20 and perf.stats["callbacks_total"] == 50
+
+    with patch("custom_components.home_connect_alt.perf.time.monotonic", return_value=perf._last[0] + 10):
+        perf.events = 30
+        perf.update()
+    assert perf.stats["events_per_second"] == 1
+    assert perf.stats["callbacks_per_event"] == 0
+    assert perf.stats["events_total"] == 30 and perf.stats["callbacks_total"] == 50
+
+
+def test_update_counts_api_calls_and_reconnects() -> None:
+    """ The API calls are counted in a sliding window and the first stream connect isn't a reconnect """
+    perf = PerfCounters()
+    now = time.monotonic()
+    perf._api_calls.extend([ now - 86400 - 1, now - 3600, now - 30, now - 10 ])
+    perf.update()
+    assert perf.stats["api_calls_last_minute"] == 2
+    assert perf.stats["api_calls_last_day"] == 3
+    assert perf.stats["api_calls_remaining"] == API_DAILY_LIMIT - 3
+    assert perf.stats["stream_reconnects"] == 0
+
+    perf.stream_connects = 3
+    perf.update()
+    assert perf.stats["stream_reconnects"] == 2
+
+
+def test_update_computes_the_latency_of_the_interval() -> None:
+    """ The latencies from an event to the state write are reported once and then cleared """
+    perf = PerfCounters()
+    perf.event_time = time.monotonic()
+    with patch("custom_components.home_connect_alt.perf.time.monotonic", side_effect=[ perf.event_time + i / 1000 for i in range(1, 21) ]):
+        for _ in range(20):
+            perf.state_written()
+    perf.event_time = None
+    perf.state_written()
+
+    listener_calls = []
+    perf.add_listener(lambda: listener_calls.append(perf.stats))
+    perf.update()
+    assert perf.stats["latency_average"] == 10.5
+    assert perf.stats["latency_p95"] == 20
+    assert listener_calls == [perf.stats]
+
+    perf.update()
+    assert perf.stats["latency_average"] is None and perf.stats["latency_p95"] is None
+
+
+async def test_counters_are_total_increasing(hass:HomeAssistant, setup_integration) -> None:
+    """ The counters are recorded as totals and the rates, gauges and latencies as measurements """
+    registry = er.async_get(hass)
+    for (key, conf) in PERF_SENSORS.items():
+        entity_id = registry.async_get_entity_id("sensor", DOMAIN, f"{setup_integration.entry_id}_homeconnect_perf_{key}")
+        state = hass.states.get(entity_id)
+        expected = "total_increasing" if key in ("events_total", "callbacks_total", "stream_reconnects") else "measurement"
+        assert conf["state_class"] == expected, key
+        assert state.attributes["state_class"] == expected, key
+
+
+async def _call(callback, *args) -> None:
+    await callback(*args)
+
+
+async def test_slow_callback_detector_ignores_awaited_time(caplog) -> None:
+    """ A callback that awaits isn't slow, a callback that blocks the event loop is """
+    detector = SlowCallbackDetector(20)
+
+    async def sleeping(appliance, event_key, value) -> None:
+        await asyncio.sleep(0.05)
+
+    async def blocking(appliance, event_key, value) -> None:
+        await asyncio.sleep(0)
+        end = time.perf_counter() + 0.03
+        while time.perf_counter() < end:
+            pass
+
+    await detector.async_call(_call, sleeping, None, "BSH.Common.Status.OperationState", None)
+    await detector.async_call(_call, blocking, None, "BSH.Common.Status.OperationState", None)
+
+    callbacks = detector.as_dict()["callbacks"]
+    assert callbacks["test_perf.sleeping BSH.Common.Status.OperationState"]["max_ms"] < 20
+    assert callbacks["test_perf.blocking BSH.Common.Status.OperationState"]["max_ms"] >= 30
+    warnings = [ record.getMessage() for record in caplog.records if record.levelname == "WARNING" ]
+    assert len(warnings) == 1 and "test_perf.blocking" in warnings[0]
+
+
+async def test_slow_callback_detector_forwards_errors() -> None:
+    """ The result and the errors of the callback reach the caller and the call is still recorded """
+    detector = SlowCallbackDetector(20)
+
+    async def failing(appliance, event_key, value) -> None:
+        await asyncio.sleep(0)
+        raise ValueError(value)
+
+    with pytest.raises(ValueError, match="bad"):
+        await detector.async_call(_call, failing, None, "Key", "bad")
+    assert detector.as_dict()["callbacks"]["test_perf.failing Key"]["count"] == 1
+
+    task = asyncio.create_task(detector.async_call(_call, lambda *args: asyncio.sleep(10), None, "Key", None))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
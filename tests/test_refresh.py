@@ -0,0 +1,91 @@
+""" Merging refreshed appliance data into the model """
+from __future__ import annotations
+from types import SimpleNamespace
+
+import pytest
+from home_connect_async.appliance import Option, Program
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+
+from custom_components.home_connect_alt.const import DOMAIN
+from custom_components.home_connect_alt.refresh import merge_items, merge_programs
+
+
+def _option(key:str, value:any, unit:str=None) -> Option:
+    return Option(key=key, type="Int", name=key, unit=unit, value=value)
+
+
+def test_merge_items_updates_changed_items_in_place() -> None:
+    """ Changed items keep their identity and are reported, unchanged items are not """
+    temperature = _option("Temperature", 40, "°C")
+    spin = _option("SpinSpeed", 800)
+    current = { "Temperature": temperature, "SpinSpeed": spin }
+
+    changed, structure_changed = merge_items(current, {
+        "Temperature": _option("Temperature", 60, "°C"),
+        "SpinSpeed": _option("SpinSpeed", 800)
+    })
+
+    assert changed == [("Temperature", 60)]
+    assert not structure_changed
+    assert current["Temperature"] is temperature and temperature.value == 60
+    assert current["SpinSpeed"] is spin
+
+
+def test_merge_items_reports_added_and_removed_keys() -> None:
+    """ New keys are added, missing keys are removed and both change the structure """
+    current = { "Temperature": _option("Temperature", 40) }
+    changed, structure_changed = merge_items(current, { "SpinSpeed": _option("SpinSpeed", 800) })
+    assert changed == []
+    assert structure_changed
+    assert list(current) == ["SpinSpeed"]
+
+    _, structure_changed = merge_items(current, { "SpinSpeed": _option("SpinSpeed", 800) })
+    assert not structure_changed
+
+
+def test_merge_programs_replaces_the_programs_when_the_keys_change() -> None:
+    """ A different set of programs replaces the available programs """
+    appliance = SimpleNamespace(available_programs={ "Cotton": Program(key="Cotton") })
+    fetched = { "Cotton": Program(key="Cotton"), "Eco": Program(key="Eco") }
+    assert merge_programs(appliance, fetched)
+    assert appliance.available_programs is fetched
+
+
+def test_merge_programs_keeps_options_that_were_not_fetched() -> None:
+    """ The SDK only fetches the options of the current program so the other options are kept """
+    eco_options = { "Temperature": _option("Temperature", 40) }
+    cotton = Program(key="Cotton")
+    current = { "Cotton": cotton, "Eco": Program(key="Eco", options=eco_options) }
+    appliance = SimpleNamespace(available_programs=current)
+
+    structure_changed = merge_programs(appliance, {
+        "Cotton": Program(key="Cotton", options={ "SpinSpeed": _option("SpinSpeed", 800) }),
+        "Eco": Program(key="Eco")
+    })
+
+    assert structure_changed
+    assert appliance.available_programs["Cotton"] is cotton
+    assert list(cotton.options) == ["SpinSpeed"]
+    assert appliance.available_programs["Eco"].options is eco_options
+
+
+def test_merge_programs_replaces_the_dict_only_when_something_changed() -> None:
+    """ The programs are updated in place inside a new dict so the caches keyed by its identity are refreshed """
+    temperature = _option("Temperature", 40)
+    current = { "Eco": Program(key="Eco", options={ "Temperature": temperature }) }
+    appliance = SimpleNamespace(available_programs=current)
+
+    assert not merge_programs(appliance, { "Eco": Program(key="Eco", options={ "Temperature": _option("Temperature", 40) }) })
+    assert appliance.available_programs is current
+
+    assert not merge_programs(appliance, { "Eco": Program(key="Eco", options={ "Temperature": _option("Temperature", 60) }) })
+    assert appliance.available_programs is not current
+    assert appliance.available_programs["Eco"].options["Temperature"] is temperature
+    assert temperature.value == 60
+
+
+async def test_refresh_service_rejects_unknown_devices(hass:HomeAssistant, setup_integration) -> None:
+    """ Refreshing a device that isn't a Home Connect appliance raises an error """
+    with pytest.raises(HomeAssistantError, match="isn't a Home Connect appliance"):
+        await hass.services.async_call(DOMAIN, "refresh", { "device_id": "not-a-device" }, blocking=True)
@@ -0,0 +1,81 @@
+""" Reusing the runtime of an entry across reloads """
+from __future__ import annotations
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.home_connect_alt.const import CONF_LANG, DOMAIN, ENTRIES, PARKED_RUNTIMES, RELOAD_GRACE_PERIOD
+
+
+async def test_reload_reuses_the_runtime(hass:HomeAssistant, setup_integration) -> None:
+    """ A reload within the grace period reuses the data model without fetching it again """
+    runtime = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id]
+    request_count = runtime.homeconnect._api.request_count
+
+    assert await hass.config_entries.async_reload(setup_integration.entry_id)
+    await hass.async_block_till_done()
+
+    assert setup_integration.state is ConfigEntryState.LOADED
+    assert hass.data[DOMAIN][ENTRIES][setup_integration.entry_id] is runtime
+    assert runtime.homeconnect._api.request_count == request_count
+    assert setup_integration.entry_id not in hass.data[DOMAIN][PARKED_RUNTIMES]
+
+
+async def test_parked_runtime_is_closed_after_the_grace_period(hass:HomeAssistant, setup_integration) -> None:
+    """ The runtime of an entry that isn't set up again is closed with its loader and event stream """
+    runtime = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id]
+    runtime.loader.set_callbacks(on_complete=lambda homeconnect: None)
+    assert await hass.config_entries.async_unload(setup_integration.entry_id)
+    await hass.async_block_till_done()
+    assert hass.data[DOMAIN][PARKED_RUNTIMES][setup_integration.entry_id] is runtime
+
+    with patch.object(runtime.homeconnect, "close", wraps=runtime.homeconnect.close) as close:
+        async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=RELOAD_GRACE_PERIOD + 1))
+        await hass.async_block_till_done()
+
+    assert setup_integration.entry_id not in hass.data[DOMAIN][PARKED_RUNTIMES]
+    assert runtime._cancel_expiry is None
+    assert runtime.loader._on_complete is None
+    close.assert_called_once()
+
+
+async def test_changed_settings_load_the_data_again(hass:HomeAssistant, setup_integration) -> None:
+    """ A reload after a setting that affects the data was changed closes the runtime and creates a new one """
+    runtime = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id]
+    hass.data[DOMAIN][CONF_LANG] = "de"
+
+    assert await hass.config_entries.async_reload(setup_integration.entry_id)
+    reloaded = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id]
+    await reloaded.loader._load_task
+    await hass.async_block_till_done()
+
+    assert reloaded is not runtime
+    assert reloaded.homeconnect is not runtime.homeconnect
+    assert reloaded.settings[CONF_LANG] == "de"
+    assert runtime.loader._on_complete is None
+    assert set(reloaded.homeconnect.appliances) == set(runtime.homeconnect.appliances)
+
+
+async def test_claiming_a_loading_runtime_retargets_the_callbacks(hass:HomeAssistant, setup_integration) -> None:
+    """ The callbacks of a runtime that is still loading are replaced by the callbacks of the new setup """
+    runtime = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id]
+    # Pretend the data is still being loaded
+    loading = asyncio.Event()
+    runtime.loader._load_task = asyncio.create_task(loading.wait())
+    runtime.loader.set_callbacks(on_complete=lambda homeconnect: None, on_error=lambda homeconnect, ex: None)
+    previous = (runtime.loader._on_complete, runtime.loader._on_error)
+
+    assert await hass.config_entries.async_reload(setup_integration.entry_id)
+    await hass.async_block_till_done()
+
+    assert hass.data[DOMAIN][ENTRIES][setup_integration.entry_id] is runtime
+    assert runtime.loader._on_complete not in previous and runtime.loader._on_complete.__name__ == "on_data_loaded"
+    assert runtime.loader._on_error not in previous and runtime.loader._on_error.__name__ == "on_data_load_error"
+
+    loading.set()
+    await runtime.loader._load_task
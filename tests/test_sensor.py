@@ -0,0 +1,73 @@
+""" Sensor entities """
+from __future__ import annotations
+import dataclasses
+from unittest.mock import Mock
+
+from home_connect_async import Events, HomeConnect
+from homeassistant.core import HomeAssistant
+
+from custom_components.home_connect_alt.common import appliance_snapshot
+from custom_components.home_connect_alt.const import COMPACT_SNAPSHOT_KEY, COMPACT_SNAPSHOT_UNRECORDED
+from custom_components.home_connect_alt.recorder import exclude_attributes
+from custom_components.home_connect_alt.refresh import merge_items
+from custom_components.home_connect_alt.sensor import ApplianceSnapshotSensor, ProgramOptionSensor
+
+
+def test_snapshot_sensor_without_status(template_model:HomeConnect) -> None:
+    """ The snapshot sensor of an appliance whose status wasn't loaded has no state and empty attributes """
+    appliance = next(iter(template_model.appliances.values()))
+    sensor = ApplianceSnapshotSensor(appliance, COMPACT_SNAPSHOT_KEY)
+    assert sensor.native_value is not None
+
+    appliance.status = None
+    assert sensor.native_value is None
+    assert sensor.extra_state_attributes["status"] == {}
+
+
+async def test_option_sensor_renders_options_merged_in_place(template_model:HomeConnect) -> None:
+    """ The renderer and the unit follow an option whose unit changed when a refresh merged it in place """
+    appliance = next(appliance for appliance in template_model.appliances.values() if appliance.selected_program and not appliance.active_program)
+    (key, option) = next((key, option) for (key, option) in appliance.selected_program.options.items() if isinstance(option.value, int))
+    option.unit = None
+    option.value = 2500
+    sensor = ProgramOptionSensor(appliance, key)
+    sensor.async_write_ha_state = Mock()
+    assert sensor.native_value == 2500
+    assert sensor.native_unit_of_measurement is None
+
+    (_, structure_changed) = merge_items(appliance.selected_program.options, { key: dataclasses.replace(option, unit="gram") })
+    assert structure_changed
+    assert appliance.selected_program.options[key] is option
+    # The renderer is only chosen again by the events that change the programs, not on every state write
+    assert sensor.native_value == 2500
+
+    await sensor.async_on_update(appliance, Events.DATA_CHANGED, None)
+    sensor.async_write_ha_state.assert_called_once()
+    assert sensor.native_value == 2.5
+    assert sensor.native_unit_of_measurement == "kg"
+
+
+async def test_option_sensor_chooses_the_renderer_on_program_events(template_model:HomeConnect) -> None:
+    """ A program event chooses the renderer of the new program without writing the state, DATA_CHANGED writes it """
+    appliance = next(appliance for appliance in template_model.appliances.values() if appliance.selected_program and not appliance.active_program)
+    (key, option) = next((key, option) for (key, option) in appliance.selected_program.options.items() if isinstance(option.value, int))
+    sensor = ProgramOptionSensor(appliance, key)
+    sensor.async_write_ha_state = Mock()
+    gram_option = dataclasses.replace(option, unit="gram", value=1500)
+    appliance.active_program = dataclasses.replace(appliance.selected_program, options={ **appliance.selected_program.options, key: gram_option })
+
+    await sensor.async_on_update(appliance, Events.PROGRAM_STARTED, None)
+    sensor.async_write_ha_state.assert_not_called()
+    assert sensor.native_value == 1.5
+    assert sensor.native_unit_of_measurement == "kg"
+
+    await sensor.async_on_update(appliance, key, 1500)
+    sensor.async_write_ha_state.assert_called_once()
+
+
+
+def test_snapshot_attributes_are_not_recorded(hass:HomeAssistant, template_model:HomeConnect) -> None:
+    """ The recorder platform leaves the snapshot attributes out on the cores without _unrecorded_attributes """
+    appliance = next(iter(template_model.appliances.values()))
+    assert set(appliance_snapshot(appliance)) == exclude_attributes(hass)
+    assert ApplianceSnapshotSensor._unrecorded_attributes == COMPACT_SNAPSHOT_UNRECORDED
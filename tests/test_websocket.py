@@ -0,0 +1,123 @@
+""" WebSocket subscription to the data of an appliance """
+from __future__ import annotations
+
+from home_connect_async import Events
+from homeassistant.core import HomeAssistant
+
+from custom_components.home_connect_alt.const import DOMAIN, ENTRIES
+from custom_components.home_connect_alt.websocket import ApplianceSubscription
+
+OPERATION_STATE = "BSH.Common.Status.OperationState"
+DOOR_STATE = "BSH.Common.Status.DoorState"
+
+
+def _subscription_count(homeconnect, haid:str) -> int:
+    """ The number of callbacks of the appliance that belong to a subscription """
+    records = homeconnect._callbacks._callbacks.get(haid, {}).get(homeconnect._callbacks.WILDCARD_KEY, [])
+    return sum(1 for record in records if isinstance(getattr(record["callback"], "__self__", None), ApplianceSubscription))
+
+
+async def _subscribe(hass:HomeAssistant, client, device_id:str, **kwargs) -> dict:
+    await client.send_json({ "id": 1, "type": f"{DOMAIN}/subscribe_appliance", "device_id": device_id, **kwargs })
+    result = await client.receive_json()
+    assert result["success"], result
+    return (await client.receive_json())["event"]
+
+
+async def test_changes_are_coalesced_per_tick(hass:HomeAssistant, setup_integration, device_ids, hass_ws_client) -> None:
+    """ The snapshot is sent first and the changes of a tick are sent together with the last value of every key """
+    homeconnect = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect
+    (haid, device_id) = next(iter(device_ids.items()))
+    appliance = homeconnect.appliances[haid]
+    client = await hass_ws_client(hass)
+
+    snapshot = (await _subscribe(hass, client, device_id))["snapshot"]
+    assert snapshot["connected"] == appliance.connected
+    assert set(snapshot["status"]) == set(appliance.status)
+
+    for value in ["BSH.Common.EnumType.OperationState.Run", "BSH.Common.EnumType.OperationState.Pause"]:
+        await homeconnect._callbacks.async_broadcast_event(appliance, OPERATION_STATE, value)
+    await homeconnect._callbacks.async_broadcast_event(appliance, DOOR_STATE, "BSH.Common.EnumType.DoorState.Open")
+
+    event = (await client.receive_json())["event"]
+    assert event == { "changes": { OPERATION_STATE: "BSH.Common.EnumType.OperationState.Pause", DOOR_STATE: "BSH.Common.EnumType.DoorState.Open" } }
+
+
+async def test_key_patterns_filter_the_changes(hass:HomeAssistant, setup_integration, device_ids, hass_ws_client) -> None:
+    """ Only the keys that match the patterns are in the snapshot and the changes """
+    homeconnect = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect
+    (haid, device_id) = next(iter(device_ids.items()))
+    appliance = homeconnect.appliances[haid]
+    client = await hass_ws_client(hass)
+
+    snapshot = (await _subscribe(hass, client, device_id, keys=["*.OperationState"]))["snapshot"]
+    assert set(snapshot["status"]) <= { OPERATION_STATE }
+    assert snapshot["settings"] == {}
+
+    await homeconnect._callbacks.async_broadcast_event(appliance, DOOR_STATE, "BSH.Common.EnumType.DoorState.Open")
+    await homeconnect._callbacks.async_broadcast_event(appliance, OPERATION_STATE, "BSH.Common.EnumType.OperationState.Run")
+
+    event = (await client.receive_json())["event"]
+    assert event == { "changes": { OPERATION_STATE: "BSH.Common.EnumType.OperationState.Run" } }
+
+
+async def test_data_changes_send_a_new_snapshot(hass:HomeAssistant, setup_integration, device_ids, hass_ws_client) -> None:
+    """ An event that changes more than a single key is followed by a snapshot instead of the changes """
+    homeconnect = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect
+    (haid, device_id) = next(iter(device_ids.items()))
+    appliance = homeconnect.appliances[haid]
+    client = await hass_ws_client(hass)
+    await _subscribe(hass, client, device_id)
+
+    await homeconnect._callbacks.async_broadcast_event(appliance, OPERATION_STATE, "BSH.Common.EnumType.OperationState.Run")
+    await homeconnect._callbacks.async_broadcast_event(appliance, Events.DATA_CHANGED)
+
+    event = (await client.receive_json())["event"]
+    assert list(event) == ["snapshot"]
+    assert event["snapshot"]["connected"] == appliance.connected
+
+
+async def test_unsubscribe_releases_the_callback(hass:HomeAssistant, setup_integration, device_ids, hass_ws_client) -> None:
+    """ The callback of the subscription is removed from the appliance when the client unsubscribes """
+    homeconnect = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect
+    (haid, device_id) = next(iter(device_ids.items()))
+    client = await hass_ws_client(hass)
+    await _subscribe(hass, client, device_id)
+    assert _subscription_count(homeconnect, haid) == 1
+
+    await client.send_json({ "id": 2, "type": "unsubscribe_events", "subscription": 1 })
+    assert (await client.receive_json())["success"]
+    await hass.async_block_till_done()
+    assert _subscription_count(homeconnect, haid) == 0
+
+
+async def test_depaired_appliance_ends_the_subscription(hass:HomeAssistant, setup_integration, device_ids, hass_ws_client) -> None:
+    """ A depaired appliance is reported and then the subscription ends with an error """
+    homeconnect = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id].homeconnect
+    (haid, device_id) = next(iter(device_ids.items()))
+    client = await hass_ws_client(hass)
+    await _subscribe(hass, client, device_id)
+
+    await homeconnect._callbacks.async_broadcast_event(homeconnect.appliances[haid], Events.DEPAIRED)
+
+    assert (await client.receive_json())["event"] == { "depaired": True }
+    error = await client.receive_json()
+    assert error["id"] == 1 and not error["success"] and error["error"]["code"] == "not_found"
+    await hass.async_block_till_done()
+    assert _subscription_count(homeconnect, haid) == 0
+
+
+async def test_unloading_the_entry_ends_the_subscription(hass:HomeAssistant, setup_integration, device_ids, hass_ws_client) -> None:
+    """ The subscriptions to the appliances of an entry end when the entry is unloaded """
+    runtime = hass.data[DOMAIN][ENTRIES][setup_integration.entry_id]
+    (haid, device_id) = next(iter(device_ids.items()))
+    client = await hass_ws_client(hass)
+    await _subscribe(hass, client, device_id)
+
+    assert await hass.config_entries.async_unload(setup_integration.entry_id)
+    await hass.async_block_till_done()
+
+    error = await client.receive_json()
+    assert error["id"] == 1 and not error["success"] and error["error"]["code"] == "not_found"
+    assert runtime._unload_listeners == []
+    assert _subscription_count(runtime.homeconnect, haid) == 0
@@ -0,0 +1 @@
+""" Development, testing and benchmarking tools for the Home Connect Alt integration """
@@ -0,0 +1,234 @@
+""" Micro-benchmarks for the entity hot paths
+
+Home Assistant reads the state properties of an entity on every state write, so the cost of these properties is
+paid for every entity that is updated by an event. The benchmarks build a synthetic fleet with realistic program,
+option and status sizes, set up all the platforms with the offline harness and time:
+
+* The full state render path of every entity class
+* Selected hot properties such as ProgramOptionSensor.native_value and StartButton.available
+* EntityManager.add() + EntityManager.register() of all the entities of the fleet
+
+The results are compared against a stored baseline and the command fails when a benchmark is slower than the
+baseline by more than the tolerance and by more than the noise floor. The timings are normalized by a fixed pure
+Python calibration workload so a baseline that was recorded on a different machine is still meaningful. The suite
+runs in several rounds and the median of the rounds is used, for the benchmarks and for the calibration.
+
+Usage:
+    python -m tools.benchmark
+    python -m tools.benchmark --save-baseline
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable
+
+from custom_components.home_connect_alt.common import EntityBase, EntityManager
+
+from .fleet import build_fleet, scale_mix
+from .harness import PlatformHarness, create_model, render_state
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+DEFAULT_TOLERANCE = 0.3
+DEFAULT_ROUNDS = 9
+# Slowdowns smaller than this, in normalized nanoseconds per entity, are within the noise of the benchmarks that
+# only have a handful of entities
+DEFAULT_NOISE_FLOOR = 200
+
+# Individual properties that are benchmarked on top of the full render path: (entity class, property)
+HOT_PROPERTIES = [
+    ("ProgramOptionSensor", "native_value"),
+    ("ProgramOptionSensor", "available"),
+    ("StartButton", "available"),
+    ("OptionSelect", "options"),
+    ("OptionSelect", "current_option"),
+    ("OptionNumber", "available"),
+    ("ProgramOptionBinarySensor", "is_on")
+]
+
+
+def time_per_item(func:Callable[[], None], items:int, repeat:int=5, min_time:float=0.01) -> float:
+    """ The best time, in nanoseconds, of a single item out of several repeats of func() which handles all the items """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_time:
+            break
+        number *= 2
+
+    # Like timeit, the garbage collector is disabled while timing
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            best = min(best, (time.perf_counter() - start) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best * 1e9 / max(items, 1)
+
+
+def calibrate(repeat:int=5) -> float:
+    """ Time a fixed workload of attribute access, dict lookups and string formatting """
+    class Item():
+        def __init__(self, key) -> None:
+            self.key = key
+    items = { f"BSH.Common.Option.Key{i}": Item(f"BSH.Common.Option.Key{i}") for i in range(100) }
+    keys = list(items)
+
+    def workload():
+        for key in keys:
+            if key in items:
+                f"{items[key].key.lower()}_{len(key)}"
+    return time_per_item(workload, len(keys), repeat)
+
+
+async def async_create_harness(appliances:int, active_every:int) -> PlatformHarness:
+    """ Set up all the platforms against a synthetic fleet """
+    homeconnect = create_model(build_fleet(scale_mix(appliances), seed=1), active_every)
+    harness = PlatformHarness(homeconnect, add_to_hass=False)
+    await harness.async_setup()
+    return harness
+
+
+def run_benchmarks(harness:PlatformHarness, repeat:int) -> dict[str, float]:
+    """ Run all the benchmarks and return the time per entity, in nanoseconds, keyed by the benchmark name """
+    by_class:dict[str, list] = {}
+    for entity in harness.entities.values():
+        by_class.setdefault(type(entity).__name__, []).append(entity)
+
+    results = {}
+    for (class_name, entities) in sorted(by_class.items()):
+        results[f"render.{class_name}"] = time_per_item(lambda entities=entities: [ render_state(e) for e in entities ], len(entities), repeat)
+
+    for (class_name, attr) in HOT_PROPERTIES:
+        entities = by_class.get(class_name)
+        if entities:
+            results[f"{class_name}.{attr}"] = time_per_item(
+                lambda entities=entities, attr=attr: [ getattr(e, attr) for e in entities ], len(entities), repeat
+            )
+
+    entities = [ e for e in harness.entities.values() if isinstance(e, EntityBase) ]
+    results["EntityBase.name"] = time_per_item(lambda: [ e.name for e in entities ], len(entities), repeat)
+    results["EntityBase.device_info"] = time_per_item(lambda: [ e.device_info for e in entities ], len(entities), repeat)
+
+    def register():
+        manager = EntityManager(lambda new_entities: None)
+        for entity in entities:
+            manager.add(entity)
+        manager.register()
+    results["EntityManager.register"] = time_per_item(register, len(entities), repeat)
+
+    return results
+
+
+def run_rounds(harness:PlatformHarness, rounds:int, repeat:int) -> tuple[dict[str, float], float]:
+    """ Run the whole suite several times, returns the median of every benchmark and the median calibration """
+    calibrations = []
+    samples:dict[str, list[float]] = {}
+    for _ in range(rounds):
+        calibrations.append(calibrate(repeat))
+        for (name, value) in run_benchmarks(harness, repeat).items():
+            samples.setdefault(name, []).append(value)
+    return ({ name: statistics.median(values) for (name, values) in samples.items() }, statistics.median(calibrations))
+
+
+def compare(
+    results:dict[str, float], calibration:float, baseline:dict, tolerance:float, noise_floor:float=DEFAULT_NOISE_FLOOR
+) -> list[tuple[str, float, float|None, str]]:
+    """ Compare normalized results with the baseline, returns (name, ns, change ratio, verdict) tuples
+
+    A benchmark regressed when it is slower than the baseline by more than the tolerance and the slowdown, scaled
+    to the calibration of the baseline, is larger than the noise floor
+    """
+    comparison = []
+    base_results = baseline.get("results", {})
+    base_calibration = baseline.get("calibration_ns")
+    for (name, value) in results.items():
+        if name not in base_results or not base_calibration:
+            comparison.append((name, value, None, "new"))
+            continue
+        normalized = value * base_calibration / calibration
+        ratio = normalized / base_results[name]
+        verdict = "REGRESSION" if ratio > 1 + tolerance and normalized - base_results[name] > noise_floor else "ok"
+        comparison.append((name, value, ratio, verdict))
+    return comparison
+
+
+def main() -> None:
+    """ Run the benchmarks from the command line """
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the entity state render paths")
+    parser.add_argument("--appliances", type=int, default=60, help="Number of appliances in the synthetic fleet (default 60)")
+    parser.add_argument("--active-every", type=int, default=2, help="Every Nth appliance has an active program (default 2)")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repeats of each benchmark in a round (default 5)")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help=f"Number of rounds of the whole suite, the median is used (default {DEFAULT_ROUNDS})")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="The baseline file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help=f"Allowed slowdown ratio (default {DEFAULT_TOLERANCE})")
+    parser.add_argument(
+        "--noise-floor", type=float, default=DEFAULT_NOISE_FLOOR,
+        help=f"Slowdowns below this many normalized ns per entity are never regressions (default {DEFAULT_NOISE_FLOOR})"
+    )
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    harness = asyncio.run(async_create_harness(args.appliances, args.active_every))
+    # The calibration is measured in every round too, so a burst of background load only shifts a single
+    # round of both and the median of the rounds ignores it
+    (results, calibration) = run_rounds(harness, args.rounds, args.repeat)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump({
+                "python": platform.python_version(),
+                "appliances": args.appliances,
+                "active_every": args.active_every,
+                "rounds": args.rounds,
+                "calibration_ns": round(calibration, 2),
+                "results": { name: round(value, 2) for (name, value) in results.items() }
+            }, file, indent=2)
+            file.write("\n")
+        print(f"Saved the baseline to {args.baseline}")
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+    comparison = compare(results, calibration, baseline, args.tolerance, args.noise_floor)
+
+    if args.json:
+        json.dump({
+            "calibration_ns": calibration,
+            "results": { name: { "ns": value, "ratio": ratio, "verdict": verdict } for (name, value, ratio, verdict) in comparison }
+        }, sys.stdout, indent=2)
+        print()
+    else:
+        print(f"{'benchmark':45} {'ns/entity':>12} {'vs baseline':>12}")
+        for (name, value, ratio, verdict) in comparison:
+            change = f"{(ratio - 1) * 100:+.1f}%" if ratio is not None else "-"
+            print(f"{name:45} {value:12.1f} {change:>12}  {verdict}")
+
+    regressions = [ name for (name, _, _, verdict) in comparison if verdict == "REGRESSION" ]
+    if regressions:
+        print(
+            f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance * 100:.0f}% "
+            f"and {args.noise_floor:.0f} ns: {', '.join(regressions)}", file=sys.stderr
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
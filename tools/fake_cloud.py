@@ -0,0 +1,578 @@
+""" A local stand-in for the Home Connect cloud service
+
+Implements the OAuth endpoints, the /api/homeappliances REST resources, program, option, setting and command
+writes and the SSE event stream so the integration can be run, tested and benchmarked offline.
+
+Usage:
+    python -m tools.fake_cloud --appliances "Washer:2,Oven:1,FridgeFreezer:1" --port 8888 --latency 50
+
+Then point the integration to it in configuration.yaml:
+    home_connect_alt:
+      client_id: fake
+      client_secret: fake
+      host: http://127.0.0.1:8888
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections import deque
+from itertools import count
+
+from aiohttp import web
+
+from .fleet import build_fleet, option_default, parse_mix
+
+_LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/vnd.bsh.sdk.v1+json"
+EVENTS_PATH = "/api/homeappliances/events"
+OPERATION_STATE = "BSH.Common.Status.OperationState"
+OPERATION_STATE_ENUM = "BSH.Common.EnumType.OperationState"
+
+
+class FakeAppliance():
+    """ The mutable state of a single simulated appliance """
+
+    def __init__(self, description:dict) -> None:
+        self.properties:dict = dict(description["properties"])
+        self.status:dict = dict(description["status"])
+        self.settings:dict = description["settings"]
+        self.setting_values:dict = { key: option_default(setting) for (key, setting) in self.settings.items() }
+        self.commands:list = description["commands"]
+        self.programs:dict = description["programs"]
+        self.duration:int = description["duration"]
+        self.selected:dict|None = None
+        self.active:dict|None = None
+        self.run_task:asyncio.Task = None
+
+        initial_program = description.get("initial_program") or next(iter(self.programs), None)
+        if initial_program:
+            self.selected = self.default_program(initial_program)
+
+    haid = property(lambda self: self.properties["haId"])
+    connected = property(lambda self: self.properties["connected"])
+
+    def default_program(self, key:str) -> dict:
+        """ Build a program with the default values of all its options """
+        return { "key": key, "options": { option["key"]: option_default(option) for option in self.programs[key] } }
+
+    def option_definition(self, program_key:str, option_key:str) -> dict|None:
+        """ Get the definition of an option of an available program """
+        for option in self.programs.get(program_key, []):
+            if option["key"] == option_key:
+                return option
+        return None
+
+    def program_json(self, program:dict) -> dict:
+        """ Format a selected or active program the way the API returns it """
+        options = []
+        for (key, value) in program["options"].items():
+            option = { "key": key, "value": value }
+            definition = self.option_definition(program["key"], key)
+            if definition and "unit" in definition:
+                option["unit"] = definition["unit"]
+            options.append(option)
+        return { "key": program["key"], "options": options }
+
+    def uri(self, path:str) -> str:
+        """ The URI of a resource of this appliance """
+        return f"/api/homeappliances/{self.haid}/{path}"
+
+
+class FakeCloud():
+    """ The fake Home Connect service
+
+    Parameters:
+    * fleet - The appliances to simulate, as generated by tools.fleet.build_fleet()
+    * latency, jitter - Delay added to every API request, in milliseconds
+    * error_rate - The probability of an API request failing with an HTTP 500 error
+    * rate_limit - The number of API requests allowed per minute before responding with HTTP 429
+    * speed - Simulation speed multiplier for running programs
+    * keepalive - Seconds between KEEP-ALIVE events on the event stream
+    """
+    def __init__(self,
+        fleet:dict[str, dict],
+        latency:float = 0,
+        jitter:float = 0,
+        error_rate:float = 0,
+        rate_limit:int = 0,
+        speed:float = 1,
+        keepalive:float = 55
+    ) -> None:
+        self.appliances:dict[str, FakeAppliance] = { haid: FakeAppliance(description) for (haid, description) in fleet.items() }
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.speed = speed
+        self.keepalive = keepalive
+
+        self.request_count = 0
+        self.request_log:deque[float] = deque()
+        self._subscribers:set[asyncio.Queue] = set()
+        self._tokens = count(1)
+
+    #region - Application setup
+
+    def create_app(self) -> web.Application:
+        """ Create the aiohttp application serving the fake service """
+        app = web.Application(middlewares=[self._middleware])
+        base = "/api/homeappliances/{haid}"
+        app.add_routes([
+            web.get("/security/oauth/authorize", self.handle_authorize),
+            web.post("/security/oauth/token", self.handle_token),
+            web.get(EVENTS_PATH, self.handle_events),
+            web.get("/api/homeappliances", self.handle_appliances),
+            web.get(base, self.handle_appliance),
+            web.get(f"{base}/status", self.handle_status),
+            web.get(f"{base}/settings", self.handle_settings),
+            web.get(f"{base}/settings/{{key}}", self.handle_setting),
+            web.put(f"{base}/settings/{{key}}", self.handle_put_setting),
+            web.get(f"{base}/commands", self.handle_commands),
+            web.put(f"{base}/commands/{{key}}", self.handle_put_command),
+            web.get(f"{base}/programs/available", self.handle_available_programs),
+            web.get(f"{base}/programs/available/{{key}}", self.handle_available_program),
+            web.get(f"{base}/programs/selected", self.handle_selected_program),
+            web.put(f"{base}/programs/selected", self.handle_put_selected_program),
+            web.put(f"{base}/programs/selected/options/{{key}}", self.handle_put_option),
+            web.get(f"{base}/programs/active", self.handle_active_program),
+            web.put(f"{base}/programs/active", self.handle_put_active_program),
+            web.delete(f"{base}/programs/active", self.handle_delete_active_program),
+            # Control endpoints which are not part of the real API
+            web.post("/fake/config", self.handle_fake_config),
+            web.post("/fake/appliances/{haid}/{action}", self.handle_fake_appliance_action),
+            web.post("/fake/events", self.handle_fake_event),
+        ])
+        return app
+
+    @web.middleware
+    async def _middleware(self, request:web.Request, handler):
+        """ Apply authentication, rate limiting, latency and error injection to the API requests """
+        if not request.path.startswith("/api/"):
+            return await handler(request)
+
+        self.request_count += 1
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return self.error_response(401, "invalid_token", "The access token is missing")
+
+        if self.rate_limit:
+            now = time.monotonic()
+            while self.request_log and self.request_log[0] < now - 60:
+                self.request_log.popleft()
+            if len(self.request_log) >= self.rate_limit:
+                retry_after = math.ceil(self.request_log[0] + 60 - now)
+                response = self.error_response(429, "429", "The rate limit \"10 successive error calls in 10 minutes\" was reached.")
+                response.headers["Retry-After"] = str(max(retry_after, 1))
+                return response
+            self.request_log.append(now)
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0) / 1000)
+
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_response(500, "SDK.Error.InternalServerError", "Injected error")
+
+        return await handler(request)
+
+    #endregion
+
+    #region - Helpers
+
+    @staticmethod
+    def data_response(data:dict) -> web.Response:
+        """ Return a successful API response """
+        return web.Response(text=json.dumps({ "data": data }), content_type=CONTENT_TYPE)
+
+    @staticmethod
+    def error_response(status:int, key:str, description:str) -> web.Response:
+        """ Return a failed API response """
+        return web.Response(status=status, text=json.dumps({ "error": { "key": key, "description": description } }), content_type=CONTENT_TYPE)
+
+    @staticmethod
+    def no_content() -> web.Response:
+        """ Return the response to a successful write """
+        return web.Response(status=204)
+
+    def get_appliance(self, request:web.Request) -> FakeAppliance:
+        """ Get the appliance addressed by the request or raise a "not found" response """
+        appliance = self.appliances.get(request.match_info["haid"])
+        if not appliance:
+            raise web.HTTPNotFound(text=json.dumps({ "error": { "key": "SDK.Error.HomeAppliance.NotFound" } }), content_type=CONTENT_TYPE)
+        if not appliance.connected:
+            raise web.HTTPConflict(text=json.dumps({ "error": {
+                "key": "SDK.Error.HomeAppliance.Connection.Initialization.Failed",
+                "description": "HomeAppliance is offline"
+            } }), content_type=CONTENT_TYPE)
+        return appliance
+
+    @staticmethod
+    async def read_data(request:web.Request) -> dict:
+        """ Read the "data" element of a request body """
+        try:
+            body = json.loads(await request.text())
+            return body["data"]
+        except (ValueError, KeyError, TypeError) as ex:
+            raise web.HTTPBadRequest(text=json.dumps({ "error": { "key": "SDK.Error.InvalidRequest" } }), content_type=CONTENT_TYPE) from ex
+
+    def publish(self, event_type:str, haid:str, items:list[dict]=None) -> None:
+        """ Publish an event to all the subscribers of the event stream """
+        if items is None:
+            message = f"event: {event_type}\ndata: \nid: {haid}\n\n"
+        else:
+            timestamp = int(time.time())
+            for item in items:
+                item.setdefault("timestamp", timestamp)
+                item.setdefault("handling", "none")
+                item.setdefault("level", "hint")
+            message = f"event: {event_type}\ndata: {json.dumps({ 'haId': haid, 'items': items })}\nid: {haid}\n\n"
+        for queue in self._subscribers:
+            queue.put_nowait(message)
+
+    def set_status(self, appliance:FakeAppliance, key:str, value) -> None:
+        """ Update a status value and publish the change """
+        appliance.status[key] = value
+        self.publish("STATUS", appliance.haid, [{ "key": key, "value": value, "uri": appliance.uri(f"status/{key}") }])
+
+    #endregion
+
+    #region - OAuth
+
+    async def handle_authorize(self, request:web.Request) -> web.Response:
+        """ Authorize immediately and redirect back with an authorization code """
+        redirect_uri = request.query.get("redirect_uri")
+        if not redirect_uri:
+            return web.Response(status=400, text="redirect_uri is required")
+        separator = "&" if "?" in redirect_uri else "?"
+        raise web.HTTPFound(f"{redirect_uri}{separator}code=fake-code&state={request.query.get('state', '')}")
+
+    async def handle_token(self, request:web.Request) -> web.Response:
+        """ Issue a new token for any authorization code or refresh token """
+        token = next(self._tokens)
+        return web.json_response({
+            "access_token": f"fake-access-token-{token}",
+            "refresh_token": f"fake-refresh-token-{token}",
+            "id_token": f"fake-id-token-{token}",
+            "token_type": "Bearer",
+            "expires_in": 86400,
+            "scope": "IdentifyAppliance Monitor Control Settings"
+        })
+
+    #endregion
+
+    #region - Appliances, status, settings and commands
+
+    async def handle_appliances(self, request:web.Request) -> web.Response:
+        return self.data_response({ "homeappliances": [ appliance.properties for appliance in self.appliances.values() ] })
+
+    async def handle_appliance(self, request:web.Request) -> web.Response:
+        appliance = self.appliances.get(request.match_info["haid"])
+        if not appliance:
+            return self.error_response(404, "SDK.Error.HomeAppliance.NotFound", "Unknown appliance")
+        return self.data_response(appliance.properties)
+
+    async def handle_status(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        return self.data_response({ "status": [ { "key": key, "value": value } for (key, value) in appliance.status.items() ] })
+
+    async def handle_settings(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        return self.data_response({ "settings": [ { "key": key, "value": value } for (key, value) in appliance.setting_values.items() ] })
+
+    async def handle_setting(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        key = request.match_info["key"]
+        if key not in appliance.settings:
+            return self.error_response(404, "SDK.Error.UnsupportedSetting", f"Setting {key} not supported")
+        return self.data_response({ **appliance.settings[key], "value": appliance.setting_values[key] })
+
+    async def handle_put_setting(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        key = request.match_info["key"]
+        data = await self.read_data(request)
+        if key not in appliance.settings:
+            return self.error_response(404, "SDK.Error.UnsupportedSetting", f"Setting {key} not supported")
+        if not self.valid_value(appliance.settings[key], data.get("value")):
+            return self.error_response(409, "SDK.Error.InvalidSettingState", f"Invalid value for {key}")
+        appliance.setting_values[key] = data["value"]
+        self.publish("NOTIFY", appliance.haid, [{ "key": key, "value": data["value"], "uri": appliance.uri(f"settings/{key}") }])
+        return self.no_content()
+
+    async def handle_commands(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        return self.data_response({ "commands": [ { "key": key } for key in appliance.commands ] })
+
+    async def handle_put_command(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        key = request.match_info["key"]
+        state = appliance.status.get(OPERATION_STATE)
+        if key == "BSH.Common.Command.PauseProgram" and key in appliance.commands and state == f"{OPERATION_STATE_ENUM}.Run":
+            self.set_status(appliance, OPERATION_STATE, f"{OPERATION_STATE_ENUM}.Pause")
+        elif key == "BSH.Common.Command.ResumeProgram" and key in appliance.commands and state == f"{OPERATION_STATE_ENUM}.Pause":
+            self.set_status(appliance, OPERATION_STATE, f"{OPERATION_STATE_ENUM}.Run")
+        else:
+            return self.error_response(409, "SDK.Error.UnsupportedCommand", f"Command {key} is not supported in the current state")
+        return self.no_content()
+
+    @staticmethod
+    def valid_value(definition:dict, value) -> bool:
+        """ Validate a value against the constraints of an option or setting """
+        constraints = definition.get("constraints", {})
+        if definition.get("type") == "Boolean":
+            return isinstance(value, bool)
+        if "allowedvalues" in constraints:
+            return value in constraints["allowedvalues"]
+        if definition.get("type") in ["Int", "Float", "Double"]:
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                return False
+            return constraints.get("min", value) <= value <= constraints.get("max", value)
+        return True
+
+    #endregion
+
+    #region - Programs
+
+    async def handle_available_programs(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        if appliance.active:
+            return self.error_response(409, "SDK.Error.WrongOperationState", "Programs are not available while a program is active")
+        return self.data_response({ "programs": [
+            { "key": key, "constraints": { "execution": "selectandstart" } } for key in appliance.programs
+        ] })
+
+    async def handle_available_program(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        key = request.match_info["key"]
+        if key not in appliance.programs:
+            return self.error_response(404, "SDK.Error.UnsupportedProgram", f"Program {key} is not supported")
+        return self.data_response({ "key": key, "options": appliance.programs[key] })
+
+    async def handle_selected_program(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        if not appliance.selected:
+            return self.error_response(404, "SDK.Error.NoProgramSelected", "No program selected")
+        return self.data_response(appliance.program_json(appliance.selected))
+
+    async def handle_active_program(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        if not appliance.active:
+            return self.error_response(404, "SDK.Error.NoProgramActive", "No program active")
+        return self.data_response(appliance.program_json(appliance.active))
+
+    def build_program(self, appliance:FakeAppliance, data:dict) -> dict|web.Response:
+        """ Build a program from the request data, or an error response if the request is invalid """
+        key = data.get("key")
+        if key not in appliance.programs:
+            return self.error_response(404, "SDK.Error.UnsupportedProgram", f"Program {key} is not supported")
+        program = appliance.default_program(key)
+        for option in data.get("options") or []:
+            definition = appliance.option_definition(key, option.get("key"))
+            if not definition:
+                return self.error_response(409, "SDK.Error.UnsupportedOption", f"Option {option.get('key')} not supported")
+            if not self.valid_value(definition, option.get("value")):
+                return self.error_response(409, "SDK.Error.InvalidOptionValue", f"Invalid value for {option.get('key')}")
+            program["options"][option["key"]] = option["value"]
+        return program
+
+    def select_program(self, appliance:FakeAppliance, program:dict) -> None:
+        """ Make a program the selected program and publish the change """
+        appliance.selected = program
+        items = [{ "key": "BSH.Common.Root.SelectedProgram", "value": program["key"], "uri": appliance.uri("programs/selected") }]
+        items.extend(
+            { "key": key, "value": value, "uri": appliance.uri(f"programs/selected/options/{key}") }
+            for (key, value) in program["options"].items()
+        )
+        self.publish("NOTIFY", appliance.haid, items)
+
+    async def handle_put_selected_program(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        if appliance.active:
+            return self.error_response(409, "SDK.Error.WrongOperationState", "A program is already active")
+        program = self.build_program(appliance, await self.read_data(request))
+        if isinstance(program, web.Response):
+            return program
+        self.select_program(appliance, program)
+        return self.no_content()
+
+    async def handle_put_option(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        key = request.match_info["key"]
+        data = await self.read_data(request)
+        program = appliance.active if appliance.active else appliance.selected
+        if not program:
+            return self.error_response(409, "SDK.Error.NoProgramSelected", "No program selected")
+        definition = appliance.option_definition(program["key"], key)
+        if not definition:
+            return self.error_response(409, "SDK.Error.UnsupportedOption", f"Option {key} not supported")
+        if not self.valid_value(definition, data.get("value")):
+            return self.error_response(409, "SDK.Error.InvalidOptionValue", f"Invalid value for {key}")
+        program["options"][key] = data["value"]
+        self.publish("NOTIFY", appliance.haid, [{ "key": key, "value": data["value"], "uri": appliance.uri(f"programs/selected/options/{key}") }])
+        return self.no_content()
+
+    async def handle_put_active_program(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        if appliance.status.get(OPERATION_STATE) != f"{OPERATION_STATE_ENUM}.Ready":
+            return self.error_response(409, "SDK.Error.WrongOperationState", "The appliance is not ready")
+        if appliance.status.get("BSH.Common.Status.RemoteControlStartAllowed") is False:
+            return self.error_response(403, "SDK.Error.RemoteStartNotActivated", "Remote start is not activated")
+        program = self.build_program(appliance, await self.read_data(request))
+        if isinstance(program, web.Response):
+            return program
+        if not appliance.selected or appliance.selected["key"] != program["key"]:
+            self.select_program(appliance, program)
+        self.start_program(appliance, program)
+        return self.no_content()
+
+    async def handle_delete_active_program(self, request:web.Request) -> web.Response:
+        appliance = self.get_appliance(request)
+        if not appliance.active:
+            return self.error_response(404, "SDK.Error.NoProgramActive", "No program active")
+        self.finish_program(appliance, f"{OPERATION_STATE_ENUM}.Ready", finished=False)
+        return self.no_content()
+
+    def start_program(self, appliance:FakeAppliance, program:dict) -> None:
+        """ Start running a program in a background task """
+        duration = max(appliance.duration, 1)
+        appliance.active = {
+            "key": program["key"],
+            "options": {
+                **program["options"],
+                "BSH.Common.Option.RemainingProgramTime": duration,
+                "BSH.Common.Option.ElapsedProgramTime": 0,
+                "BSH.Common.Option.ProgramProgress": 0
+            }
+        }
+        self.set_status(appliance, OPERATION_STATE, f"{OPERATION_STATE_ENUM}.Run")
+        self.publish("NOTIFY", appliance.haid, [{ "key": "BSH.Common.Root.ActiveProgram", "value": program["key"], "uri": appliance.uri("programs/active") }])
+        appliance.run_task = asyncio.create_task(self.async_run_program(appliance, duration))
+
+    async def async_run_program(self, appliance:FakeAppliance, duration:int) -> None:
+        """ Advance the active program and publish its progress every simulated minute """
+        elapsed = 0
+        while elapsed < duration:
+            await asyncio.sleep(60 / self.speed)
+            if appliance.status.get(OPERATION_STATE) != f"{OPERATION_STATE_ENUM}.Run":
+                continue
+            elapsed = min(elapsed + 60, duration)
+            options = appliance.active["options"]
+            options["BSH.Common.Option.ElapsedProgramTime"] = elapsed
+            options["BSH.Common.Option.RemainingProgramTime"] = duration - elapsed
+            options["BSH.Common.Option.ProgramProgress"] = int(elapsed * 100 / duration)
+            self.publish("NOTIFY", appliance.haid, [
+                { "key": key, "value": options[key], "uri": appliance.uri(f"programs/active/options/{key}") }
+                for key in ["BSH.Common.Option.ElapsedProgramTime", "BSH.Common.Option.RemainingProgramTime", "BSH.Common.Option.ProgramProgress"]
+            ])
+        appliance.run_task = None
+        self.finish_program(appliance, f"{OPERATION_STATE_ENUM}.Finished", finished=True)
+
+    def finish_program(self, appliance:FakeAppliance, state:str, finished:bool) -> None:
+        """ End the active program """
+        if appliance.run_task:
+            appliance.run_task.cancel()
+            appliance.run_task = None
+        appliance.active = None
+        if finished:
+            self.publish("EVENT", appliance.haid, [{
+                "key": "BSH.Common.Event.ProgramFinished",
+                "value": "BSH.Common.EnumType.EventPresentState.Present",
+                "uri": appliance.uri("events")
+            }])
+        self.publish("NOTIFY", appliance.haid, [{ "key": "BSH.Common.Root.ActiveProgram", "value": None, "uri": appliance.uri("programs/active") }])
+        self.set_status(appliance, OPERATION_STATE, state)
+
+    #endregion
+
+    #region - Event stream
+
+    async def handle_events(self, request:web.Request) -> web.StreamResponse:
+        """ Serve the SSE event stream """
+        response = web.StreamResponse(headers={ "Content-Type": "text/event-stream", "Cache-Control": "no-cache" })
+        await response.prepare(request)
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    message = "event: KEEP-ALIVE\ndata: \n\n"
+                await response.write(message.encode())
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self._subscribers.discard(queue)
+        return response
+
+    #endregion
+
+    #region - Control endpoints
+
+    async def handle_fake_config(self, request:web.Request) -> web.Response:
+        """ Change the latency, error injection and rate limit settings at runtime """
+        config = await request.json()
+        for attr in ["latency", "jitter", "error_rate", "rate_limit", "speed", "keepalive"]:
+            if attr in config:
+                setattr(self, attr, config[attr])
+        return web.json_response({ "request_count": self.request_count, "subscribers": len(self._subscribers) })
+
+    async def handle_fake_appliance_action(self, request:web.Request) -> web.Response:
+        """ Connect, disconnect, pair or depair an appliance """
+        haid = request.match_info["haid"]
+        action = request.match_info["action"]
+        appliance = self.appliances.get(haid)
+        if not appliance:
+            return web.json_response({ "error": f"Unknown appliance {haid}" }, status=404)
+        if action in ["connect", "disconnect"]:
+            appliance.properties["connected"] = action == "connect"
+            self.publish("CONNECTED" if action == "connect" else "DISCONNECTED", haid)
+        elif action == "depair":
+            self.publish("DEPAIRED", haid)
+            del self.appliances[haid]
+        else:
+            return web.json_response({ "error": f"Unknown action {action}" }, status=400)
+        return web.json_response({ "haId": haid, "action": action })
+
+    async def handle_fake_event(self, request:web.Request) -> web.Response:
+        """ Inject an arbitrary event into the event stream
+
+        The body format is: { "type": "NOTIFY", "haId": "...", "items": [ { "key": "...", "value": ..., "uri": "..." } ] }
+        """
+        event = await request.json()
+        self.publish(event.get("type", "NOTIFY"), event["haId"], event.get("items"))
+        return web.json_response({ "subscribers": len(self._subscribers) })
+
+    #endregion
+
+
+def main() -> None:
+    """ Run the fake service from the command line """
+    parser = argparse.ArgumentParser(description="A local fake Home Connect cloud service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--appliances", default=None, help='Appliance mix, for example "Washer:2,Oven:1"')
+    parser.add_argument("--extra-programs", type=int, default=0, help="Synthetic programs to add to every appliance with programs")
+    parser.add_argument("--extra-options", type=int, default=0, help="Synthetic options to add to every program")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for randomly selecting the initial programs")
+    parser.add_argument("--latency", type=float, default=0, help="Latency added to every API request in milliseconds")
+    parser.add_argument("--jitter", type=float, default=0, help="Random latency jitter in milliseconds")
+    parser.add_argument("--error-rate", type=float, default=0, help="Probability of an API request failing with HTTP 500")
+    parser.add_argument("--rate-limit", type=int, default=0, help="API requests allowed per minute before responding with HTTP 429")
+    parser.add_argument("--speed", type=float, default=1, help="Simulation speed multiplier for running programs")
+    parser.add_argument("--keepalive", type=float, default=55, help="Seconds between KEEP-ALIVE events")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    fleet = build_fleet(parse_mix(args.appliances) if args.appliances else None, args.extra_programs, args.extra_options, args.seed)
+    cloud = FakeCloud(fleet, args.latency, args.jitter, args.error_rate, args.rate_limit, args.speed, args.keepalive)
+    for (haid, appliance) in cloud.appliances.items():
+        _LOGGER.info("Simulating %s (%s)", haid, appliance.properties["type"])
+    web.run_app(cloud.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+""" Synthetic appliance fleets described in the Home Connect API format """
+from __future__ import annotations
+import copy
+import random
+
+
+def enum_option(key:str, values:list[str], default:str=None) -> dict:
+    """ Helper to define an enum option or setting """
+    return {
+        "key": key,
+        "type": key.replace(".Option.", ".EnumType.").replace(".Setting.", ".EnumType."),
+        "constraints": { "allowedvalues": values, "default": default if default else values[0] }
+    }
+
+def int_option(key:str, unit:str, minimum:int, maximum:int, stepsize:int=1, default:int=None) -> dict:
+    """ Helper to define a numeric option or setting """
+    return {
+        "key": key,
+        "type": "Int",
+        "unit": unit,
+        "constraints": { "min": minimum, "max": maximum, "stepsize": stepsize, "default": default if default is not None else minimum }
+    }
+
+def bool_option(key:str, default:bool=False) -> dict:
+    """ Helper to define a boolean option or setting """
+    return { "key": key, "type": "Boolean", "constraints": { "default": default } }
+
+
+COMMON_STATUS = {
+    "BSH.Common.Status.OperationState": "BSH.Common.EnumType.OperationState.Ready",
+    "BSH.Common.Status.RemoteControlActive": True,
+    "BSH.Common.Status.RemoteControlStartAllowed": True
+}
+
+DOOR_STATUS = {
+    "BSH.Common.Status.DoorState": "BSH.Common.EnumType.DoorState.Closed"
+}
+
+COMMON_SETTINGS = [
+    enum_option("BSH.Common.Setting.PowerState", ["BSH.Common.EnumType.PowerState.On", "BSH.Common.EnumType.PowerState.Standby"]),
+    bool_option("BSH.Common.Setting.ChildLock")
+]
+
+PROGRAM_COMMANDS = [ "BSH.Common.Command.PauseProgram", "BSH.Common.Command.ResumeProgram" ]
+
+LAUNDRY_TEMPERATURES = [ f"LaundryCare.Washer.EnumType.Temperature.{t}" for t in ["Cold", "GC20", "GC30", "GC40", "GC60", "GC90"] ]
+SPIN_SPEEDS = [ f"LaundryCare.Washer.EnumType.SpinSpeed.RPM{rpm}" for rpm in [400, 600, 800, 1000, 1200, 1400] ]
+
+APPLIANCE_TEMPLATES = {
+    "Washer": {
+        "brand": "Siemens",
+        "vib": "WM14T6H0GB",
+        "status": { **COMMON_STATUS, **DOOR_STATUS },
+        "settings": COMMON_SETTINGS,
+        "commands": PROGRAM_COMMANDS,
+        "programs": {
+            f"LaundryCare.Washer.Program.{name}": [
+                enum_option("LaundryCare.Washer.Option.Temperature", LAUNDRY_TEMPERATURES, LAUNDRY_TEMPERATURES[3]),
+                enum_option("LaundryCare.Washer.Option.SpinSpeed", SPIN_SPEEDS, SPIN_SPEEDS[-1]),
+                int_option("BSH.Common.Option.FinishInRelative", "seconds", 0, 86400, 60),
+                bool_option("LaundryCare.Washer.Option.IDos1Active"),
+                bool_option("LaundryCare.Washer.Option.SpeedPerfect")
+            ]
+            for name in ["Cotton", "EasyCare", "Mix", "DelicatesSilk", "Wool", "Sensitive", "Towels", "Super153045.Super1530"]
+        },
+        "duration": 5400
+    },
+    "Dryer": {
+        "brand": "Bosch",
+        "vib": "WTX87M40",
+        "status": { **COMMON_STATUS, **DOOR_STATUS },
+        "settings": COMMON_SETTINGS,
+        "commands": PROGRAM_COMMANDS,
+        "programs": {
+            f"LaundryCare.Dryer.Program.{name}": [
+                enum_option("LaundryCare.Dryer.Option.DryingTarget", [
+                    f"LaundryCare.Dryer.EnumType.DryingTarget.{t}" for t in ["IronDry", "CupboardDry", "CupboardDryPlus"]
+                ]),
+                int_option("BSH.Common.Option.FinishInRelative", "seconds", 0, 86400, 60),
+                bool_option("LaundryCare.Dryer.Option.Gentle")
+            ]
+            for name in ["Cotton", "Synthetic", "Mix", "Blankets", "Dessous"]
+        },
+        "duration": 4800
+    },
+    "Dishwasher": {
+        "brand": "Bosch",
+        "vib": "SMV6ZCX42E",
+        "status": { **COMMON_STATUS, **DOOR_STATUS },
+        "settings": COMMON_SETTINGS,
+        "commands": PROGRAM_COMMANDS,
+        "programs": {
+            f"Dishcare.Dishwasher.Program.{name}": [
+                int_option("BSH.Common.Option.StartInRelative", "seconds", 0, 86400, 60),
+                bool_option("Dishcare.Dishwasher.Option.IntensivZone"),
+                bool_option("Dishcare.Dishwasher.Option.VarioSpeedPlus"),
+                bool_option("Dishcare.Dishwasher.Option.HalfLoad"),
+                bool_option("Dishcare.Dishwasher.Option.ExtraDry")
+            ]
+            for name in ["Auto2", "Eco50", "Quick45", "Intensiv70", "Glas40", "PreRinse"]
+        },
+        "duration": 7200
+    },
+    "Oven": {
+        "brand": "Neff",
+        "vib": "B57CR22N0B",
+        "status": {
+            **COMMON_STATUS,
+            **DOOR_STATUS,
+            "Cooking.Oven.Status.CurrentCavityTemperature": 21
+        },
+        "settings": COMMON_SETTINGS + [
+            bool_option("Cooking.Oven.Setting.SabbathMode")
+        ],
+        "commands": PROGRAM_COMMANDS,
+        "programs": {
+            f"Cooking.Oven.Program.HeatingMode.{name}": [
+                int_option("Cooking.Oven.Option.SetpointTemperature", "°C", 30, 250, 5, 180),
+                int_option("BSH.Common.Option.Duration", "seconds", 60, 86340, 60, 1800),
+                bool_option("Cooking.Oven.Option.FastPreHeat")
+            ]
+            for name in ["HotAir", "TopBottomHeating", "PizzaSetting", "HotAirGrilling", "BottomHeating", "KeepWarm"]
+        },
+        "duration": 1800
+    },
+    "CoffeeMaker": {
+        "brand": "Siemens",
+        "vib": "TI9555X1DE",
+        "status": { **COMMON_STATUS },
+        "settings": COMMON_SETTINGS + [
+            enum_option("ConsumerProducts.CoffeeMaker.Setting.CupWarmer", [
+                "ConsumerProducts.CoffeeMaker.EnumType.CupWarmer.Off", "ConsumerProducts.CoffeeMaker.EnumType.CupWarmer.On"
+            ])
+        ],
+        "commands": [],
+        "programs": {
+            f"ConsumerProducts.CoffeeMaker.Program.Beverage.{name}": [
+                enum_option("ConsumerProducts.CoffeeMaker.Option.BeanAmount", [
+                    f"ConsumerProducts.CoffeeMaker.EnumType.BeanAmount.{t}" for t in ["Mild", "Normal", "Strong", "VeryStrong", "DoubleShot"]
+                ], "ConsumerProducts.CoffeeMaker.EnumType.BeanAmount.Normal"),
+                int_option("ConsumerProducts.CoffeeMaker.Option.FillQuantity", "ml", 35, 260, 5, 60),
+                enum_option("ConsumerProducts.CoffeeMaker.Option.CoffeeTemperature", [
+                    f"ConsumerProducts.CoffeeMaker.EnumType.CoffeeTemperature.{t}" for t in ["88C", "90C", "92C", "94C", "95C"]
+                ])
+            ]
+            for name in ["Espresso", "EspressoMacchiato", "Coffee", "Cappuccino", "LatteMacchiato", "CaffeLatte", "Ristretto"]
+        },
+        "duration": 60
+    },
+    "FridgeFreezer": {
+        "brand": "Bosch",
+        "vib": "KGN39AIEQ",
+        "status": {
+            **DOOR_STATUS,
+            "Refrigeration.Common.Status.Door.Freezer": "BSH.Common.EnumType.DoorState.Closed",
+            "Refrigeration.Common.Status.Door.Refrigerator": "BSH.Common.EnumType.DoorState.Closed"
+        },
+        "settings": [
+            int_option("Refrigeration.FridgeFreezer.Setting.SetpointTemperatureRefrigerator", "°C", 2, 8, 1, 4),
+            int_option("Refrigeration.FridgeFreezer.Setting.SetpointTemperatureFreezer", "°C", -24, -16, 1, -18),
+            bool_option("Refrigeration.FridgeFreezer.Setting.SuperModeFreezer"),
+            bool_option("Refrigeration.FridgeFreezer.Setting.SuperModeRefrigerator")
+        ],
+        "commands": [],
+        "programs": {},
+        "duration": 0
+    }
+}
+
+DEFAULT_MIX = { "Washer": 1, "Dryer": 1, "Dishwasher": 1, "Oven": 1, "CoffeeMaker": 1, "FridgeFreezer": 1 }
+
+
+def parse_mix(mix:str) -> dict[str, int]:
+    """ Parse an appliance mix in the format "Washer:3,Oven:2" """
+    result = {}
+    for part in mix.split(','):
+        if not part.strip():
+            continue
+        (appliance_type, _, count) = part.partition(':')
+        appliance_type = appliance_type.strip()
+        if appliance_type not in APPLIANCE_TEMPLATES:
+            raise ValueError(f"Unknown appliance type: {appliance_type} (supported: {', '.join(APPLIANCE_TEMPLATES)})")
+        result[appliance_type] = int(count) if count else 1
+    return result
+
+
+def scale_mix(total:int, types:list[str]=None) -> dict[str, int]:
+    """ Spread a total number of appliances evenly across appliance types """
+    types = types if types else list(APPLIANCE_TEMPLATES.keys())
+    mix = { appliance_type: total // len(types) for appliance_type in types }
+    for appliance_type in types[:total % len(types)]:
+        mix[appliance_type] += 1
+    return mix
+
+
+def build_appliance(appliance_type:str, index:int, extra_programs:int=0, extra_options:int=0, program_options:int=0) -> dict:
+    """ Build the full description of a single appliance
+
+    extra_programs and extra_options add synthetic programs and options on top of the template
+    to simulate appliances with larger data models. extra_options are shared by all the programs while
+    program_options are added to every program with keys that are specific to the program.
+    """
+    template = APPLIANCE_TEMPLATES[appliance_type]
+    haid = f"{template['brand'].upper()}-{template['vib']}-{index:012X}"
+
+    programs = copy.deepcopy(template["programs"])
+    if programs:
+        base_options = next(iter(programs.values()))
+        for i in range(extra_programs):
+            programs[f"{next(iter(programs)).rsplit('.', 1)[0]}.Synthetic{i}"] = copy.deepcopy(base_options)
+        for (program_key, options) in programs.items():
+            for i in range(extra_options):
+                options.append(int_option(f"Synthetic.{appliance_type}.Option.Level{i}", "%", 0, 100, 5, 50))
+            for i in range(program_options):
+                options.append(int_option(f"Synthetic.{appliance_type}.{program_key.rsplit('.', 1)[-1]}.Option.Level{i}", "%", 0, 100, 5, 50))
+
+    return {
+        "properties": {
+            "haId": haid,
+            "name": f"{appliance_type} {index}",
+            "type": appliance_type,
+            "brand": template["brand"],
+            "vib": template["vib"],
+            "enumber": f"{template['vib']}/{index:02d}",
+            "connected": True
+        },
+        "status": dict(template["status"]),
+        "settings": { setting["key"]: copy.deepcopy(setting) for setting in template["settings"] },
+        "commands": list(template["commands"]),
+        "programs": programs,
+        "duration": template["duration"]
+    }
+
+
+def build_fleet(mix:dict[str, int]=None, extra_programs:int=0, extra_options:int=0, seed:int=None, program_options:int=0) -> dict[str, dict]:
+    """ Build a fleet of appliances keyed by haId """
+    mix = mix if mix else DEFAULT_MIX
+    fleet = {}
+    index = 0
+    for (appliance_type, count) in mix.items():
+        for _ in range(count):
+            appliance = build_appliance(appliance_type, index, extra_programs, extra_options, program_options)
+            fleet[appliance["properties"]["haId"]] = appliance
+            index += 1
+
+    if seed is not None:
+        # Make the selected programs differ between appliances in a reproducible way
+        rnd = random.Random(seed)
+        for appliance in fleet.values():
+            if appliance["programs"]:
+                appliance["initial_program"] = rnd.choice(list(appliance["programs"].keys()))
+    return fleet
+
+
+def option_default(option:dict):
+    """ The default value of an option definition """
+    return option.get("constraints", {}).get("default")
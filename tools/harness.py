@@ -0,0 +1,405 @@
+""" Offline harness for running the integration platforms without Home Assistant or the cloud service
+
+The harness sets up all the entity platforms against a HomeConnect object, attaches the entities to their
+callbacks and replaces async_write_ha_state() with a counter that also renders the entity state the way
+Home Assistant does on every state write. Like in the integration, the entities that can't change while they are
+unavailable go dormant after the write, unless the dormancy is disabled.
+"""
+from __future__ import annotations
+import asyncio
+import copy
+import importlib
+import re
+import time
+from types import SimpleNamespace
+
+from home_connect_async import Appliance, HomeConnect
+from home_connect_async.appliance import Command, Option, Program, Status
+
+from custom_components.home_connect_alt.common import DormancyManager, get_dormancy
+from custom_components.home_connect_alt.const import DOMAIN, ENTRIES
+from custom_components.home_connect_alt.filters import EntityFilter
+from custom_components.home_connect_alt.perf import PerfCounters, get_perf_counters
+from custom_components.home_connect_alt.usage import ProgramUsage
+
+from .fleet import option_default
+
+HARNESS_ENTRY_ID = "harness"
+
+PLATFORMS = ["sensor", "binary_sensor", "select", "number", "button", "switch"]
+
+# The entity properties that are read by Home Assistant when the state is written
+RENDER_ATTRIBUTES = [
+    "available", "name", "icon", "device_class", "unique_id", "device_info",
+    "native_value", "native_unit_of_measurement", "is_on",
+    "options", "current_option",
+    "value", "min_value", "max_value", "step", "unit_of_measurement"
+]
+
+_render_attributes_cache:dict[type, list[str]] = {}
+
+
+def render_attributes(entity_class:type) -> list[str]:
+    """ The render attributes that are implemented by the integration itself (rather than by Home Assistant) """
+    if entity_class not in _render_attributes_cache:
+        attributes = []
+        for attr in RENDER_ATTRIBUTES:
+            for cls in entity_class.__mro__:
+                if attr in cls.__dict__:
+                    if cls.__module__.startswith("custom_components."):
+                        attributes.append(attr)
+                    break
+        _render_attributes_cache[entity_class] = attributes
+    return _render_attributes_cache[entity_class]
+
+
+def render_state(entity) -> tuple:
+    """ Read all the state properties of an entity, like a state write does """
+    return tuple(getattr(entity, attr) for attr in render_attributes(type(entity)))
+
+
+class StateWriteCounter():
+    """ Counts and times the state writes of all the entities """
+    def __init__(self, render:bool=True) -> None:
+        self.render = render
+        self.writes = 0
+        self.last_write:float = 0
+        self.writes_by_entity:dict[int, int] = {}
+
+    def attach(self, entity) -> None:
+        """ Replace the state write method of an entity """
+        dormancy = get_dormancy(entity._appliance._homeconnect) if getattr(entity, "dormant_when_unavailable", False) else None
+        def async_write_ha_state():
+            if self.render:
+                render_state(entity)
+            self.writes += 1
+            self.last_write = time.perf_counter()
+            self.writes_by_entity[id(entity)] = self.writes_by_entity.get(id(entity), 0) + 1
+            if dormancy:
+                dormancy.update(entity)
+        entity.async_write_ha_state = async_write_ha_state
+
+
+class FakeDeviceRegistry():
+    """ A device registry that knows about every device it is asked for """
+    def __init__(self) -> None:
+        self.removed = 0
+
+    def async_get_device(self, identifiers:set, connections:set=None):
+        return SimpleNamespace(id=next(iter(identifiers))[1])
+
+    def async_remove_device(self, device_id:str) -> None:
+        self.removed += 1
+
+
+class FakeBus():
+    """ Counts the events that are fired on the event bus """
+    def __init__(self) -> None:
+        self.fired = 0
+
+    def async_fire(self, event_type:str, event_data:dict=None) -> None:
+        self.fired += 1
+
+
+class FakeHass():
+    """ The minimal subset of the HomeAssistant object that is used by the platforms """
+    def __init__(self, homeconnect:HomeConnect, dormancy:bool=True) -> None:
+        perf = get_perf_counters(homeconnect) or PerfCounters()
+        dormancy_manager = None
+        if dormancy:
+            dormancy_manager = get_dormancy(homeconnect) or DormancyManager()
+            dormancy_manager.attach(homeconnect)
+            perf.dormancy = dormancy_manager
+        runtime = SimpleNamespace(
+            entry_id=HARNESS_ENTRY_ID, homeconnect=homeconnect, perf=perf, program_usage=None, dormancy=dormancy_manager,
+            entity_filter=None
+        )
+        self.data = { DOMAIN: { ENTRIES: { HARNESS_ENTRY_ID: runtime } }, "device_registry": FakeDeviceRegistry() }
+        self.bus = FakeBus()
+        self.loop = asyncio.get_event_loop()
+
+
+class FakeConfigEntry():
+    """ A config entry which releases the registered handles when it is unloaded """
+    def __init__(self, entry_id:str) -> None:
+        self.entry_id = entry_id
+        self.data = {}
+        self.options = {}
+        self._on_unload:list = []
+
+    def async_on_unload(self, func) -> None:
+        self._on_unload.append(func)
+
+    def async_unload(self) -> None:
+        while self._on_unload:
+            self._on_unload.pop()()
+
+
+class PlatformHarness():
+    """ Sets up all the entity platforms of the integration against a HomeConnect object """
+    def __init__(
+        self, homeconnect:HomeConnect, render:bool=True, add_to_hass:bool=True, lazy_options:bool=False, dormancy:bool=True,
+        entity_filter:EntityFilter|None=None
+    ) -> None:
+        self.homeconnect = homeconnect
+        self.hass = FakeHass(homeconnect, dormancy)
+        self.hass.data[DOMAIN][ENTRIES][HARNESS_ENTRY_ID].entity_filter = entity_filter
+        if lazy_options:
+            # Without a usage history only the options of the current programs get entities
+            self.hass.data[DOMAIN][ENTRIES][HARNESS_ENTRY_ID].program_usage = ProgramUsage(self.hass, HARNESS_ENTRY_ID)
+        self.counter = StateWriteCounter(render)
+        # Unique IDs are only unique within a platform
+        self.entities:dict[tuple[str, str], object] = {}
+        self.add_to_hass = add_to_hass
+        self._pending:list = []
+        self.config_entry = FakeConfigEntry(HARNESS_ENTRY_ID)
+
+    async def async_setup(self) -> None:
+        """ Set up all the platforms and add the entities they create """
+        for platform in PLATFORMS:
+            module = importlib.import_module(f"custom_components.home_connect_alt.{platform}")
+            await module.async_setup_entry(self.hass, self.config_entry, self.add_entities_callback(platform))
+        await self.async_flush()
+
+    def add_entities_callback(self, platform:str):
+        """ Create the AddEntitiesCallback that is passed to a platform """
+        def add_entities(entities, update_before_add:bool=False) -> None:
+            for entity in entities:
+                entity.hass = self.hass
+                self.counter.attach(entity)
+                self._pending.append((platform, entity))
+        return add_entities
+
+    async def async_flush(self) -> None:
+        """ Run async_added_to_hass() for entities that were added since the last flush """
+        while self._pending:
+            (platform, entity) = self._pending.pop(0)
+            self.entities[(platform, entity.unique_id)] = entity
+            if self.add_to_hass:
+                await entity.async_added_to_hass()
+            # Home Assistant writes the initial state when an entity is added
+            entity.async_write_ha_state()
+        # Let the entities that went dormant release their callbacks
+        await asyncio.sleep(0)
+
+    async def async_remove_entities(self, appliance:Appliance|None=None) -> None:
+        """ Remove the entities of an appliance, or all the entities, like Home Assistant does on unload """
+        haid = appliance.haId.lower().replace('-', '_') if appliance else None
+        for (entity_key, entity) in list(self.entities.items()):
+            if haid is None or getattr(entity, "haId", None) == haid:
+                if self.add_to_hass:
+                    on_remove = getattr(entity, "_on_remove", None)
+                    while on_remove:
+                        on_remove.pop()()
+                    await entity.async_will_remove_from_hass()
+                del self.entities[entity_key]
+
+    async def async_unload(self) -> None:
+        """ Remove all the entities and release the handles of the config entry, like Home Assistant does on unload """
+        await self.async_remove_entities()
+        self.config_entry.async_unload()
+
+
+class OfflineResponse():
+    """ Mimics HomeConnectApi.ApiResponse """
+    def __init__(self, status:int, data:dict=None, error_key:str=None) -> None:
+        self.status = status
+        self.data = data
+        self.error = { "key": error_key } if error_key else None
+
+    error_key = property(lambda self: self.error["key"] if self.error else None)
+    error_description = property(lambda self: None)
+
+
+class ModelApi():
+    """ An offline replacement for HomeConnectApi which answers requests from the data model itself
+
+    This allows the SDK to re-fetch data while processing events without a network or a cloud service.
+    Writes are accepted and ignored.
+
+    detached - appliances that are not in the model (for example after DEPAIRED) but can still be fetched
+    selected - overrides of the selected program key per haId, answered with the default option values
+    catalog - the available programs with their options when the API was attached, the SDK only keeps the
+    options of the current program after the available programs are fetched again
+    """
+    _ENDPOINT = re.compile(r"/api/homeappliances/(?P<haid>[^/]+)(?P<path>/.*)?")
+
+    def __init__(self, homeconnect:HomeConnect) -> None:
+        self._homeconnect = homeconnect
+        self.request_count = 0
+        self.detached:dict[str, Appliance] = {}
+        self.selected:dict[str, str] = {}
+        self.catalog:dict[str, dict[str, Program]] = {}
+
+    @classmethod
+    def attach(cls, homeconnect:HomeConnect) -> ModelApi:
+        """ Create an instance and attach it to the HomeConnect object and all its appliances """
+        api = cls(homeconnect)
+        homeconnect._api = api
+        for appliance in homeconnect.appliances.values():
+            appliance._api = api
+            api.catalog[appliance.haId] = copy.deepcopy(appliance.available_programs or {})
+        return api
+
+    def _catalog_program(self, appliance:Appliance, key:str) -> Program|None:
+        program = (appliance.available_programs or {}).get(key)
+        if program is None or program.options is None:
+            program = self.catalog.get(appliance.haId, {}).get(key, program)
+        return program
+
+    async def async_get(self, endpoint:str) -> OfflineResponse:
+        self.request_count += 1
+        if endpoint == "/api/homeappliances":
+            return OfflineResponse(200, { "homeappliances": [ self._properties(a) for a in self._homeconnect.appliances.values() ] })
+
+        match = self._ENDPOINT.fullmatch(endpoint)
+        haid = match.group("haid") if match else None
+        appliance = self._homeconnect.appliances.get(haid) or self.detached.get(haid)
+        if not appliance:
+            return OfflineResponse(404, error_key="SDK.Error.HomeAppliance.NotFound")
+
+        path = match.group("path") or ""
+        if path == "":
+            return OfflineResponse(200, self._properties(appliance))
+        if path == "/status":
+            return OfflineResponse(200, { "status": [ self._item(s) for s in (appliance.status or {}).values() ] })
+        if path == "/settings":
+            return OfflineResponse(200, { "settings": [ self._item(s) for s in (appliance.settings or {}).values() ] })
+        if path.startswith("/settings/"):
+            setting = (appliance.settings or {}).get(path[len("/settings/"):])
+            return OfflineResponse(200, self._option(setting)) if setting else OfflineResponse(404, error_key="SDK.Error.UnsupportedSetting")
+        if path == "/commands":
+            return OfflineResponse(200, { "commands": [ { "key": key } for key in (appliance.commands or {}) ] })
+        if path == "/programs/selected" and self.selected.get(appliance.haId):
+            program = self._catalog_program(appliance, self.selected[appliance.haId])
+            if program:
+                return OfflineResponse(200, self._program(program))
+        if path in ["/programs/selected", "/programs/active"]:
+            program = appliance.selected_program if path.endswith("selected") else appliance.active_program
+            if not program:
+                return OfflineResponse(404, error_key="SDK.Error.NoProgramSelected" if path.endswith("selected") else "SDK.Error.NoProgramActive")
+            return OfflineResponse(200, self._program(program))
+        if path == "/programs/available":
+            programs = appliance.available_programs or {}
+            return OfflineResponse(200, { "programs": [ { "key": key } for key in programs ] })
+        if path.startswith("/programs/available/"):
+            program = self._catalog_program(appliance, path[len("/programs/available/"):])
+            return OfflineResponse(200, self._program(program)) if program else OfflineResponse(404, error_key="SDK.Error.UnsupportedProgram")
+        return OfflineResponse(404, error_key="SDK.Error.NotFound")
+
+    async def async_put(self, endpoint:str, data:str) -> OfflineResponse:
+        self.request_count += 1
+        return OfflineResponse(204)
+
+    async def async_delete(self, endpoint:str) -> OfflineResponse:
+        self.request_count += 1
+        return OfflineResponse(204)
+
+    @staticmethod
+    def _properties(appliance:Appliance) -> dict:
+        return {
+            "haId": appliance.haId, "name": appliance.name, "brand": appliance.brand, "vib": appliance.vib,
+            "type": appliance.type, "enumber": appliance.enumber, "connected": appliance.connected
+        }
+
+    @staticmethod
+    def _item(item) -> dict:
+        return { "key": item.key, "name": item.name, "value": item.value, "displayvalue": item.displayvalue }
+
+    @classmethod
+    def _option(cls, option) -> dict:
+        data = { **cls._item(option), "type": option.type, "unit": option.unit, "constraints": {} }
+        for (attr, constraint) in [("min", "min"), ("max", "max"), ("stepsize", "stepsize"), ("allowedvalues", "allowedvalues"), ("execution", "execution")]:
+            if getattr(option, attr) is not None:
+                data["constraints"][constraint] = getattr(option, attr)
+        return data
+
+    @classmethod
+    def _program(cls, program) -> dict:
+        data = { "key": program.key, "name": program.name }
+        if program.options is not None:
+            data["options"] = [ cls._option(option) for option in program.options.values() ]
+        return data
+
+
+def _display_name(key:str) -> str:
+    return key.split('.')[-1]
+
+
+def _create_option(definition:dict, value) -> Option:
+    option = Option.create({ **definition, "name": _display_name(definition["key"]), "value": value })
+    if isinstance(value, str):
+        option.displayvalue = _display_name(value)
+    return option
+
+
+def _create_program(key:str, definitions:list[dict], values:dict=None) -> Program:
+    values = values if values else {}
+    options = [ _create_option(d, values.get(d["key"], option_default(d))) for d in definitions ]
+    return Program(key=key, name=_display_name(key), options={ o.key: o for o in options })
+
+
+def create_model(fleet:dict[str, dict], active_every:int=0) -> HomeConnect:
+    """ Create a loaded HomeConnect data model from a synthetic fleet built by tools.fleet
+
+    active_every - every Nth appliance with programs has an active program, 0 for none
+    The model is answered offline by ModelApi
+    """
+    homeconnect = HomeConnect()
+    homeconnect.status = HomeConnect.HomeConnectStatus.LOADED
+    for (index, description) in enumerate(fleet.values()):
+        properties = description["properties"]
+        appliance = Appliance(
+            name=properties["name"], brand=properties["brand"], vib=properties["vib"], connected=properties["connected"],
+            type=properties["type"], enumber=properties["enumber"], haId=properties["haId"],
+            uri=f"/api/homeappliances/{properties['haId']}"
+        )
+        appliance._homeconnect = homeconnect
+        appliance._callbacks = homeconnect._callbacks
+
+        programs = description["programs"]
+        appliance.available_programs = { key: _create_program(key, definitions) for (key, definitions) in programs.items() }
+        selected_key = description.get("initial_program") or next(iter(programs), None)
+        if selected_key:
+            appliance.selected_program = _create_program(selected_key, programs[selected_key])
+
+        status = dict(description["status"])
+        if selected_key and active_every and index % active_every == 0:
+            active = _create_program(selected_key, programs[selected_key])
+            for option in [
+                Option("BSH.Common.Option.RemainingProgramTime", name="Remaining Program Time", unit="seconds", value=description["duration"] // 2),
+                Option("BSH.Common.Option.ProgramProgress", name="Program Progress", unit="%", value=50)
+            ]:
+                active.options[option.key] = option
+            appliance.active_program = active
+            status["BSH.Common.Status.OperationState"] = "BSH.Common.EnumType.OperationState.Run"
+
+        appliance.status = {
+            key: Status(key, name=_display_name(key), value=value, displayvalue=_display_name(value) if isinstance(value, str) else None)
+            for (key, value) in status.items()
+        }
+        appliance.settings = { key: _create_option(d, option_default(d)) for (key, d) in description["settings"].items() }
+        appliance.commands = { key: Command(key, name=_display_name(key)) for key in description["commands"] }
+        homeconnect.appliances[appliance.haId] = appliance
+
+    ModelApi.attach(homeconnect)
+    return homeconnect
+
+
+def count_callbacks(homeconnect:HomeConnect) -> int:
+    """ The total number of callback registrations in the callback registry of a HomeConnect object """
+    count = 0
+    for callbacks in homeconnect._callbacks._callbacks.values():
+        for registered in callbacks.values():
+            # A set of callbacks or a list of wildcard callback records
+            count += len(registered)
+    return count
+
+
+def percentile(values:list[float], pct:float) -> float:
+    """ Nearest-rank percentile of a list of values """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * len(ordered) + 0.5)) - 1, len(ordered) - 1)
+    return ordered[max(index, 0)]
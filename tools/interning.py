@@ -0,0 +1,182 @@
+""" Measure the effect of interning the keys, units and types of the Home Connect data
+
+The data model of a synthetic fleet is loaded twice through the SDK, from JSON responses that are decoded once with
+json.loads() and once with the interning decoder of the integration, like the auth object does for the API responses.
+The report compares:
+
+* The memory retained by the loaded data models
+* The number of distinct key and value string objects in the data models
+* Dictionary lookups by the keys of decoded stream events in the data model and in the SPECIAL_ENTITIES tables
+* The cost of decoding the stream events
+
+Usage:
+    python -m tools.interning
+    python -m tools.interning --appliances 300 --extra-options 20 --json
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import gc
+import json
+import tracemalloc
+from typing import Callable
+
+from home_connect_async import Appliance, HomeConnect
+
+from custom_components.home_connect_alt.const import SPECIAL_ENTITIES
+from custom_components.home_connect_alt.interning import intern_loads
+from custom_components.home_connect_alt.loader import DataLoader
+
+from .benchmark import time_per_item
+from .fleet import build_fleet, scale_mix
+from .harness import ModelApi, OfflineResponse, create_model
+
+DECODERS:dict[str, Callable] = { "json.loads": json.loads, "interned": intern_loads }
+
+
+class JsonModelApi(ModelApi):
+    """ Answers the requests from a template data model through a JSON round trip with the given decoder """
+    def __init__(self, homeconnect:HomeConnect, loads:Callable) -> None:
+        super().__init__(homeconnect)
+        self._loads = loads
+
+    async def async_get(self, endpoint:str) -> OfflineResponse:
+        response = await super().async_get(endpoint)
+        if response.data is not None:
+            response.data = self._loads(json.dumps(response.data))
+        return response
+
+
+async def async_load_model(template:HomeConnect, loads:Callable) -> HomeConnect:
+    """ Load a new data model from the template through the SDK, with the API responses decoded by loads """
+    homeconnect = HomeConnect()
+    api = JsonModelApi(template, loads)
+    api.catalog = { haid: appliance.available_programs for (haid, appliance) in template.appliances.items() }
+    homeconnect._api = api
+    loader = DataLoader(homeconnect, 4)
+    for properties in (await api.async_get("/api/homeappliances")).data["homeappliances"]:
+        appliance = Appliance(uri=f"/api/homeappliances/{properties['haId']}", **properties)
+        appliance._homeconnect = homeconnect
+        appliance._callbacks = homeconnect._callbacks
+        appliance._api = api
+        await loader.async_fetch_appliance_data(appliance)
+        homeconnect.appliances[appliance.haId] = appliance
+    return homeconnect
+
+
+def model_strings(homeconnect:HomeConnect) -> tuple[int, int]:
+    """ The number of key and value string references in the data model and the number of distinct string objects """
+    strings = []
+    for appliance in homeconnect.appliances.values():
+        items = list((appliance.status or {}).items()) + list((appliance.settings or {}).items())
+        for program in [ appliance.selected_program, appliance.active_program, *(appliance.available_programs or {}).values() ]:
+            if program:
+                strings.append(program.key)
+                items += list((program.options or {}).items())
+        for (key, item) in items:
+            strings += [ key, item.key ]
+            if isinstance(item.value, str):
+                strings.append(item.value)
+            strings += [ value for value in (getattr(item, "allowedvalues", None) or []) if isinstance(value, str) ]
+    return (len(strings), len({ id(s) for s in strings }))
+
+
+def stream_events(homeconnect:HomeConnect) -> list[str]:
+    """ A NOTIFY event for every status, setting and program option of the fleet """
+    events = []
+    for appliance in homeconnect.appliances.values():
+        items = [ { "key": key, "value": status.value, "uri": f"{appliance.uri}/status/{key}" } for (key, status) in (appliance.status or {}).items() ]
+        items += [ { "key": key, "value": setting.value, "uri": f"{appliance.uri}/settings/{key}" } for (key, setting) in (appliance.settings or {}).items() ]
+        if appliance.selected_program:
+            items += [
+                { "key": key, "value": option.value, "uri": f"{appliance.uri}/programs/selected/options/{key}" }
+                for (key, option) in (appliance.selected_program.options or {}).items()
+            ]
+        events += [ json.dumps({ "haId": appliance.haId, "items": [ item ] }) for item in items ]
+    return events
+
+
+def measure_lookups(homeconnect:HomeConnect, events:list[dict], repeat:int) -> dict[str, float]:
+    """ Time the lookups by the keys of decoded events, in nanoseconds per lookup """
+    lookups = []
+    for event in events:
+        appliance = homeconnect.appliances[event["haId"]]
+        program = appliance.selected_program
+        tables = [ appliance.status or {}, appliance.settings or {}, program.options if program and program.options else {} ]
+        for item in event["items"]:
+            lookups += [ (table, item["key"]) for table in tables ]
+    keys = [ item["key"] for event in events for item in event["items"] ]
+    options_table = SPECIAL_ENTITIES["options"]
+    ignore_table = SPECIAL_ENTITIES["ignore"]
+
+    return {
+        "model_lookup_ns": time_per_item(lambda: [ table.get(key) for (table, key) in lookups ], len(lookups), repeat),
+        "special_entities_lookup_ns": time_per_item(
+            lambda: [ (key in ignore_table, options_table.get(key)) for key in keys ], len(keys), repeat
+        )
+    }
+
+
+async def async_measure(appliances:int, extra_programs:int, extra_options:int, repeat:int) -> dict[str, dict]:
+    """ Measure both decoders on the same fleet """
+    template = create_model(build_fleet(scale_mix(appliances), extra_programs, extra_options, seed=1), active_every=0)
+    events = stream_events(template)
+    results = {}
+    for (name, loads) in DECODERS.items():
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        homeconnect = await async_load_model(template, loads)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        (references, distinct) = model_strings(homeconnect)
+        decoded = [ loads(event) for event in events ]
+        results[name] = {
+            "model_bytes": retained,
+            "string_references": references,
+            "distinct_strings": distinct,
+            "decode_ns": time_per_item(lambda loads=loads: [ loads(event) for event in events ], len(events), repeat),
+            **measure_lookups(homeconnect, decoded, repeat)
+        }
+        homeconnect.close()
+    return results
+
+
+def format_report(results:dict[str, dict], args:argparse.Namespace) -> str:
+    """ Format the results as a markdown table with the change from json.loads to interned """
+    (plain, interned) = (results["json.loads"], results["interned"])
+    lines = [
+        f"Fleet: {args.appliances} appliances, {args.extra_programs} extra programs, {args.extra_options} extra options per program",
+        "",
+        "| Measure | json.loads | interned | Change |",
+        "|---|---:|---:|---:|"
+    ]
+    for (key, label) in [
+        ("model_bytes", "Data model memory (bytes)"),
+        ("distinct_strings", f"Distinct key and value strings (of {plain['string_references']})"),
+        ("model_lookup_ns", "Data model lookup by event key (ns)"),
+        ("special_entities_lookup_ns", "SPECIAL_ENTITIES lookup by event key (ns)"),
+        ("decode_ns", "Event decoding (ns)")
+    ]:
+        change = (interned[key] - plain[key]) / plain[key] * 100 if plain[key] else 0
+        lines.append(f"| {label} | {plain[key]:,.0f} | {interned[key]:,.0f} | {change:+.1f}% |")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the effect of interning the keys, units and types of the Home Connect data")
+    parser.add_argument("--appliances", type=int, default=120, help="Number of appliances in the synthetic fleet (default 120)")
+    parser.add_argument("--extra-programs", type=int, default=0, help="Synthetic programs added to every appliance")
+    parser.add_argument("--extra-options", type=int, default=0, help="Synthetic options added to every program")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats, the best one is reported (default 5)")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(async_measure(args.appliances, args.extra_programs, args.extra_options, args.repeat))
+    print(json.dumps(results, indent=2) if args.json else format_report(results, args))
+
+
+if __name__ == "__main__":
+    main()
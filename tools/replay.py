@@ -0,0 +1,147 @@
+""" Replay a recorded event stream into the integration and measure its cost
+
+The recording is created with the home_connect_alt.record_events service. The snapshot is loaded into a
+HomeConnect object, all the entity platforms are set up against it by the offline harness and the events are
+fed to the same stream handler that processes live events.
+
+Usage:
+    python -m tools.replay home_connect_alt_events_20220101_100000.jsonl --speed max
+    python -m tools.replay recording.jsonl --speed 10 --json
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+from home_connect_async import HomeConnect
+
+from .harness import ModelApi, PlatformHarness, percentile
+
+
+def load_recording(path:str) -> tuple[str, list[dict]]:
+    """ Load a recording file and return the JSON snapshot and the list of events """
+    snapshot = None
+    events = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("kind") == "snapshot":
+                snapshot = json.dumps(record["data"])
+            else:
+                events.append(record)
+    if snapshot is None:
+        raise ValueError(f"The recording {path} doesn't contain a snapshot")
+    return snapshot, events
+
+
+async def async_create_from_snapshot(snapshot:str) -> HomeConnect:
+    """ Create a HomeConnect object from a snapshot with an offline API """
+    homeconnect = await HomeConnect.async_create(None, json_data=snapshot, delayed_load=True)
+    ModelApi.attach(homeconnect)
+    return homeconnect
+
+
+async def async_replay(path:str, speed:float|None, render:bool=True, include_keepalive:bool=False) -> dict:
+    """ Replay a recording and return the collected metrics
+
+    speed is a multiplier of the recorded timing, None replays as fast as possible
+    """
+    snapshot, events = load_recording(path)
+    if not include_keepalive:
+        events = [ event for event in events if event["type"] != "KEEP-ALIVE" ]
+
+    homeconnect = await async_create_from_snapshot(snapshot)
+    harness = PlatformHarness(homeconnect, render=render)
+    await harness.async_setup()
+    entity_count = len(harness.entities)
+    setup_writes = harness.counter.writes
+
+    counter = harness.counter
+    latencies = []
+    writes_per_event = []
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    writes_before = counter.writes
+
+    for event in events:
+        if speed:
+            delay = start_wall + event["t"] / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        message = SimpleNamespace(type=event["type"], data=event["data"], last_event_id=event["id"], message=event["type"])
+        writes = counter.writes
+        received = time.perf_counter()
+        await homeconnect._async_process_updates(message)
+        # Entities that were created by the event are attached like Home Assistant would do
+        await harness.async_flush()
+
+        event_writes = counter.writes - writes
+        writes_per_event.append(event_writes)
+        if event_writes:
+            latencies.append((counter.last_write - received) * 1000)
+
+    cpu_time = time.process_time() - start_cpu
+    wall_time = time.perf_counter() - start_wall
+    total_writes = counter.writes - writes_before
+    homeconnect.close()
+
+    return {
+        "events": len(events),
+        "appliances": len(homeconnect.appliances),
+        "entities": entity_count,
+        "entities_after_replay": len(harness.entities),
+        "setup_state_writes": setup_writes,
+        "state_writes": total_writes,
+        "state_writes_per_event": round(total_writes / len(events), 3) if events else 0,
+        "max_state_writes_per_event": max(writes_per_event) if writes_per_event else 0,
+        "api_requests": homeconnect._api.request_count,
+        "wall_time_s": round(wall_time, 4),
+        "cpu_time_s": round(cpu_time, 4),
+        "cpu_time_per_event_ms": round(cpu_time * 1000 / len(events), 4) if events else 0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p90": round(percentile(latencies, 90), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies), 4) if latencies else 0
+        }
+    }
+
+
+def parse_speed(value:str) -> float|None:
+    """ Parse the --speed argument: "max" or a multiplier such as 1, 10 or 0.5 """
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("The speed must be positive or 'max'")
+    return speed
+
+
+def main() -> None:
+    """ Run a replay from the command line """
+    parser = argparse.ArgumentParser(description="Replay a recorded Home Connect event stream")
+    parser.add_argument("recording", help="A recording file created by the home_connect_alt.record_events service")
+    parser.add_argument("--speed", type=parse_speed, default=parse_speed("max"), help='Replay speed multiplier, for example 1, 10 or "max" (default)')
+    parser.add_argument("--no-render", action="store_true", help="Count state writes without rendering the entity state")
+    parser.add_argument("--include-keepalive", action="store_true", help="Also replay KEEP-ALIVE events")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(async_replay(args.recording, args.speed, not args.no_render, args.include_keepalive))
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        for (key, value) in results.items():
+            print(f"{key:28} {value}")
+
+
+if __name__ == "__main__":
+    main()
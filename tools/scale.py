@@ -0,0 +1,159 @@
+""" Scale test for appliance discovery and entity registration
+
+Sets up all the platforms against synthetic fleets of growing size and reports how the setup scales:
+
+* Setup wall time of all the platforms, including the add_appliance() scans and EntityManager registration
+* Rescan time - the cost of the add_appliance() scans of all the platforms when an appliance is PAIRED again
+* The number of entities, program option entities, dormant entities and callback registrations
+* Peak memory allocated during the setup (measured in a separate run with tracemalloc)
+
+Usage:
+    python -m tools.scale
+    python -m tools.scale --sizes 10,100,500 --extra-options 0,20 --report tools/scale_report.md
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import gc
+import platform
+import time
+import tracemalloc
+
+from home_connect_async import Events
+
+from custom_components.home_connect_alt.common import get_dormancy
+from custom_components.home_connect_alt.filters import EntityFilter
+
+from .fleet import build_fleet, scale_mix
+from .harness import PlatformHarness, count_callbacks, create_model
+
+DEFAULT_SIZES = [6, 30, 120, 300, 600]
+
+OPTION_ENTITY_CLASSES = [
+    "ProgramOptionSensor", "ActivityOptionSensor", "ProgramOptionBinarySensor", "ActivityOptionBinarySensor",
+    "OptionSelect", "OptionNumber", "OptionSwitch"
+]
+
+
+async def async_setup_fleet(
+    size:int, extra_programs:int, extra_options:int, active_every:int, lazy_options:bool=False, program_options:int=0, dormancy:bool=True,
+    exclude_keys:list[str]=None, compact:bool=False
+) -> tuple[PlatformHarness, float]:
+    """ Set up all the platforms for a fleet and return the harness and the setup time in seconds """
+    homeconnect = create_model(build_fleet(scale_mix(size), extra_programs, extra_options, seed=1, program_options=program_options), active_every)
+    entity_filter = EntityFilter.from_config({ "exclude": [ { "key": pattern } for pattern in exclude_keys or [] ] }, compact)
+    harness = PlatformHarness(homeconnect, render=False, lazy_options=lazy_options, dormancy=dormancy, entity_filter=entity_filter)
+    gc.collect()
+    start = time.perf_counter()
+    await harness.async_setup()
+    return harness, time.perf_counter() - start
+
+
+async def async_measure(
+    size:int, extra_programs:int, extra_options:int, active_every:int, lazy_options:bool=False, program_options:int=0, dormancy:bool=True,
+    exclude_keys:list[str]=None, compact:bool=False
+) -> dict:
+    """ Measure a single fleet size """
+    harness, setup_time = await async_setup_fleet(
+        size, extra_programs, extra_options, active_every, lazy_options, program_options, dormancy, exclude_keys, compact
+    )
+    homeconnect = harness.homeconnect
+
+    # Re-broadcasting PAIRED for every appliance makes all the platforms scan them again
+    start = time.perf_counter()
+    for appliance in homeconnect.appliances.values():
+        await homeconnect._callbacks.async_broadcast_event(appliance, Events.PAIRED)
+    await harness.async_flush()
+    rescan_time = time.perf_counter() - start
+    dormancy_manager = get_dormancy(homeconnect)
+
+    result = {
+        "appliances": len(homeconnect.appliances),
+        "entities": len(harness.entities),
+        "option_entities": sum(1 for e in harness.entities.values() if type(e).__name__ in OPTION_ENTITY_CLASSES),
+        "dormant_entities": dormancy_manager.counts()["dormant"] if dormancy_manager else 0,
+        "callbacks": count_callbacks(homeconnect),
+        "setup_s": round(setup_time, 4),
+        "setup_per_entity_us": round(setup_time * 1e6 / max(len(harness.entities), 1), 2),
+        "rescan_per_appliance_ms": round(rescan_time * 1000 / max(len(homeconnect.appliances), 1), 3)
+    }
+    del harness, homeconnect
+
+    # Memory is measured in a separate run because tracemalloc slows down the setup considerably
+    gc.collect()
+    tracemalloc.start()
+    harness, _ = await async_setup_fleet(size, extra_programs, extra_options, active_every, lazy_options, program_options, dormancy, exclude_keys, compact)
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["peak_memory_mb"] = round(peak / 1024 / 1024, 2)
+    return result
+
+
+def format_report(series:dict[int, list[dict]], args:argparse.Namespace) -> str:
+    """ Format the results of every series of extra options as a markdown report """
+    columns = [
+        ("appliances", "Appliances"), ("entities", "Entities"), ("option_entities", "Option entities"),
+        ("dormant_entities", "Dormant entities"), ("callbacks", "Callbacks"), ("setup_s", "Setup (s)"), ("setup_per_entity_us", "Setup per entity (µs)"),
+        ("rescan_per_appliance_ms", "Rescan per appliance (ms)"), ("peak_memory_mb", "Peak memory (MB)")
+    ]
+    lines = [
+        "# Scale test report",
+        "",
+        f"Generated by `python -m tools.scale --sizes {args.sizes} --extra-programs {args.extra_programs} "
+        f"--extra-options {args.extra_options} --program-options {args.program_options} --active-every {args.active_every}"
+        f"{' --lazy-options' if args.lazy_options else ''}{' --no-dormancy' if args.no_dormancy else ''}"
+        f"{f' --exclude-keys {args.exclude_keys}' if args.exclude_keys else ''}{' --compact' if args.compact else ''}` "
+        f"with Python {platform.python_version()}.",
+        "",
+        "The appliance types are mixed evenly" + (f" and one in every {args.active_every} appliances runs a program." if args.active_every else ".")
+    ]
+    for (extra_options, results) in series.items():
+        lines += [
+            "",
+            f"## {args.extra_programs} extra programs per appliance, {extra_options} extra options per program",
+            "",
+            "| " + " | ".join(title for (_, title) in columns) + " |",
+            "|" + "|".join("---:" for _ in columns) + "|"
+        ]
+        for result in results:
+            lines.append("| " + " | ".join(str(result[key]) for (key, _) in columns) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    """ Run the scale test from the command line """
+    parser = argparse.ArgumentParser(description="Scale test for appliance discovery and entity registration")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Comma separated fleet sizes")
+    parser.add_argument("--extra-programs", type=int, default=0, help="Synthetic programs added to every appliance")
+    parser.add_argument("--extra-options", default="0", help="Comma separated numbers of synthetic options added to every program, one series each")
+    parser.add_argument("--active-every", type=int, default=3, help="Every Nth appliance has an active program, 0 for none (default 3)")
+    parser.add_argument("--program-options", type=int, default=0, help="Synthetic options, specific to the program, added to every program")
+    parser.add_argument("--lazy-options", action="store_true", help="Only create option entities for the current programs, like the lazy_options setting without a usage history")
+    parser.add_argument("--no-dormancy", action="store_true", help="Keep every entity attached to its callbacks while it is unavailable")
+    parser.add_argument("--exclude-keys", help="Comma separated key globs that are excluded by the entity filter, like the entity_filters setting")
+    parser.add_argument("--compact", action="store_true", help="Only create the snapshot sensor and the key entities of every appliance, like the compact setting")
+    parser.add_argument("--report", help="Write a markdown report to this file")
+    args = parser.parse_args()
+
+    # Warm up so the first measurement doesn't include importing the platforms
+    asyncio.run(async_setup_fleet(1, 0, 0, 0))
+
+    series = {}
+    for extra_options in [ int(s) for s in args.extra_options.split(",") ]:
+        series[extra_options] = []
+        for size in [ int(s) for s in args.sizes.split(",") ]:
+            result = asyncio.run(async_measure(
+                size, args.extra_programs, extra_options, args.active_every, args.lazy_options, args.program_options, not args.no_dormancy,
+                args.exclude_keys.split(",") if args.exclude_keys else None, args.compact
+            ))
+            series[extra_options].append(result)
+            print(f"extra_options={extra_options} " + " ".join(f"{key}={value}" for (key, value) in result.items()))
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            file.write(format_report(series, args))
+        print(f"Saved the report to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
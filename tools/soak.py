@@ -0,0 +1,255 @@
+""" Long running memory soak test with leak detection
+
+Runs the integration platforms against a synthetic fleet for many cycles. Every cycle replays a batch of synthetic
+stream events (option, status and setting changes, program selections and operation state changes), depairs and
+pairs an appliance again and, every few cycles, unloads and sets up everything again like a config entry reload.
+Reloads alternate between a full reload and a hot reload which keeps the data model, like a reload of the config
+entry within the grace period does.
+
+After every cycle the test collects garbage and checks that:
+
+* No Appliance or HomeConnect objects are alive beyond the ones in the current data model
+* No entity objects are alive beyond the ones that are currently added
+* No callbacks are registered for entities that were removed or for appliance objects that were replaced
+* The entities of an appliance are created again after it was depaired and paired
+* The memory traced by tracemalloc doesn't keep growing after the warm up cycles
+
+Usage:
+    python -m tools.soak
+    python -m tools.soak --events 2000000 --cycles 200 --reload-every 10
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+import weakref
+from types import SimpleNamespace
+
+from home_connect_async import Appliance, Events, HomeConnect
+
+from custom_components.home_connect_alt import register_events_publisher
+from custom_components.home_connect_alt.common import EntityBase, register_callback
+
+from .fleet import build_fleet, scale_mix
+from .harness import ModelApi, PlatformHarness, count_callbacks, create_model
+
+
+class SoakEnvironment():
+    """ A data model with all the platforms set up, which can be unloaded and set up again """
+    def __init__(self, fleet:dict) -> None:
+        self.fleet = fleet
+        self.homeconnect:HomeConnect = None
+        self.harness:PlatformHarness = None
+
+    api = property(lambda self: self.homeconnect._api)
+
+    async def async_setup(self, homeconnect:HomeConnect=None) -> None:
+        """ Create the data model, or reuse a kept one, and set up the platforms like async_setup_entry() does """
+        self.homeconnect = homeconnect or create_model(self.fleet, active_every=3)
+        self.harness = PlatformHarness(self.homeconnect, render=False)
+        await self.harness.async_setup()
+        config_entry = self.harness.config_entry
+        config_entry.async_on_unload(register_events_publisher(self.harness.hass, self.homeconnect))
+        # Home Assistant removes the entities of a device when the device is removed from the registry on DEPAIRED
+        config_entry.async_on_unload(register_callback(self.homeconnect, self._async_on_depaired, Events.DEPAIRED))
+
+    async def _async_on_depaired(self, appliance:Appliance) -> None:
+        self.api.detached[appliance.haId] = appliance
+        await self.harness.async_remove_entities(appliance)
+
+    async def async_unload(self, keep_model:bool=False) -> HomeConnect|None:
+        """ Unload like async_unload_entry() does and drop all the references to the data model, or return it when it's kept """
+        homeconnect = self.homeconnect
+        await self.harness.async_unload()
+        if not keep_model:
+            homeconnect.close()
+            homeconnect = None
+        self.homeconnect = None
+        self.harness = None
+        return homeconnect
+
+    async def async_send(self, event_type:str, haid:str, data:dict=None) -> None:
+        """ Send a single stream event """
+        event = SimpleNamespace(type=event_type, last_event_id=haid, data=json.dumps(data) if data else "", message=event_type)
+        await self.homeconnect._async_process_updates(event)
+
+    async def async_pair_cycle(self, haid:str) -> None:
+        """ Depair and pair an appliance again """
+        await self.async_send("DEPAIRED", haid)
+        await self.harness.async_flush()
+        await self.async_send("PAIRED", haid)
+        self.api.detached.pop(haid, None)
+        await self.harness.async_flush()
+
+
+class EventGenerator():
+    """ Generates a reproducible mix of synthetic stream events for the appliances of a data model """
+    def __init__(self, seed:int) -> None:
+        self._random = random.Random(seed)
+
+    def next_event(self, homeconnect:HomeConnect, api:ModelApi) -> tuple[str, str, dict]:
+        rnd = self._random
+        appliance = rnd.choice(list(homeconnect.appliances.values()))
+        haid = appliance.haId
+        choice = rnd.random()
+
+        if choice < 0.05 and appliance.available_programs:
+            api.selected[haid] = rnd.choice(list(appliance.available_programs.keys()))
+            return self._notify(haid, "BSH.Common.Root.SelectedProgram", api.selected[haid], "programs/selected")
+        if choice < 0.08 and appliance.status.get("BSH.Common.Status.OperationState"):
+            state = rnd.choice(["Ready", "Run", "Finished", "Ready"])
+            return self._notify(haid, "BSH.Common.Status.OperationState", f"BSH.Common.EnumType.OperationState.{state}", "status", "STATUS")
+        if choice < 0.6 and appliance.selected_program and appliance.selected_program.options:
+            option = rnd.choice(list(appliance.selected_program.options.values()))
+            return self._notify(haid, option.key, self._next_value(option), "programs/selected/options")
+        if choice < 0.85 and appliance.status:
+            status = rnd.choice(list(appliance.status.values()))
+            if status.key != "BSH.Common.Status.OperationState":
+                return self._notify(haid, status.key, self._next_value(status), "status", "STATUS")
+        if appliance.settings:
+            setting = rnd.choice(list(appliance.settings.values()))
+            return self._notify(haid, setting.key, self._next_value(setting), "settings")
+        return ("KEEP-ALIVE", haid, None)
+
+    def _next_value(self, item):
+        if isinstance(item.value, bool):
+            return not item.value
+        if isinstance(item.value, (int, float)):
+            minimum = getattr(item, "min", None) or 0
+            maximum = getattr(item, "max", None) or 100
+            return self._random.randint(int(minimum), int(maximum))
+        allowed = getattr(item, "allowedvalues", None)
+        if allowed:
+            return self._random.choice(allowed)
+        return item.value
+
+    @staticmethod
+    def _notify(haid:str, key:str, value, path:str, event_type:str="NOTIFY") -> tuple[str, str, dict]:
+        return (event_type, haid, { "haId": haid, "items": [
+            { "key": key, "value": value, "uri": f"/api/homeappliances/{haid}/{path}/{key}" }
+        ] })
+
+
+def count_live(cls:type) -> int:
+    """ The number of objects of a class that are alive """
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, cls))
+
+
+def find_stale_callbacks(env:SoakEnvironment) -> list[str]:
+    """ Find callbacks which are bound to entities that were removed or to appliance objects that were replaced """
+    live_entities = { id(e) for e in env.harness.entities.values() }
+    stale = []
+    for (haid, callbacks) in env.homeconnect._callbacks._callbacks.items():
+        for (key, registered) in callbacks.items():
+            for callback in registered:
+                callback = callback["callback"] if isinstance(callback, dict) else callback
+                owner = getattr(callback, "__self__", None)
+                if isinstance(owner, EntityBase):
+                    if id(owner) not in live_entities:
+                        stale.append(f"{haid}/{key}: removed entity {type(owner).__name__} {owner.unique_id}")
+                    elif env.homeconnect.appliances.get(owner._appliance.haId) is not owner._appliance:
+                        stale.append(f"{haid}/{key}: entity {type(owner).__name__} {owner.unique_id} of a replaced appliance object")
+    return stale
+
+
+async def async_soak(args:argparse.Namespace) -> list[str]:
+    """ Run the soak test and return the list of detected problems """
+    fleet = build_fleet(scale_mix(args.appliances), extra_options=args.extra_options, seed=args.seed)
+    env = SoakEnvironment(fleet)
+    await env.async_setup()
+    generator = EventGenerator(args.seed)
+    rnd = random.Random(args.seed)
+    events_per_cycle = max(args.events // args.cycles, 1)
+
+    problems = []
+    baseline_memory = None
+    tracemalloc.start()
+    start = time.perf_counter()
+    total_events = 0
+
+    for cycle in range(1, args.cycles + 1):
+        for _ in range(events_per_cycle):
+            await env.async_send(*generator.next_event(env.homeconnect, env.api))
+            await env.harness.async_flush()
+        total_events += events_per_cycle
+
+        haid = rnd.choice(list(env.homeconnect.appliances.keys()))
+        entities_before = sum(1 for e in env.harness.entities.values() if getattr(e, "_appliance", None) is env.homeconnect.appliances[haid])
+        await env.async_pair_cycle(haid)
+        entities_after = sum(1 for e in env.harness.entities.values() if getattr(e, "_appliance", None) is env.homeconnect.appliances[haid])
+        if entities_after < entities_before:
+            problems.append(f"cycle {cycle}: only {entities_after} of {entities_before} entities were created again after {haid} was paired again")
+
+        if args.reload_every and cycle % args.reload_every == 0:
+            if (cycle // args.reload_every) % 2:
+                old_homeconnect = weakref.ref(env.homeconnect)
+                await env.async_unload()
+                await env.async_setup()
+                gc.collect()
+                if old_homeconnect() is not None:
+                    problems.append(f"cycle {cycle}: the HomeConnect object is still alive after the unload")
+            else:
+                entities_before = len(env.harness.entities)
+                await env.async_setup(await env.async_unload(keep_model=True))
+                if len(env.harness.entities) != entities_before:
+                    problems.append(f"cycle {cycle}: {len(env.harness.entities)} entities after a hot reload, expected {entities_before}")
+
+        gc.collect()
+        appliances = count_live(Appliance)
+        expected_appliances = len(env.homeconnect.appliances) + len(env.api.detached)
+        entities = count_live(EntityBase)
+        stale = find_stale_callbacks(env)
+        (memory, _) = tracemalloc.get_traced_memory()
+
+        if appliances > expected_appliances:
+            problems.append(f"cycle {cycle}: {appliances} appliance objects are alive, expected {expected_appliances}")
+        if entities > len(env.harness.entities):
+            problems.append(f"cycle {cycle}: {entities} entity objects are alive, expected {len(env.harness.entities)}")
+        problems += [ f"cycle {cycle}: stale callback {s}" for s in stale[:10] ]
+        if cycle == args.warmup:
+            baseline_memory = memory
+        elif baseline_memory is not None and memory - baseline_memory > args.max_growth_mb * 1024 * 1024:
+            problems.append(f"cycle {cycle}: traced memory grew by {(memory - baseline_memory) / 1024 / 1024:.1f} MB since the warm up")
+
+        if not args.quiet:
+            print(f"cycle {cycle:4} events {total_events:9} appliances {appliances:4} entities {entities:6} "
+                f"callbacks {count_callbacks(env.homeconnect):6} stale {len(stale):4} memory {memory / 1024 / 1024:7.2f} MB "
+                f"elapsed {time.perf_counter() - start:7.1f} s")
+        if problems and args.fail_fast:
+            break
+
+    tracemalloc.stop()
+    return problems
+
+
+def main() -> None:
+    """ Run the soak test from the command line """
+    parser = argparse.ArgumentParser(description="Memory soak test with leak detection for callbacks, entities and appliances")
+    parser.add_argument("--appliances", type=int, default=12, help="Number of appliances in the synthetic fleet (default 12)")
+    parser.add_argument("--extra-options", type=int, default=0, help="Synthetic options added to every program")
+    parser.add_argument("--events", type=int, default=1000000, help="Total number of events to replay (default 1000000)")
+    parser.add_argument("--cycles", type=int, default=100, help="Number of depair/pair cycles, the events are spread across them (default 100)")
+    parser.add_argument("--reload-every", type=int, default=5, help="Unload and set up again every N cycles, 0 to disable (default 5)")
+    parser.add_argument("--warmup", type=int, default=10, help="Cycles before the memory baseline is taken (default 10)")
+    parser.add_argument("--max-growth-mb", type=float, default=2, help="Allowed memory growth after the warm up (default 2 MB)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the fleet and the events")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop at the first cycle with a problem")
+    parser.add_argument("--quiet", action="store_true", help="Only print the problems")
+    args = parser.parse_args()
+
+    problems = asyncio.run(async_soak(args))
+    if problems:
+        print(f"{len(problems)} problem(s) detected:", file=sys.stderr)
+        for problem in problems[:50]:
+            print(f"  {problem}", file=sys.stderr)
+        sys.exit(1)
+    print("No leaks detected")
+
+
+if __name__ == "__main__":
+    main()